@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Os módulos do case são importados de forma plana (import script, import carga, ...):
+# a pasta do pacote entra no path para `python -m case_stone` funcionar de fora dela
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+sys.exit(main())
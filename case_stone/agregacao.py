@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from carga import CONTADORES
+
+
+# Grão mais fino da base agregada (mesmo GROUP BY do SELECT em tabelas_fonte.sql)
+GRAO_FINO = [
+    "session_date",
+    "chatbot",
+    "fonte",
+    "tecnologia_do_chatbot",
+    "topico_da_sessao",
+    "assunto_da_sessao",
+]
+
+# Colunas derivadas de session_date, carregadas junto com a data em cada nível
+DERIVADAS_DATA = ["session_month", "mes_key", "day"]
+
+
+def somar(df: pd.DataFrame, chaves: list) -> pd.DataFrame:
+    """
+    Soma os contadores sessoes_* por `chaves` (groupby único, só grupos observados).
+    """
+    return (
+        df.groupby(list(chaves), observed=True, sort=True)[CONTADORES]
+        .sum()
+        .reset_index()
+    )
+
+
+def codigos_coluna(serie: pd.Series):
+    """
+    Códigos inteiros (>= 0, na ordem dos valores) e valores de uma coluna;
+    categóricas reaproveitam os próprios códigos.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(dtype="int64"), serie.cat.categories
+    codigos, valores = pd.factorize(serie, sort=True)
+    return codigos.astype("int64"), pd.Index(valores)
+
+
+def somar_codigos(colunas: list, cardinalidades: list, contadores: np.ndarray):
+    """
+    Soma `contadores` por combinação de códigos das `colunas` (chave mista em
+    ordem lexicográfica das colunas). Retorna (códigos por coluna, somas), só
+    das combinações observadas, em ordem crescente.
+    """
+    chave = np.zeros(len(contadores), dtype="int64")
+    for codigos, n in zip(colunas, cardinalidades):
+        chave = chave * n + codigos
+    tamanho = int(np.prod(cardinalidades, dtype="int64")) if cardinalidades else 1
+
+    if tamanho <= 4 * len(chave) + 1_000_000:
+        # Espaço de chaves pequeno: bincount direto, sem ordenar
+        presenca = np.bincount(chave, minlength=tamanho)
+        grupos = np.flatnonzero(presenca)
+        somas = np.column_stack([
+            np.bincount(chave, weights=contadores[:, j], minlength=tamanho)[grupos]
+            for j in range(contadores.shape[1])
+        ])
+    else:
+        grupos, inversa = np.unique(chave, return_inverse=True)
+        somas = np.column_stack([
+            np.bincount(inversa, weights=contadores[:, j], minlength=len(grupos))
+            for j in range(contadores.shape[1])
+        ])
+
+    codigos = np.unravel_index(grupos, cardinalidades) if cardinalidades else ()
+    return [c.astype("int64") for c in codigos], somas
+
+
+def adicionar_taxas(g: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula retencao_pct e pct_pedido_atendimento numa única operação vetorizada.
+
+    - Arredonda para 2 casas, como no restante da análise
+    - Quando sessoes_total == 0 o percentual fica NaN (evita divisão por zero)
+    """
+    totais = g["sessoes_total"].to_numpy(dtype="float64")[:, None]
+    numeradores = g[["sessoes_retidas", "sessoes_com_pedido_de_atendimento"]].to_numpy(dtype="float64")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        taxas = np.where(totais > 0, np.round(numeradores / totais * 100, 2), np.nan)
+
+    g["retencao_pct"] = taxas[:, 0]
+    g["pct_pedido_atendimento"] = taxas[:, 1]
+    return g
+
+
+def _adicionar_derivadas(g: pd.DataFrame) -> pd.DataFrame:
+    if "session_date" in g.columns:
+        datas = g["session_date"].dt
+        g["session_month"] = datas.to_period("M")
+        g["mes_key"] = (datas.year * 100 + datas.month).astype("int32")
+        g["day"] = datas.day
+    elif "session_month" in g.columns and "mes_key" not in g.columns:
+        g["mes_key"] = (g["session_month"].dt.year * 100 + g["session_month"].dt.month).astype("int32")
+    return g
+
+
+class RollupRetencao:
+    """
+    Motor de grouping sets / rollup sobre a base agregada.
+
+    - A base crua é varrida uma única vez, no grão mais fino
+      (data x bot x fonte x tecnologia x tópico x assunto)
+    - Qualquer nível mais grosso (ex.: mês x bot, data x bot, mês x bot x fonte)
+      é derivado do menor nível já calculado que contém suas chaves, e fica
+      memorizado para servir os níveis seguintes
+    - Colunas derivadas da data (session_month, mes_key, day) acompanham
+      qualquer nível que tenha session_date
+    """
+
+    def __init__(self, df: pd.DataFrame, grao: list = GRAO_FINO):
+        self.grao = list(grao)
+        base = _adicionar_derivadas(somar(df, self.grao))
+        self._niveis = {frozenset(self.grao): base}
+
+    @classmethod
+    def de_niveis(cls, base: pd.DataFrame, niveis: dict = None, grao: list = GRAO_FINO) -> "RollupRetencao":
+        """
+        Monta o rollup a partir de níveis já somados (ex.: o estado persistido
+        de incremental.py), sem varrer a base de novo.
+
+        - `base` deve estar no grão `grao`, com os contadores já somados; None
+          monta um rollup só com `niveis` (ex.: fora_memoria.py, quando o grão
+          fino não cabe na memória), e níveis que não derivam deles dão KeyError
+        - `niveis` é {tupla_de_chaves: nível}, no mesmo formato de nivel()
+        """
+        rollup = cls.__new__(cls)
+        rollup.grao = list(grao)
+        rollup._niveis = {}
+        if base is not None:
+            rollup._niveis[frozenset(rollup.grao)] = _adicionar_derivadas(base)
+        for chaves, nivel in (niveis or {}).items():
+            rollup._niveis[frozenset(chaves)] = _adicionar_derivadas(nivel)
+        return rollup
+
+    @property
+    def base(self) -> pd.DataFrame:
+        if frozenset(self.grao) not in self._niveis:
+            raise KeyError("Rollup sem o grão fino (montado só com níveis agregados)")
+        return self._niveis[frozenset(self.grao)]
+
+    def _origem(self, chaves: list) -> pd.DataFrame:
+        # Menor nível memorizado que contém todas as chaves pedidas
+        candidatos = [
+            g for g in self._niveis.values()
+            if all(c in g.columns for c in chaves)
+        ]
+        if not candidatos:
+            raise KeyError(f"Chaves fora do grão do rollup: {chaves}")
+        return min(candidatos, key=len)
+
+    def nivel(self, chaves: list) -> pd.DataFrame:
+        """
+        Somas dos contadores no nível `chaves` (sem percentuais), memorizado.
+        """
+        chave_nivel = frozenset(chaves)
+        if chave_nivel not in self._niveis:
+            origem = self._origem(chaves)
+            self._niveis[chave_nivel] = _adicionar_derivadas(somar(origem, chaves))
+        return self._niveis[chave_nivel]
+
+    def agregar(self, chaves: list) -> pd.DataFrame:
+        """
+        Nível `chaves` com contadores + percentuais, em um frame novo
+        (pode ser alterado sem afetar o nível memorizado).
+        """
+        g = self.nivel(chaves)[list(chaves) + CONTADORES].copy()
+        return adicionar_taxas(g)
+
+    def conjuntos(self, lista_chaves: list) -> list:
+        """
+        Calcula vários níveis de uma vez (grouping sets), do mais fino para o
+        mais grosso, para que cada um reaproveite o anterior.
+        """
+        ordem = sorted(range(len(lista_chaves)), key=lambda i: -len(lista_chaves[i]))
+        resultados = [None] * len(lista_chaves)
+        for i in ordem:
+            resultados[i] = self.agregar(lista_chaves[i])
+        return resultados
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+from carga import DIMENSOES
+
+
+# Níveis de segmento varridos (cada um com session_date): do bot inteiro até o grão mais fino
+NIVEIS_VARREDURA = [
+    ["chatbot"],
+    ["chatbot", "fonte"],
+    ["chatbot", "tecnologia_do_chatbot"],
+    ["chatbot", "topico_da_sessao"],
+    ["chatbot", "assunto_da_sessao"],
+    DIMENSOES,
+]
+
+# Parâmetros padrão da varredura
+JANELA_BASE = 28            # dias corridos da linha de base móvel (anteriores ao dia avaliado)
+MIN_SESSOES = 5             # volume mínimo do dia para sinalizar a célula
+MIN_SESSOES_BASE = 30       # volume mínimo da linha de base para comparar contra ela
+LIMIAR_QUEDA_PP = 15.0      # queda mínima vs a linha de base, em p.p.
+LIMIAR_Z = 3.0              # significância mínima da queda (z binomial)
+
+COLUNAS_CELULAS = [
+    "nivel", "segmento", *DIMENSOES, "session_date", "tipo",
+    "sessoes_total", "sessoes_retidas", "retencao_pct", "baseline_pct",
+    "queda_pp", "z_queda", "dias_zerados", "impacto_sessoes",
+]
+
+
+def _nome_nivel(dims: list) -> str:
+    return " x ".join(dims)
+
+
+def varrer_nivel(
+    nivel: pd.DataFrame,
+    dims: list,
+    janela_base: int = JANELA_BASE,
+    min_sessoes: int = MIN_SESSOES,
+    min_sessoes_base: int = MIN_SESSOES_BASE,
+    limiar_queda_pp: float = LIMIAR_QUEDA_PP,
+    limiar_z: float = LIMIAR_Z,
+) -> pd.DataFrame:
+    """
+    Sinaliza as células segmento x dia anômalas de um nível (session_date + `dims`
+    + contadores), numa única passada vetorizada.
+
+    Só as linhas observadas entram (nada de matriz densa segmento x dia): as
+    linhas são ordenadas por (segmento, dia) e tudo sai de somas acumuladas.
+
+    - retencao_zero: dia com pelo menos `min_sessoes` sessões e nenhuma retida;
+      dias_zerados conta os dias zerados seguidos do segmento (dias sem volume
+      suficiente não interrompem nem estendem a sequência)
+    - queda: retenção do dia abaixo da linha de base do próprio segmento (dias
+      [d - janela_base, d - 1]) em pelo menos `limiar_queda_pp` p.p., com
+      z binomial >= `limiar_z`
+    - impacto_sessoes: sessões retidas perdidas = sessoes_total x (base - retenção do dia);
+      sem linha de base no segmento, usa a retenção do nível inteiro naquele dia
+    """
+    dims = list(dims)
+    if nivel.empty:
+        return pd.DataFrame(columns=COLUNAS_CELULAS)
+
+    datas = nivel["session_date"]
+    dia = ((datas - datas.min()).dt.days).to_numpy(dtype="int64")
+    segmento = nivel.groupby(dims, observed=True, sort=True).ngroup().to_numpy(dtype="int64")
+
+    ordem = np.lexsort((dia, segmento))
+    dia, segmento = dia[ordem], segmento[ordem]
+    total = nivel["sessoes_total"].to_numpy(dtype="float64")[ordem]
+    retidas = nivel["sessoes_retidas"].to_numpy(dtype="float64")[ordem]
+    n = len(ordem)
+
+    # Chave única e crescente por (segmento, dia): janelas saem por searchsorted
+    largura = int(dia.max()) + 1
+    chave = segmento * largura + dia
+    inicio_janela = np.searchsorted(chave, segmento * largura + np.maximum(dia - janela_base, 0), side="left")
+    posicao = np.arange(n)
+
+    # Dias zerados ficam fora da linha de base: um apagão não vira a nova normalidade do segmento
+    volume = total >= min_sessoes
+    zerada = volume & (retidas == 0)
+    acum_total = np.concatenate(([0.0], np.cumsum(np.where(zerada, 0.0, total))))
+    acum_retidas = np.concatenate(([0.0], np.cumsum(retidas)))
+    base_total = acum_total[posicao] - acum_total[inicio_janela]
+    base_retidas = acum_retidas[posicao] - acum_retidas[inicio_janela]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        taxa = np.where(total > 0, retidas / total, np.nan)
+        tem_base = base_total >= min_sessoes_base
+        taxa_base = np.where(tem_base, base_retidas / base_total, np.nan)
+
+        # Retenção do nível inteiro por dia: referência de quem não tem base própria
+        taxa_dia = np.bincount(dia, weights=retidas) / np.bincount(dia, weights=total)
+        referencia = np.where(tem_base, taxa_base, taxa_dia[dia])
+
+        queda = taxa_base - taxa
+        variancia = taxa_base * (1 - taxa_base) / total
+        z = np.where(variancia > 0, queda / np.sqrt(variancia), np.where(queda > 0, np.inf, 0.0))
+
+    com_queda = volume & tem_base & (queda * 100 >= limiar_queda_pp) & (z >= limiar_z)
+
+    # Sequência de dias zerados: contagem acumulada menos a contagem no último
+    # marco (dia com volume e retenção > 0, ou início do segmento); dias sem
+    # volume suficiente não são marco, mesmo com alguma sessão retida
+    contagem = np.cumsum(zerada)
+    primeiro = np.ones(n, dtype=bool)
+    primeiro[1:] = segmento[1:] != segmento[:-1]
+    marco = np.where(volume & (retidas > 0), contagem, np.where(primeiro, contagem - zerada, 0))
+    dias_zerados = contagem - np.maximum.accumulate(marco)
+
+    sinal = zerada | com_queda
+    if not sinal.any():
+        return pd.DataFrame(columns=COLUNAS_CELULAS)
+
+    linhas = ordem[sinal]
+    celulas = nivel.iloc[linhas][dims + ["session_date"]].reset_index(drop=True)
+    for dim in dims:
+        celulas[dim] = celulas[dim].astype(str)
+    segmento_txt = celulas[dims[0]]
+    for dim in dims[1:]:
+        segmento_txt = segmento_txt + " / " + celulas[dim]
+    celulas["segmento"] = segmento_txt
+    celulas["nivel"] = _nome_nivel(dims)
+    celulas["tipo"] = np.where(zerada[sinal], "retencao_zero", "queda")
+    celulas["sessoes_total"] = total[sinal].astype("int64")
+    celulas["sessoes_retidas"] = retidas[sinal].astype("int64")
+    celulas["retencao_pct"] = np.round(taxa[sinal] * 100, 2)
+    celulas["baseline_pct"] = np.round(taxa_base[sinal] * 100, 2)
+    celulas["queda_pp"] = np.round(queda[sinal] * 100, 2)
+    celulas["z_queda"] = np.round(z[sinal], 2)
+    celulas["dias_zerados"] = dias_zerados[sinal]
+    celulas["impacto_sessoes"] = np.round(total[sinal] * np.maximum(referencia[sinal] - taxa[sinal], 0), 1)
+    return celulas.reindex(columns=COLUNAS_CELULAS)
+
+
+def varrer_anomalias(rollup, niveis: list = NIVEIS_VARREDURA, **parametros) -> pd.DataFrame:
+    """
+    Varre todos os níveis de `niveis` (cada um derivado do rollup, com session_date)
+    e devolve as células anômalas de todos eles, da maior para a menor em impacto.
+
+    Dimensões fora do nível ficam como "(todos)". `parametros` vai para varrer_nivel.
+    """
+    partes = []
+    for dims in niveis:
+        nivel = rollup.nivel(["session_date"] + list(dims))
+        partes.append(varrer_nivel(nivel, dims, **parametros))
+
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_CELULAS)
+
+    celulas = pd.concat(partes, ignore_index=True)
+    celulas[DIMENSOES] = celulas[DIMENSOES].fillna("(todos)")
+    return celulas.sort_values(
+        ["impacto_sessoes", "sessoes_total"], ascending=False, kind="stable"
+    ).reset_index(drop=True)
+
+
+def episodios_anomalos(celulas: pd.DataFrame, folga_dias: int = 2) -> pd.DataFrame:
+    """
+    Junta células do mesmo segmento e tipo em episódios (dias sinalizados com
+    no máximo `folga_dias` dias de intervalo) e ranqueia os episódios pelo
+    impacto somado (sessões retidas perdidas).
+    """
+    chaves = ["nivel", "segmento", "tipo"]
+    colunas = [
+        "rank", *chaves, *DIMENSOES, "inicio", "fim", "dias_sinalizados",
+        "sessoes_total", "sessoes_retidas", "retencao_pct", "baseline_pct",
+        "queda_pp_max", "impacto_sessoes",
+    ]
+    if celulas.empty:
+        return pd.DataFrame(columns=colunas)
+
+    c = celulas.sort_values(chaves + ["session_date"], kind="stable").reset_index(drop=True)
+    mesmo = (c[chaves] == c[chaves].shift()).all(axis=1)
+    perto = c["session_date"].diff().dt.days <= folga_dias + 1
+    c["_episodio"] = np.cumsum(~(mesmo & perto).to_numpy())
+
+    # Base ponderada pelo volume dos dias que têm base
+    c["_base_x_total"] = c["baseline_pct"] * c["sessoes_total"]
+    c["_total_com_base"] = c["sessoes_total"].where(c["baseline_pct"].notna(), 0)
+
+    ep = c.groupby("_episodio", sort=False).agg(
+        **{col: (col, "first") for col in chaves + DIMENSOES},
+        inicio=("session_date", "min"),
+        fim=("session_date", "max"),
+        dias_sinalizados=("session_date", "size"),
+        sessoes_total=("sessoes_total", "sum"),
+        sessoes_retidas=("sessoes_retidas", "sum"),
+        queda_pp_max=("queda_pp", "max"),
+        impacto_sessoes=("impacto_sessoes", "sum"),
+        _base_x_total=("_base_x_total", "sum"),
+        _total_com_base=("_total_com_base", "sum"),
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ep["retencao_pct"] = np.round(ep["sessoes_retidas"] / ep["sessoes_total"] * 100, 2)
+        ep["baseline_pct"] = np.round(
+            np.where(ep["_total_com_base"] > 0, ep["_base_x_total"] / ep["_total_com_base"], np.nan), 2
+        )
+    ep["impacto_sessoes"] = ep["impacto_sessoes"].round(1)
+
+    ep = ep.sort_values(["impacto_sessoes", "sessoes_total"], ascending=False, kind="stable").reset_index(drop=True)
+    ep["rank"] = np.arange(1, len(ep) + 1)
+    return ep[colunas]
@@ -1,75 +1,176 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
-from matplotlib.lines import Line2D
-from scipy import stats
 import os
 import script 
+import graficos
+from cache import cache_resultados, impressao_digital
+from instrumentacao import registro, medir_etapa
+from bundle import OBJETOS_DASHBOARD, ler_manifesto, abrir_bundle
+from cubo import CuboRetencao
+from tabelas import TAMANHOS_PAGINA, ORDEM_IMPACTO, colunas_percentuais, impacto, ordem_linhas, fatiar
 
 sns.set(style="whitegrid")
 
+# Instrumentação por sessão: ?instrumentacao=tempo|memoria|perfil na URL liga as
+# medições desta execução e o painel oculto na barra lateral
+registro.iniciar_execucao(st.query_params.get("instrumentacao"))
+
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 # HELPER PARA FORMATAR PERCENTUAIS
 
-def format_percent_columns(df: pd.DataFrame, extra_pct_cols=None) -> pd.DataFrame:
+def config_percentuais(df: pd.DataFrame, extra_pct_cols=None) -> dict:
     """
-    - Arredonda para 2 casas os campos de percentual
-    - Acrescenta ' (%)' ao nome da coluna
-    Critério:
-      - Nome da coluna contém 'pct', 'percent', 'percentual', 'taxa' ou '%'
-      - + colunas extras passadas explicitamente em extra_pct_cols
+    column_config do st.dataframe para os campos de percentual (critério em
+    tabelas.colunas_percentuais): 2 casas e ' (%)' no rótulo, como metadado de
+    exibição, sem copiar nem renomear o frame.
     """
-    df_fmt = df.copy()
-    pct_cols = [
-        c for c in df_fmt.columns
-        if any(k in c.lower() for k in ["pct", "percent", "percentual", "taxa", "%"])
-    ]
+    return {
+        c: st.column_config.NumberColumn(label=f"{c} (%)", format="%.2f")
+        for c in colunas_percentuais(df.columns, extra_pct_cols)
+    }
+
 
-    if extra_pct_cols:
-        for c in extra_pct_cols:
-            if c in df_fmt.columns and c not in pct_cols:
-                pct_cols.append(c)
+# RECUPERAR OBJETOS DO script.py
+# Caminho principal: bundle de resultados pré-calculado (python bundle.py), aberto por
+# memory map, sem rodar a análise. Sem bundle válido, calcula pelo pipeline.
+# Em ambos os casos os objetos ficam no cache de resultados (LRU com orçamento de
+# memória, ver cache.py), compartilhados entre sessões/reruns.
+DIR_BUNDLE = os.environ.get("CASE_STONE_BUNDLE", os.path.join(APP_DIR, "resultados"))
 
-    if pct_cols:
-        df_fmt[pct_cols] = df_fmt[pct_cols].round(2)
-        df_fmt = df_fmt.rename(columns={c: f"{c} (%)" for c in pct_cols})
 
-    return df_fmt
+def calcular_objetos() -> dict:
+    pipeline = script.PipelineRetencao(script.file_path)
+    return {nome: getattr(pipeline, nome) for nome in OBJETOS_DASHBOARD}
 
 
-# RECUPERAR OBJETOS DO script.py
-df = script.df
-df_monthly_macro = script.df_monthly_macro
-bots = script.bots
-palette = script.palette
+manifesto = ler_manifesto(DIR_BUNDLE)
+with medir_etapa("app: objetos do pipeline"):
+    if manifesto is not None:
+        # Impressão digital gravada no bundle: identifica os dados sem ler o Excel
+        impressao = manifesto["impressao"]
+        objetos = cache_resultados.obter(("bundle", impressao), lambda: abrir_bundle(DIR_BUNDLE, manifesto))
+    else:
+        # Impressão digital da base (hash do Excel + versão do pipeline): muda quando os dados mudam
+        impressao = impressao_digital(script.file_path, script.VERSAO_PIPELINE)
+        objetos = cache_resultados.obter(("objetos", impressao), calcular_objetos)
+
+df_monthly_macro = objetos["df_monthly_macro"]
+bots = objetos["bots"]
+palette = objetos["palette"]
 
 # Objetos da questão 2
-df_mix_fonte = script.df_mix_fonte
-df_mix_tecnologia = script.df_mix_tecnologia
-df_mix_topico = script.df_mix_topico
-df_mix_assunto = script.df_mix_assunto
-deep_fonte = script.deep_fonte
-topicos_criticos_por_bot = script.topicos_criticos_por_bot
-assuntos_criticos_por_bot = script.assuntos_criticos_por_bot
-topicos_positivos_por_bot = script.topicos_positivos_por_bot
-assuntos_positivos_por_bot = script.assuntos_positivos_por_bot
-dfs_topicos_criticos = script.dfs_topicos_criticos
-dfs_assuntos_criticos = script.dfs_assuntos_criticos
-dfs_topicos_positivos = script.dfs_topicos_positivos
-dfs_assuntos_positivos = script.dfs_assuntos_positivos
-df_projecoes = script.df_projecoes
+df_episodios_anomalos = objetos["df_episodios_anomalos"]
+segmento_deep_fonte = objetos["segmento_deep_fonte"]
+deep_fonte = objetos["deep_fonte"]
+topicos_criticos_por_bot = objetos["topicos_criticos_por_bot"]
+assuntos_criticos_por_bot = objetos["assuntos_criticos_por_bot"]
+topicos_positivos_por_bot = objetos["topicos_positivos_por_bot"]
+assuntos_positivos_por_bot = objetos["assuntos_positivos_por_bot"]
+dfs_topicos_criticos = objetos["dfs_topicos_criticos"]
+dfs_assuntos_criticos = objetos["dfs_assuntos_criticos"]
+dfs_topicos_positivos = objetos["dfs_topicos_positivos"]
+dfs_assuntos_positivos = objetos["dfs_assuntos_positivos"]
+df_projecoes = objetos["df_projecoes"]
 
 # Objetos da questão 2 - resumo mês atual vs histórico
-from script import resumo_mes_atual_vs_historico, df_daily
-resumo, mes_atual, mes_anterior, max_day_atual = resumo_mes_atual_vs_historico(df_daily)
+mes_atual = objetos["mes_atual"]
+mes_anterior = objetos["mes_anterior"]
+max_day_atual = objetos["max_day_atual"]
 
 # Objetos da questão 3 (projeção)
-df_future_trend  = script.df_future_trend 
-df_2025_full = script.df_2025_full
-df_indicador_anual = script.df_indicador_anual
+df_future_trend = objetos["df_future_trend"]
+df_2025_full = objetos["df_2025_full"]
+df_indicador_anual = objetos["df_indicador_anual"]
+
+
+# HELPERS DE CACHE (tabelas formatadas e figuras renderizadas)
+
+def mostrar_tabela(nome: str, df: pd.DataFrame, extra_pct_cols=None, hide_index: bool = False):
+    """
+    st.dataframe com percentuais formatados por column_config. Tabelas maiores
+    que a menor página são ordenadas e fatiadas no servidor (ver tabelas.py):
+    o navegador recebe só a página visível, e a primeira página padrão é o
+    top-N por impacto. A ordem fica memorizada por base + nome da tabela.
+    """
+    config = config_percentuais(df, extra_pct_cols)
+    if len(df) <= TAMANHOS_PAGINA[0]:
+        st.dataframe(df, column_config=config, use_container_width=True, hide_index=hide_index)
+        return
+
+    opcoes = ([ORDEM_IMPACTO] if impacto(df) is not None else []) + [str(c) for c in df.columns]
+    c_ordem, c_sentido, c_tamanho, c_pagina = st.columns([3, 1, 1, 1])
+    coluna = c_ordem.selectbox("Ordenar por", opcoes, key=f"tabela:{nome}:ordem")
+    crescente = c_sentido.checkbox("Crescente", key=f"tabela:{nome}:crescente")
+    tamanho = c_tamanho.selectbox("Linhas", TAMANHOS_PAGINA, key=f"tabela:{nome}:tamanho")
+    paginas = -(-len(df) // tamanho)
+    # Chave com o tamanho: trocar o tamanho volta à primeira página (sem página fora do limite)
+    pagina = int(c_pagina.number_input(
+        "Página", min_value=1, max_value=paginas, value=1, step=1, key=f"tabela:{nome}:pagina:{tamanho}",
+    ))
+
+    ordem = cache_resultados.obter(
+        ("ordem", impressao, nome, coluna, crescente), lambda: ordem_linhas(df, coluna, crescente),
+    )
+    st.dataframe(fatiar(df, ordem, pagina, tamanho), column_config=config, use_container_width=True, hide_index=hide_index)
+    inicio = (pagina - 1) * tamanho
+    st.caption(
+        f"Linhas {inicio + 1}–{min(inicio + tamanho, len(df))} de {len(df):,} ".replace(",", ".")
+        + f"(página {pagina} de {paginas}, por {coluna}{' crescente' if crescente else ''})"
+    )
+
+
+def figura_png(nome: str, desenhar) -> bytes:
+    """
+    PNG da figura de desenhar() renderizado uma única vez por base + nome
+    (impressão digital dos dados); a figura é liberada logo após a renderização.
+    """
+    def renderizar():
+        with medir_etapa(f"app: figura {nome}"):
+            return graficos.renderizar_png(desenhar())
+
+    return cache_resultados.obter(("figura", impressao, nome), renderizar)
+
+
+def matriz_correlacao(bot: str) -> pd.DataFrame:
+    def calcular():
+        df_bot = df_monthly_macro[df_monthly_macro["chatbot"] == bot]
+        return df_bot[["retencao_pct", "pct_pedido_atendimento"]].corr(method="pearson")
+
+    return cache_resultados.obter(("correlacao", impressao, bot), calcular)
+
+
+# FILTROS INTERATIVOS (barra lateral)
+# Servidos pelo cubo agregado em memória (ver cubo.py): montado uma vez por base,
+# cada combinação de filtros é respondida pelos marginais pré-calculados, sem
+# groupby na base. Sem filtro ativo, o dashboard usa os objetos do pipeline.
+ROTULOS_FILTRO = {
+    "chatbot": "Chatbot",
+    "fonte": "Fonte (canal)",
+    "tecnologia_do_chatbot": "Tecnologia",
+    "topico_da_sessao": "Tópico da sessão",
+    "assunto_da_sessao": "Assunto da sessão",
+}
+
+with medir_etapa("app: cubo"):
+    cubo = cache_resultados.obter(("cubo", impressao), lambda: CuboRetencao(objetos["df_cubo"]))
+
+
+def visao_filtrada(filtros: dict, meses: tuple) -> dict:
+    """
+    Histórico, resumo e mix para os filtros (ver script.analisar_recorte),
+    memorizado por base + combinação de filtros. {} se não houver sessões.
+    """
+    assinatura = (tuple((dim, tuple(valores)) for dim, valores in filtros.items() if valores), meses)
+
+    def calcular():
+        with medir_etapa("app: visão filtrada (cubo)"):
+            return script.analisar_recorte(cubo.recortar(filtros, meses), bots)
+
+    return cache_resultados.obter(("visao", impressao, assinatura), calcular)
+
 
 # CONFIG STREAMLIT + ESTILO STONE
 
@@ -149,6 +250,38 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# Filtros na barra lateral: valem para o histórico mensal, o resumo mês atual x
+# histórico e as tabelas de mix da Questão 2
+with st.sidebar:
+    st.header("Filtros")
+    filtros = {
+        dim: st.multiselect(rotulo, cubo.valores(dim), placeholder="Todos")
+        for dim, rotulo in ROTULOS_FILTRO.items()
+    }
+    meses_cubo = [int(m) for m in cubo.meses]
+    meses_filtro = st.select_slider(
+        "Meses",
+        options=meses_cubo,
+        value=(meses_cubo[0], meses_cubo[-1]),
+        format_func=lambda m: f"{m // 100}-{m % 100:02d}",
+    )
+
+filtro_ativo = any(filtros.values()) or tuple(meses_filtro) != (meses_cubo[0], meses_cubo[-1])
+if filtro_ativo:
+    visao = visao_filtrada(filtros, tuple(meses_filtro))
+    # Sufixo das chaves de cache das tabelas/figuras filtradas
+    sufixo_visao = f"{sorted((d, v) for d, v in filtros.items() if v)}{tuple(meses_filtro)}"
+    if not visao:
+        st.sidebar.warning("Nenhuma sessão para os filtros selecionados.")
+else:
+    visao = objetos
+    sufixo_visao = ""
+
+legenda_filtros = "Filtros: " + "; ".join(
+    [f"{ROTULOS_FILTRO[d]}: {', '.join(map(str, v))}" for d, v in filtros.items() if v]
+    + [f"meses {meses_filtro[0] // 100}-{meses_filtro[0] % 100:02d} a {meses_filtro[1] // 100}-{meses_filtro[1] % 100:02d}"]
+)
+
 tab1, tab2, tab3 = st.tabs(
     ["Questão 1 - Modelagem & Tabelas",
      "Questão 2 - Diagnóstico & Próximos Passos",
@@ -158,7 +291,7 @@ tab1, tab2, tab3 = st.tabs(
 # ------------------------------------------------------------------
 # ABA 1 - QUESTÃO 1
 # ------------------------------------------------------------------
-with tab1:
+with tab1, medir_etapa("app: aba Questão 1"):
     st.header("Questão 1 - Construção das Tabelas de Fonte")
 
     st.markdown(
@@ -218,7 +351,7 @@ with tab1:
 # ------------------------------------------------------------------
 # ABA 2 - QUESTÃO 2
 # ------------------------------------------------------------------
-with tab2:
+with tab2, medir_etapa("app: aba Questão 2"):
     st.header("Questão 2 - Diagnóstico da Retenção & Próximos Passos")
     
     # 1) CONCLUSÕES GERAIS
@@ -273,7 +406,7 @@ A projeção de agosto responde ao pedido **“Faça uma projeção de como fech
 - Combina os dois para estimar a **retenção projetada para o mês cheio** por chatbot.
         """
     )
-    st.dataframe(format_percent_columns(df_projecoes, ['media_dias_1_14', 'proj_dias_15_31', 'retencao_proj_final_agosto']), use_container_width=True)
+    mostrar_tabela("df_projecoes", df_projecoes, ['media_dias_1_14', 'proj_dias_15_31', 'retencao_proj_final_agosto'])
     
     st.subheader("Conclusão da Questão 2 - Próximos Passos Recomendados")
     st.markdown(
@@ -316,55 +449,15 @@ A projeção de agosto responde ao pedido **“Faça uma projeção de como fech
         """
     )
 
-    fig_hist, ax = plt.subplots(figsize=(12, 5))
-
-    import numpy as np
-    # Retenção - linha cheia
-    sns.lineplot(
-        data=df_monthly_macro,
-        x="session_month",
-        y="retencao_pct",
-        hue="chatbot",
-        palette=palette,
-        marker="o",
-        linewidth=2,
-        legend=False,
-        ax=ax,
-    )
+    if filtro_ativo:
+        st.caption(legenda_filtros)
+    if visao:
+        def desenhar_historico():
+            return graficos.historico_mensal(visao["df_monthly_macro"], palette, visao["bots"])
 
-    # Pedido de atendimento - linha tracejada
-    sns.lineplot(
-        data=df_monthly_macro,
-        x="session_month",
-        y="pct_pedido_atendimento",
-        hue="chatbot",
-        palette=palette,
-        marker="o",
-        linewidth=2,
-        linestyle="--",
-        legend=False,
-        ax=ax,
-    )
-
-    ax.set_xlabel("Mês")
-    ax.set_ylabel("Percentual (%)")
-    ax.set_title("Histórico Mensal: Retenção x Pedido de Atendimento por Chatbot")
-    plt.xticks(rotation=45)
-    ax.grid(True)
-
-    custom_lines = [
-        Line2D([0], [0], color=palette[bots[0]], lw=2, marker="o", linestyle="-",
-               label=f"{bots[0]} - Retenção"),
-        Line2D([0], [0], color=palette[bots[0]], lw=2, marker="", linestyle="--",
-               label=f"{bots[0]} - Pedido de atendimento"),
-        Line2D([0], [0], color=palette[bots[1]], lw=2, marker="o", linestyle="-",
-               label=f"{bots[1]} - Retenção"),
-        Line2D([0], [0], color=palette[bots[1]], lw=2, marker="", linestyle="--",
-               label=f"{bots[1]} - Pedido de atendimento"),
-    ]
-    ax.legend(handles=custom_lines, title="Métrica", loc="best")
-
-    st.pyplot(fig_hist)
+        st.image(figura_png(f"historico_mensal{sufixo_visao}", desenhar_historico), use_container_width=True)
+    else:
+        st.info("Nenhuma sessão para os filtros selecionados.")
 
     # 4) MÊS ATUAL vs HISTÓRICO
     st.subheader("Mês Atual x Média Histórica (mesma janela de dias)")
@@ -377,7 +470,17 @@ Esse comparativo mostra, por bot:
 - Como está a relação entre retenção e **pedido de atendimento** frente ao mês imediatamente anterior.
         """
     )
-    st.dataframe(format_percent_columns(resumo), use_container_width=True)
+    if filtro_ativo:
+        st.caption(legenda_filtros)
+    if visao:
+        if filtro_ativo:
+            st.caption(
+                f"Mês atual: {visao['mes_atual']} (parcial até dia {visao['max_day_atual']}) "
+                f"x mês anterior: {visao['mes_anterior']}"
+            )
+        mostrar_tabela(f"resumo{sufixo_visao}", visao["resumo"])
+    else:
+        st.info("Nenhuma sessão para os filtros selecionados.")
 
     # 5) CORRELAÇÃO (NÍVEL MÉDIO)
     st.subheader("Correlação entre Retenção e Pedido de Atendimento (por Chatbot)")
@@ -391,8 +494,7 @@ Esse comparativo mostra, por bot:
 
     for bot in bots:
         st.markdown(f"**Chatbot: {bot}**")
-        df_bot = df_monthly_macro[df_monthly_macro["chatbot"] == bot]
-        corr_matrix = df_bot[["retencao_pct", "pct_pedido_atendimento"]].corr(method="pearson")
+        corr_matrix = matriz_correlacao(bot)
 
         col1, col2 = st.columns(2)
         with col1:
@@ -400,18 +502,10 @@ Esse comparativo mostra, por bot:
             # aqui NÃO formato, porque correlação não é percentual
             st.dataframe(corr_matrix, use_container_width=True)
         with col2:
-            fig_corr, ax_corr = plt.subplots(figsize=(4, 3))
-            sns.heatmap(
-                corr_matrix,
-                annot=True,
-                cmap="Blues",
-                fmt=".2f",
-                vmin=-1,
-                vmax=1,
-                ax=ax_corr,
-            )
-            ax_corr.set_title(f"Correlação - {bot}")
-            st.pyplot(fig_corr)
+            def desenhar_correlacao(bot=bot, corr_matrix=corr_matrix):
+                return graficos.correlacao(corr_matrix, bot)
+
+            st.image(figura_png(f"correlacao[{bot}]", desenhar_correlacao))
 
     # 6) DETALHAMENTO EM TABELAS
     st.subheader("Detalhamento em Tabelas - Mix, Tópicos e Assuntos")
@@ -426,32 +520,62 @@ A partir daqui, descemos a granularidade para explicar **o porquê** do comporta
         """
     )
 
-    # --- Mix por canal / tecnologia / tópico / assunto ---
-    with st.expander("Mix por Fonte (Canal) - mês atual vs anterior"):
-        st.dataframe(format_percent_columns(df_mix_fonte), use_container_width=True)
-
-    with st.expander("Mix por Tecnologia - mês atual vs anterior"):
-        st.dataframe(format_percent_columns(df_mix_tecnologia), use_container_width=True)
-
-    with st.expander("Mix por Tópico da Sessão - mês atual vs anterior"):
-        st.dataframe(format_percent_columns(df_mix_topico), use_container_width=True)
-
-    with st.expander("Mix por Assunto da Sessão - mês atual vs anterior"):
-        st.dataframe(format_percent_columns(df_mix_assunto), use_container_width=True)
-
-    # --- Deep dive Chat_C BOT_A ---
-    st.subheader("Deep Dive 1 - Canal `Chat_C` para BOT_A (Retenção Zerada em Agosto)")
-
+    # --- Mix por canal / tecnologia / tópico / assunto (segue os filtros da barra lateral) ---
+    if filtro_ativo:
+        st.caption(legenda_filtros)
+    for nome, titulo in [
+        ("df_mix_fonte", "Mix por Fonte (Canal) - mês atual vs anterior"),
+        ("df_mix_tecnologia", "Mix por Tecnologia - mês atual vs anterior"),
+        ("df_mix_topico", "Mix por Tópico da Sessão - mês atual vs anterior"),
+        ("df_mix_assunto", "Mix por Assunto da Sessão - mês atual vs anterior"),
+    ]:
+        with st.expander(titulo):
+            if visao:
+                mostrar_tabela(f"{nome}{sufixo_visao}", visao[nome])
+            else:
+                st.info("Nenhuma sessão para os filtros selecionados.")
+
+    # --- Varredura de anomalias (todos os segmentos x dias) ---
+    st.subheader("Varredura de Anomalias - Episódios de Maior Impacto")
     st.markdown(
         """
-- **Anomalia clara:** `Chat_C` para BOT_A apresenta retenção zerada em agosto,
-  em diversos dias, com ~4,7k sessões impactadas.
-- Historicamente, esse canal tinha retenção média em torno de **63%**,
-  reforçando a hipótese de **problema de fluxo ou de registro de métrica**.
+- Todas as células **segmento x dia** (bot, bot x fonte, bot x tecnologia, bot x tópico,
+  bot x assunto e o grão completo) são comparadas com a **linha de base móvel de 28 dias** do próprio segmento.
+- **retencao_zero**: dias com volume e nenhuma sessão retida; **queda**: queda relevante e significativa vs a linha de base.
+- O ranking é pelo **impacto**: sessões retidas perdidas em relação à linha de base.
         """
     )
+    mostrar_tabela("df_episodios_anomalos", df_episodios_anomalos, hide_index=True)
+
+    # --- Deep dive: fonte zerada de maior impacto (Chat_C BOT_A na base do case) ---
+    if segmento_deep_fonte:
+        bot_deep, fonte_deep = segmento_deep_fonte
+        st.subheader(f"Deep Dive 1 - Canal `{fonte_deep}` para {bot_deep} (Retenção Zerada em {mes_atual})")
+
+        # Texto montado do episódio que originou o deep dive (o mesmo de script._maior_episodio)
+        ep = df_episodios_anomalos[
+            (df_episodios_anomalos["nivel"] == "chatbot x fonte")
+            & (df_episodios_anomalos["tipo"] == "retencao_zero")
+            & (df_episodios_anomalos["chatbot"] == bot_deep)
+            & (df_episodios_anomalos["fonte"] == fonte_deep)
+            & (df_episodios_anomalos["fim"].dt.to_period("M") == mes_atual)
+        ].iloc[0]
+        sessoes_k = f"{ep['sessoes_total'] / 1000:.1f}".replace(".", ",")
+        texto = (
+            f"- **Anomalia clara:** `{fonte_deep}` para {bot_deep} apresenta retenção zerada em {mes_atual},\n"
+            f"  em {ep['dias_sinalizados']} dia(s) entre {ep['inicio']:%d/%m} e {ep['fim']:%d/%m}, "
+            f"com ~{sessoes_k}k sessões impactadas.\n"
+        )
+        if pd.notna(ep["baseline_pct"]):
+            texto += (
+                f"- Historicamente, esse canal tinha retenção média em torno de **{ep['baseline_pct']:.0f}%**,\n"
+                "  reforçando a hipótese de **problema de fluxo ou de registro de métrica**.\n"
+            )
+        st.markdown(texto)
+    else:
+        st.subheader("Deep Dive 1 - Nenhum canal com retenção zerada no mês atual")
 
-    st.dataframe(format_percent_columns(deep_fonte), use_container_width=True)
+    mostrar_tabela("deep_fonte", deep_fonte)
    
     # --- Tópicos e assuntos críticos / positivos ---
     st.subheader("Deep Dive 2 - Tópicos e Assuntos Críticos / Positivos")
@@ -472,37 +596,37 @@ A partir daqui, descemos a granularidade para explicar **o porquê** do comporta
 
         st.markdown("**Tópicos críticos (retencao_atual_pct < 20 e delta_retencao_pp < -10 p.p.)**")
         if topicos_criticos_por_bot[bot]:
-            st.write(pd.DataFrame({"topico_da_sessao": topicos_criticos_por_bot[bot]}))
+            mostrar_tabela(f"topicos_criticos_por_bot[{bot}]", pd.DataFrame({"topico_da_sessao": topicos_criticos_por_bot[bot]}))
             st.write("Detalhe dos tópicos críticos (mês de agosto):")
-            st.dataframe(format_percent_columns(dfs_topicos_criticos[bot]), use_container_width=True)
+            mostrar_tabela(f"dfs_topicos_criticos[{bot}]", dfs_topicos_criticos[bot])
         else:
             st.write("Nenhum tópico crítico identificado.")
 
         st.markdown("**Assuntos críticos (retencao_atual_pct < 20 e delta_retencao_pp < -10 p.p.)**")
         if assuntos_criticos_por_bot[bot]:
-            st.write(pd.DataFrame({"assunto_da_sessao": assuntos_criticos_por_bot[bot]}))
+            mostrar_tabela(f"assuntos_criticos_por_bot[{bot}]", pd.DataFrame({"assunto_da_sessao": assuntos_criticos_por_bot[bot]}))
             st.write("Detalhe dos assuntos críticos (mês de agosto):")
-            st.dataframe(format_percent_columns(dfs_assuntos_criticos[bot]), use_container_width=True)
+            mostrar_tabela(f"dfs_assuntos_criticos[{bot}]", dfs_assuntos_criticos[bot])
         else:
             st.write("Nenhum assunto crítico identificado.")
 
         st.markdown("**Tópicos com variação positiva relevante (retencao_atual_pct > 20 e delta_retencao_pp > 10 p.p.)**")
         if topicos_positivos_por_bot[bot]:
-            st.write(pd.DataFrame({"topico_da_sessao": topicos_positivos_por_bot[bot]}))
-            st.dataframe(format_percent_columns(dfs_topicos_positivos[bot]), use_container_width=True)
+            mostrar_tabela(f"topicos_positivos_por_bot[{bot}]", pd.DataFrame({"topico_da_sessao": topicos_positivos_por_bot[bot]}))
+            mostrar_tabela(f"dfs_topicos_positivos[{bot}]", dfs_topicos_positivos[bot])
         else:
             st.write("Nenhum tópico com variação positiva relevante identificado.")
 
         st.markdown("**Assuntos com variação positiva relevante**")
         if assuntos_positivos_por_bot[bot]:
-            st.dataframe(format_percent_columns(dfs_assuntos_positivos[bot]), use_container_width=True)
+            mostrar_tabela(f"dfs_assuntos_positivos[{bot}]", dfs_assuntos_positivos[bot])
         else:
             st.write("Nenhum assunto com variação positiva relevante identificado.")
 
 # ------------------------------------------------------------------
 # ABA 3 - QUESTÃO 3
 # ------------------------------------------------------------------
-with tab3:
+with tab3, medir_etapa("app: aba Questão 3"):
     st.header("Questão 3 - Projeção da Retenção até o Final de 2025")
 
     st.markdown(
@@ -522,60 +646,21 @@ with tab3:
     )
 
     st.subheader("Projeção Mensal - Setembro a Dezembro (Tendência Linear Pós-Maio)")
-    st.dataframe(format_percent_columns(df_future_trend), use_container_width=True)
+    mostrar_tabela("df_future_trend", df_future_trend)
 
     st.subheader("Série 2025 Completa - Real + Agosto Projetado + Projeção Futura")
-    st.dataframe(
-        format_percent_columns(df_2025_full.sort_values(["chatbot", "session_month"])),
-        use_container_width=True,
-    )
+    mostrar_tabela("df_2025_full", df_2025_full.sort_values(["chatbot", "session_month"]))
 
     st.subheader("Gráfico - Retenção 2025 por Chatbot (Real vs Projetado)")
 
     for bot in bots:
-        df_bot_2025 = df_2025_full[df_2025_full["chatbot"] == bot].copy()
-        df_bot_2025 = df_bot_2025.sort_values("session_month")
-    
-        df_bot_2025["tipo"] = df_bot_2025["session_month"].apply(
-            lambda m: "Projetado" if m >= "2025-08" else "Real"
-        )
-    
-        fig_bot, ax_bot = plt.subplots(figsize=(10, 4))
-        sns.lineplot(
-            data=df_bot_2025[df_bot_2025["tipo"] == "Real"],
-            x="session_month",
-            y="retencao_pct",
-            marker="o",
-            label="Real",
-            ax=ax_bot,
-        )
-        sns.lineplot(
-            data=df_bot_2025[df_bot_2025["tipo"] == "Projetado"],
-            x="session_month",
-            y="retencao_pct",
-            marker="o",
-            linestyle="--",
-            label="Projetado",
-            ax=ax_bot,
-        )
-    
-        # --- ajuste da escala do eixo Y ---
-        # y_min = df_bot_2025["retencao_pct"].min()
-        ax_bot.set_ylim(0, 100)
-    
-        ax_bot.set_title(f"Retenção 2025 - {bot}")
-        ax_bot.set_xlabel("Mês")
-        ax_bot.set_ylabel("Retenção (%)")
-        plt.xticks(rotation=45)
-        ax_bot.grid(True)
-    
-        st.pyplot(fig_bot)
+        def desenhar_2025(bot=bot):
+            return graficos.retencao_2025(df_2025_full, bot, str(mes_atual))
+
+        st.image(figura_png(f"retencao_2025[{bot}]", desenhar_2025), use_container_width=True)
 
     st.subheader("Indicador Anual Projetado - Retenção Média 2025")
-    st.dataframe(
-        format_percent_columns(df_indicador_anual, extra_pct_cols=["retencao_media_2025"]),
-        use_container_width=True,
-    )
+    mostrar_tabela("df_indicador_anual", df_indicador_anual, extra_pct_cols=["retencao_media_2025"])
 
     st.subheader("Racional para desenvolvimento da projeção")
     st.markdown(
@@ -647,25 +732,13 @@ Uma premisssa adotada foi a de que entre agosto e dezembro não haverá uma muda
     )
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# ------------------------------------------------------------------
+# PAINEL OCULTO DE INSTRUMENTAÇÃO (só aparece com ?instrumentacao=...)
+# ------------------------------------------------------------------
+if registro.modo:
+    with st.sidebar.expander("Instrumentação - última execução", expanded=True):
+        st.caption(f"Modo: {registro.modo}")
+        st.dataframe(registro.tabela(), use_container_width=True, hide_index=True)
+        for etapa, perfil in registro.perfis().items():
+            st.markdown(f"**Perfil: {etapa}**")
+            st.code(perfil, language=None)
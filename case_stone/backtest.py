@@ -0,0 +1,235 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from projecao import DIAS_MES_MAX, MES_INICIO, METODOS, alinhar_direita, fechamento_no_corte, projetar_matriz
+
+
+class ContextoBacktest:
+    """
+    Agregados de prefixo da série diária, calculados uma única vez.
+
+    Arrays séries x meses x dias (1..31), com somas acumuladas dentro de cada mês:
+    o estado "como se fosse" qualquer dia de corte sai por indexação, sem
+    reagregar a base crua a cada corte.
+    """
+
+    def __init__(self, df_daily: pd.DataFrame, chave: str = "chatbot"):
+        datas = pd.to_datetime(df_daily["session_date"])
+        meses_obs = datas.dt.to_period("M")
+
+        codigos_serie, self.series = pd.factorize(df_daily[chave].astype(str), sort=True)
+        primeiro = meses_obs.min()
+        self.meses = pd.period_range(primeiro, meses_obs.max(), freq="M")
+        idx_mes = ((meses_obs.dt.year - primeiro.year) * 12 + (meses_obs.dt.month - primeiro.month)).to_numpy()
+        idx_dia = datas.dt.day.to_numpy() - 1
+
+        forma = (len(self.series), len(self.meses), DIAS_MES_MAX)
+        total = np.zeros(forma)
+        retidas = np.zeros(forma)
+        np.add.at(total, (codigos_serie, idx_mes, idx_dia), df_daily["sessoes_total"].to_numpy(dtype="float64"))
+        np.add.at(retidas, (codigos_serie, idx_mes, idx_dia), df_daily["sessoes_retidas"].to_numpy(dtype="float64"))
+        # Percentual diário das somas (série, dia): várias linhas do mesmo dia viram um único dia
+        pct = self._retencao(total, retidas)
+
+        # Prefixos dentro do mês: totais, retidas, soma e contagem dos percentuais diários
+        self.acum_total = total.cumsum(axis=2)
+        self.acum_retidas = retidas.cumsum(axis=2)
+        self.acum_pct = np.nan_to_num(pct).cumsum(axis=2)
+        self.acum_dias = (~np.isnan(pct)).cumsum(axis=2)
+
+        # Último dia observado de cada mês (0 se o mês não tem dados)
+        self.ultimo_dia = np.where(total.sum(axis=0) > 0, np.arange(1, DIAS_MES_MAX + 1), 0).max(axis=1)
+
+        # Retenção mensal fechada (mesma regra e arredondamento de df_monthly_macro)
+        self.retencao_mes = self._retencao(self.acum_total[:, :, -1], self.acum_retidas[:, :, -1])
+
+    @staticmethod
+    def _retencao(total: np.ndarray, retidas: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(total > 0, np.round(retidas / total * 100, 2), np.nan)
+
+    def mes_completo(self, m: int) -> bool:
+        # Um mês conta como realizado se não for o último mês da base
+        return m < len(self.meses) - 1
+
+    def cortes(self, min_meses_historico: int = 3, apenas_realizados: bool = True) -> list:
+        """
+        Todos os cortes (índice do mês, dia) com histórico suficiente.
+        """
+        cortes = []
+        for m in range(min_meses_historico, len(self.meses)):
+            if apenas_realizados and not self.mes_completo(m):
+                continue
+            cortes.extend((m, d) for d in range(1, int(self.ultimo_dia[m]) + 1))
+        return cortes
+
+    def projetar_no_corte(self, m: int, dia: int, horizonte: int = 4, mes_inicio: str = MES_INICIO) -> dict:
+        """
+        Reproduz o pipeline como se os dados terminassem no dia `dia` do mês `m`:
+
+        - fechamento do mês: projecao.fechamento_no_corte com corte em `dia`, o
+          tamanho do mês no calendário e fator dos meses desde `mes_inicio`
+          (o padrão de projetar_fechamento); meses anteriores a `mes_inicio`
+          ficam sem fechamento, como o pipeline, que não teria histórico
+        - meses seguintes: métodos de projecao.py sobre o histórico mensal
+          (mês do corte parcial) partindo do fechamento projetado
+        """
+        inicio = (pd.Period(mes_inicio, freq="M") - self.meses[0]).n
+        proj_mes = fechamento_no_corte(
+            self.acum_pct, self.acum_dias, m, dia, self.meses[m].days_in_month, inicio=min(max(inicio, 0), m),
+        )
+        fechamento, fator = proj_mes["retencao_proj_fechamento"], proj_mes["fator_historico"]
+        if m < inicio:
+            fechamento = np.full(len(self.series), np.nan)
+
+        parcial = self._retencao(self.acum_total[:, m, dia - 1], self.acum_retidas[:, m, dia - 1])
+        Y = np.column_stack([self.retencao_mes[:, :m], parcial])
+
+        com_base = ~np.isnan(fechamento) & ~np.isnan(Y).all(axis=1)
+        projecoes = {}
+        if com_base.any():
+            proj = projetar_matriz(alinhar_direita(Y[com_base]), fechamento[com_base], horizonte)
+            for metodo, matriz in proj.items():
+                cheia = np.full((len(self.series), horizonte), np.nan)
+                cheia[com_base] = matriz
+                projecoes[metodo] = cheia
+        return {"fechamento": fechamento, "fator": fator, "projecoes": projecoes}
+
+
+def _avaliar_cortes(contexto: ContextoBacktest, cortes: list, horizonte: int, mes_inicio: str) -> pd.DataFrame:
+    linhas = []
+    n = len(contexto.series)
+    for m, dia in cortes:
+        resultado = contexto.projetar_no_corte(m, dia, horizonte, mes_inicio)
+        data_corte = contexto.meses[m].to_timestamp() + pd.Timedelta(days=dia - 1)
+
+        alvos = [("fechamento_mes", 0, m, resultado["fechamento"])]
+        for metodo in METODOS + ["ensemble"]:
+            if metodo not in resultado["projecoes"]:
+                continue
+            for h in range(1, horizonte + 1):
+                alvos.append((metodo, h, m + h, resultado["projecoes"][metodo][:, h - 1]))
+
+        for metodo, h, m_alvo, previsto in alvos:
+            if m_alvo >= len(contexto.meses) or not contexto.mes_completo(m_alvo):
+                continue
+            linhas.append(pd.DataFrame({
+                "data_corte": data_corte,
+                "chave": contexto.series,
+                "metodo": metodo,
+                "horizonte": h,
+                "mes_alvo": str(contexto.meses[m_alvo]),
+                "previsto": previsto,
+                "realizado": contexto.retencao_mes[:, m_alvo],
+            }, index=range(n)))
+
+    if not linhas:
+        return pd.DataFrame(columns=["data_corte", "chave", "metodo", "horizonte", "mes_alvo", "previsto", "realizado"])
+    return pd.concat(linhas, ignore_index=True)
+
+
+# Contexto compartilhado por processo (enviado uma vez a cada worker, não a cada lote)
+_contexto_worker = None
+
+
+def _iniciar_worker(contexto: ContextoBacktest):
+    global _contexto_worker
+    _contexto_worker = contexto
+
+
+def _avaliar_lote(args) -> pd.DataFrame:
+    cortes, horizonte, mes_inicio = args
+    return _avaliar_cortes(_contexto_worker, cortes, horizonte, mes_inicio)
+
+
+def executar_backtest(
+    df_daily: pd.DataFrame,
+    horizonte: int = 4,
+    mes_inicio: str = MES_INICIO,
+    min_meses_historico: int = 3,
+    jobs: int = None,
+    chave: str = "chatbot",
+) -> pd.DataFrame:
+    """
+    Backtest walk-forward: para cada dia de cada mês realizado, projeta o
+    fechamento do mês e os `horizonte` meses seguintes com todos os métodos
+    e o ensemble, e compara com a retenção mensal realizada.
+
+    - `chave` define as séries (padrão: uma por chatbot; df_daily pode vir
+      de qualquer nível de segmento com session_date e contadores; linhas do
+      mesmo dia de uma série são somadas antes do percentual diário)
+    - O fator de fechamento usa os meses desde `mes_inicio`, como o pipeline
+    - Os cortes são distribuídos em lotes (um por mês) num pool de processos;
+      jobs=1 roda tudo no processo atual
+    - Retorna uma linha por (corte, série, método, horizonte) com previsto,
+      realizado e erro (previsto - realizado, em p.p.)
+    """
+    contexto = ContextoBacktest(df_daily, chave)
+    cortes = contexto.cortes(min_meses_historico)
+
+    lotes = {}
+    for m, dia in cortes:
+        lotes.setdefault(m, []).append((m, dia))
+    tarefas = [(lote, horizonte, mes_inicio) for lote in lotes.values()]
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(tarefas) <= 1:
+        partes = [_avaliar_cortes(contexto, *tarefa) for tarefa in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tarefas)), initializer=_iniciar_worker, initargs=(contexto,)) as pool:
+            partes = list(pool.map(_avaliar_lote, tarefas))
+
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        return _avaliar_cortes(contexto, [], horizonte, mes_inicio)
+    df = pd.concat(partes, ignore_index=True)
+    df["erro"] = df["previsto"] - df["realizado"]
+    return df
+
+
+def resumo_backtest(df_backtest: pd.DataFrame) -> pd.DataFrame:
+    """
+    Métricas de erro por método e horizonte: MAE, RMSE, viés e nº de previsões.
+    """
+    df = df_backtest.dropna(subset=["previsto", "realizado"]).copy()
+    df["erro_abs"] = df["erro"].abs()
+    df["erro_quad"] = df["erro"] ** 2
+    resumo = (
+        df.groupby(["metodo", "horizonte"], sort=True)
+        .agg(
+            mae=("erro_abs", "mean"),
+            rmse=("erro_quad", "mean"),
+            vies=("erro", "mean"),
+            n=("erro", "size"),
+        )
+        .reset_index()
+    )
+    resumo["rmse"] = np.sqrt(resumo["rmse"])
+    resumo[["mae", "rmse", "vies"]] = resumo[["mae", "rmse", "vies"]].round(2)
+    return resumo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest walk-forward das projeções de retenção.")
+    parser.add_argument("--input", help="Base agregada (padrão: a mesma do script.py)")
+    parser.add_argument("--output", help="CSV com todas as previsões do backtest")
+    parser.add_argument("--horizonte", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    import script
+    from carga import carregar_base
+    from incremental import ler_tabela
+
+    # Mesma leitura do cli.py: Excel pela cópia colunar de carga.py, CSV/Parquet direto
+    entrada = args.input or script.file_path
+    df = carregar_base(entrada) if entrada.lower().endswith((".xlsx", ".xls")) else ler_tabela(entrada)
+    pipeline = script.PipelineRetencao(entrada, df=df)
+    df_bt = executar_backtest(pipeline.df_daily, horizonte=args.horizonte, jobs=args.jobs)
+    if args.output:
+        df_bt.to_csv(args.output, index=False)
+    print(resumo_backtest(df_bt).to_string(index=False))
@@ -0,0 +1,277 @@
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+import pandas as pd
+
+import script
+from carga import caminhos_cache, carregar_base, normalizar_esquema
+
+
+# Fatores de escala padrão sobre a base do case
+ESCALAS = [1, 10, 100]
+
+# Linhas de dados que cabem numa planilha (limite do Excel menos o cabeçalho):
+# escalas maiores não medem a leitura do Excel
+LIMITE_LINHAS_EXCEL = 1_048_575
+
+# Etapas medidas, na ordem de dependência do pipeline:
+# (nome da etapa, atributos do PipelineRetencao calculados nela).
+# Antes delas, a carga da fonte: carregar_base do Excel sem cópia colunar
+# (carga_excel_fria: leitura do Excel + gravação do Parquet) e com ela
+# (carga_excel_cache), e normalizar_esquema sobre a base crua.
+# "carga" é o pipeline a partir da base crua em Parquet (inclui a normalização).
+ETAPAS = [
+    ("carga", ["df"]),
+    ("rollup", ["rollup"]),
+    ("construir_df_diario", ["df_daily"]),
+    ("resumo_mes_atual_vs_historico", ["_resumo_mes"]),
+    ("comparar_mix", ["resultados_por_feature"]),
+    ("segmentos_criticos_positivos", ["_segmentos_criticos", "_segmentos_positivos", "_dfs_criticos", "_dfs_positivos"]),
+    ("varredura_anomalias", ["df_anomalias", "df_episodios_anomalos"]),
+    ("projecao_agosto", ["df_projecoes"]),
+    ("projecao_segmentos", ["df_projecoes_segmentos"]),
+    ("projecao_ensemble", ["df_future_trend"]),
+]
+
+
+def escalar_base(df: pd.DataFrame, fator: int) -> pd.DataFrame:
+    """
+    Base `fator` vezes maior, com a mesma estrutura de datas e bots: cada
+    réplica ganha assuntos próprios (sufixo #i), então o grão continua único.
+    """
+    if fator == 1:
+        return df.copy()
+    replicas = []
+    for i in range(fator):
+        r = df.copy()
+        if i > 0:
+            r["assunto_da_sessao"] = r["assunto_da_sessao"].astype(str) + f"#{i}"
+        replicas.append(r)
+    return pd.concat(replicas, ignore_index=True)
+
+
+def _medir(funcao, memoria: bool):
+    gc.collect()
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    funcao()
+    segundos = time.perf_counter() - inicio
+    pico_mb = None
+    if memoria:
+        pico_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return segundos, pico_mb
+
+
+def _loop_comparar_mix_mes(pipeline: script.PipelineRetencao):
+    # Caminho original: uma chamada de comparar_mix_mes por (feature, bot), direto na base
+    for feature in script.features:
+        for bot in pipeline.bots:
+            script.comparar_mix_mes(
+                pipeline.df, pipeline.mes_atual, pipeline.mes_anterior,
+                chatbot=bot, feature=feature, max_day=pipeline.max_day_atual,
+            )
+
+
+def _medir_carga(arquivo: str, memoria: bool, excel: str = None, cache_dir: str = None) -> dict:
+    # Carga da fonte: Excel sem e com a cópia colunar (carga.carregar_base) e normalizar_esquema
+    resultados = {}
+    if excel is not None:
+        for caminho in caminhos_cache(excel, cache_dir):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        resultados["carga_excel_fria"] = _medir(lambda: carregar_base(excel, cache_dir), memoria)
+        resultados["carga_excel_cache"] = _medir(lambda: carregar_base(excel, cache_dir), memoria)
+
+    bruta = pd.read_parquet(arquivo)
+    resultados["normalizar_esquema"] = _medir(lambda: normalizar_esquema(bruta), memoria)
+    return resultados
+
+
+def _executar_etapas(arquivo: str, memoria: bool, incluir_loop_mix: bool, excel: str = None, cache_dir: str = None) -> dict:
+    pipeline = None
+    resultados = _medir_carga(arquivo, memoria, excel, cache_dir)
+
+    def carga():
+        nonlocal pipeline
+        pipeline = script.PipelineRetencao(df=pd.read_parquet(arquivo))
+        pipeline.df
+
+    for etapa, atributos in ETAPAS:
+        if etapa == "carga":
+            funcao = carga
+        else:
+            funcao = lambda atributos=atributos: [getattr(pipeline, a) for a in atributos]
+        resultados[etapa] = _medir(funcao, memoria)
+
+        if etapa == "comparar_mix" and incluir_loop_mix:
+            resultados["comparar_mix_mes_loop"] = _medir(lambda: _loop_comparar_mix_mes(pipeline), memoria)
+
+    return resultados
+
+
+def benchmark_etapas(
+    df_base: pd.DataFrame,
+    escalas: list = ESCALAS,
+    repeticoes: int = 3,
+    incluir_loop_mix: bool = True,
+    incluir_excel: bool = True,
+) -> list:
+    """
+    Tempo (melhor de `repeticoes`) e pico de memória de cada etapa, por escala.
+
+    - `df_base` é a base crua, como sai do Excel (carregar_base); cada escala
+      é gravada em Parquet e, se couber numa planilha e `incluir_excel`, em xlsx
+    - O pico de memória vem de uma execução separada com tracemalloc, para
+      não contaminar os tempos
+    """
+    linhas = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        for fator in escalas:
+            df = escalar_base(df_base, fator)
+            arquivo = os.path.join(tmp, f"base_{fator}x.parquet")
+            df.to_parquet(arquivo, index=False)
+            excel = None
+            if incluir_excel and len(df) <= LIMITE_LINHAS_EXCEL:
+                excel = os.path.join(tmp, f"base_{fator}x.xlsx")
+                df.to_excel(excel, index=False)
+            n_linhas = len(df)
+            del df
+
+            tempos = [_executar_etapas(arquivo, False, incluir_loop_mix, excel, cache_dir) for _ in range(repeticoes)]
+            memoria = _executar_etapas(arquivo, True, incluir_loop_mix, excel, cache_dir)
+
+            for etapa in memoria:
+                linhas.append({
+                    "escala": f"{fator}x",
+                    "linhas": n_linhas,
+                    "etapa": etapa,
+                    "segundos": round(min(t[etapa][0] for t in tempos), 4),
+                    "pico_mb": round(memoria[etapa][1], 2),
+                })
+    return linhas
+
+
+def benchmark_dashboard(app_path: str = None, timeout: int = 600, bundle: str = None) -> dict:
+    """
+    Tempo de renderização do app.py (Streamlit AppTest): primeira execução
+    com o cache vazio e rerun com o cache quente.
+
+    O app abre qualquer bundle válido em resultados/; para a medida não
+    depender do que estiver lá, CASE_STONE_BUNDLE aponta para `bundle`
+    (lido do bundle) ou, sem ele, para uma pasta temporária vazia (calculado
+    pelo pipeline). O caminho medido vai no resultado.
+    """
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"erro": "streamlit não instalado"}
+
+    from bundle import ler_manifesto
+    from cache import cache_resultados
+
+    app_path = app_path or os.path.join(script.BASE_DIR, "app.py")
+    cache_resultados.limpar()
+
+    anterior = os.environ.get("CASE_STONE_BUNDLE")
+    with tempfile.TemporaryDirectory() as vazio:
+        os.environ["CASE_STONE_BUNDLE"] = bundle or vazio
+        try:
+            at = AppTest.from_file(app_path, default_timeout=timeout)
+            inicio = time.perf_counter()
+            at.run()
+            primeira = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            at.run()
+            rerun = time.perf_counter() - inicio
+        finally:
+            if anterior is None:
+                os.environ.pop("CASE_STONE_BUNDLE", None)
+            else:
+                os.environ["CASE_STONE_BUNDLE"] = anterior
+
+    return {
+        "origem": "bundle" if bundle and ler_manifesto(bundle) is not None else "pipeline",
+        "bundle": bundle,
+        "primeira_execucao_s": round(primeira, 4),
+        "rerun_s": round(rerun, 4),
+        "excecoes": [str(e.value) for e in at.exception],
+    }
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=script.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar_resultados(anterior: dict, atual: dict) -> pd.DataFrame:
+    """
+    Tabela de regressões: razão atual / anterior de tempo e memória por escala e etapa.
+    """
+    chaves = ["escala", "etapa"]
+    a = pd.DataFrame(anterior["etapas"]).set_index(chaves)
+    b = pd.DataFrame(atual["etapas"]).set_index(chaves)
+    comp = a[["segundos", "pico_mb"]].join(b[["segundos", "pico_mb"]], lsuffix="_anterior", rsuffix="_atual", how="inner")
+    comp["razao_tempo"] = (comp["segundos_atual"] / comp["segundos_anterior"]).round(2)
+    comp["razao_memoria"] = (comp["pico_mb_atual"] / comp["pico_mb_anterior"]).round(2)
+    return comp.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark por etapa do pipeline de retenção e do dashboard.")
+    parser.add_argument("--input", default=script.file_path, help="Base agregada do case (xlsx)")
+    parser.add_argument("--escalas", type=int, nargs="+", default=ESCALAS)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--sem-loop-mix", action="store_true", help="Não mede o loop original de comparar_mix_mes")
+    parser.add_argument("--sem-dashboard", action="store_true")
+    parser.add_argument("--sem-excel", action="store_true", help="Não mede a leitura do Excel (lenta nas escalas maiores)")
+    parser.add_argument("--bundle", help="Bundle (saída de cli run) lido pelo dashboard; padrão: nenhum, calcula pelo pipeline")
+    parser.add_argument("--saida", default="benchmark.json", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior, para ver regressões")
+    args = parser.parse_args()
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    # Base crua: a carga e a normalização são medidas por escala
+    df_base = carregar_base(args.input)
+    resultados = {
+        "commit": _commit_atual(),
+        "versao_pipeline": script.VERSAO_PIPELINE,
+        "data": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "etapas": benchmark_etapas(df_base, args.escalas, args.repeticoes, not args.sem_loop_mix, not args.sem_excel),
+    }
+    if not args.sem_dashboard:
+        resultados["dashboard"] = benchmark_dashboard(bundle=args.bundle)
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    print(pd.DataFrame(resultados["etapas"]).to_string(index=False))
+    if "dashboard" in resultados:
+        print("dashboard:", resultados["dashboard"])
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        print(comparar_resultados(anterior, resultados).to_string(index=False))
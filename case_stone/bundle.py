@@ -0,0 +1,229 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Versão do formato do bundle (layout de arquivos e manifesto), independente de VERSAO_PIPELINE
+VERSAO_BUNDLE = 1
+MANIFESTO = "manifesto.json"
+
+# Objetos do pipeline consumidos pelo dashboard, na ordem em que o app os usa
+OBJETOS_DASHBOARD = [
+    "df_monthly_macro", "bots", "palette",
+    # Objetos da questão 2
+    "df_mix_fonte", "df_mix_tecnologia", "df_mix_topico", "df_mix_assunto",
+    "df_episodios_anomalos", "segmento_deep_fonte", "deep_fonte",
+    "topicos_criticos_por_bot", "assuntos_criticos_por_bot",
+    "topicos_positivos_por_bot", "assuntos_positivos_por_bot",
+    "dfs_topicos_criticos", "dfs_assuntos_criticos",
+    "dfs_topicos_positivos", "dfs_assuntos_positivos",
+    "df_projecoes",
+    # Objetos da questão 2 - resumo mês atual vs histórico
+    "resumo", "mes_atual", "mes_anterior", "max_day_atual",
+    # Objetos da questão 3 (projeção)
+    "df_future_trend", "df_2025_full", "df_indicador_anual",
+    # Base do cubo dos filtros interativos (grão fino, ver cubo.py)
+    "df_cubo",
+]
+
+
+def _codificar(valor):
+    # Valores que não são tabelas vão para o manifesto em JSON, com marcação de tipo
+    if isinstance(valor, pd.Period):
+        return {"__periodo__": str(valor), "freq": valor.freqstr}
+    if isinstance(valor, tuple):
+        return {"__tupla__": [_codificar(v) for v in valor]}
+    if isinstance(valor, dict):
+        return {str(k): _codificar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_codificar(v) for v in valor]
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+def _decodificar(valor):
+    if isinstance(valor, dict):
+        if "__periodo__" in valor:
+            return pd.Period(valor["__periodo__"], freq=valor["freq"])
+        if "__tupla__" in valor:
+            return tuple(_decodificar(v) for v in valor["__tupla__"])
+        return {k: _decodificar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_decodificar(v) for v in valor]
+    return valor
+
+
+def _gravar_tabela(df: pd.DataFrame, caminho: str):
+    # Arrow IPC (formato de arquivo) sem compressão: pode ser lido por memory map
+    tabela = pa.Table.from_pandas(df)
+    temporario = caminho + ".tmp"
+    with pa.OSFile(temporario, "wb") as f, pa.ipc.new_file(f, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(temporario, caminho)
+
+
+def _ler_tabela(caminho: str) -> pd.DataFrame:
+    # Colunas numéricas sem nulos viram views das páginas mapeadas (sem cópia);
+    # processos diferentes lendo o mesmo bundle compartilham o page cache
+    with pa.memory_map(caminho, "r") as origem:
+        tabela = pa.ipc.open_file(origem).read_all()
+    return tabela.to_pandas(split_blocks=True)
+
+
+def gravar_bundle(pipeline, destino: str, objetos: list = OBJETOS_DASHBOARD, impressao: str = None) -> dict:
+    """
+    Grava os objetos `objetos` do pipeline como bundle versionado em `destino`
+    (ver gravar_objetos). Retorna o manifesto gravado.
+    """
+    impressao = impressao or pipeline_impressao(pipeline)
+    return gravar_objetos({nome: getattr(pipeline, nome) for nome in objetos}, destino, impressao)
+
+
+def gravar_objetos(objetos: dict, destino: str, impressao: str) -> dict:
+    """
+    Grava {nome: valor} como bundle versionado em `destino`.
+
+    - Cada DataFrame vira um arquivo Arrow IPC; dicts de DataFrames (ex.:
+      dfs_topicos_criticos) viram um arquivo por chave
+    - Os demais objetos (listas, meses, dicts simples) ficam no manifesto JSON
+    - Os arquivos levam a impressão digital no nome e o manifesto é trocado
+      por último, de forma atômica: quem está lendo nunca vê um bundle pela metade
+    - Depois da troca, os arquivos da geração anterior (a do manifesto
+      substituído) ficam, para quem já leu aquele manifesto e ainda vai abrir
+      as tabelas; só os de gerações mais antigas são removidos
+
+    Retorna o manifesto gravado.
+    """
+    import script
+
+    os.makedirs(destino, exist_ok=True)
+    sufixo = impressao.replace("/", "_")
+
+    manifesto = {
+        "versao_bundle": VERSAO_BUNDLE,
+        "versao_pipeline": script.VERSAO_PIPELINE,
+        "impressao": impressao,
+        "criado_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "tabelas": {},
+        "colecoes": {},
+        "valores": {},
+    }
+
+    def gravar(nome: str, df: pd.DataFrame) -> dict:
+        arquivo = f"{nome}.{sufixo}.arrow"
+        _gravar_tabela(df, os.path.join(destino, arquivo))
+        return {"arquivo": arquivo, "linhas": len(df), "colunas": list(map(str, df.columns))}
+
+    for nome, valor in objetos.items():
+        if isinstance(valor, pd.DataFrame):
+            manifesto["tabelas"][nome] = gravar(nome, valor)
+        elif isinstance(valor, dict) and valor and all(isinstance(v, pd.DataFrame) for v in valor.values()):
+            manifesto["colecoes"][nome] = {
+                str(chave): gravar(f"{nome}[{chave}]", df) for chave, df in valor.items()
+            }
+        else:
+            manifesto["valores"][nome] = _codificar(valor)
+
+    anterior = _ler_json(os.path.join(destino, MANIFESTO))
+
+    temporario = os.path.join(destino, MANIFESTO + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, os.path.join(destino, MANIFESTO))
+
+    # Limpeza dos arquivos que nem o manifesto novo nem o anterior referenciam
+    em_uso = _arquivos(manifesto) | (_arquivos(anterior) if anterior else set())
+    for nome in os.listdir(destino):
+        if nome.endswith(".arrow") and nome not in em_uso:
+            try:
+                os.remove(os.path.join(destino, nome))
+            except OSError:
+                pass
+    return manifesto
+
+
+def _ler_json(caminho: str):
+    # Manifesto como está no disco (qualquer versão), ou None se ausente ou ilegível
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _arquivos(manifesto: dict) -> set:
+    # Arquivos de tabela referenciados por um manifesto
+    arquivos = {t["arquivo"] for t in manifesto.get("tabelas", {}).values()}
+    arquivos |= {t["arquivo"] for c in manifesto.get("colecoes", {}).values() for t in c.values()}
+    return arquivos
+
+
+def pipeline_impressao(pipeline) -> str:
+    # Impressão digital da entrada do pipeline (arquivo fonte + versão da análise)
+    import script
+    from cache import impressao_digital
+
+    return impressao_digital(pipeline.file_path, script.VERSAO_PIPELINE)
+
+
+def ler_manifesto(destino: str, objetos: list = OBJETOS_DASHBOARD) -> dict:
+    """
+    Manifesto do bundle em `destino`, ou None se não houver bundle utilizável
+    (ausente, formato antigo, gerado por outra versão do pipeline ou sem
+    algum dos `objetos`).
+    """
+    import script
+
+    caminho = os.path.join(destino, MANIFESTO)
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifesto.get("versao_bundle") != VERSAO_BUNDLE or manifesto.get("versao_pipeline") != script.VERSAO_PIPELINE:
+        return None
+    gravados = set(manifesto["tabelas"]) | set(manifesto["colecoes"]) | set(manifesto["valores"])
+    if not set(objetos) <= gravados:
+        return None
+    return manifesto
+
+
+def abrir_bundle(destino: str, manifesto: dict = None) -> dict:
+    """
+    Abre o bundle: {nome do objeto: valor}, com as tabelas lidas por memory map.
+    """
+    manifesto = manifesto or ler_manifesto(destino, objetos=[])
+    if manifesto is None:
+        raise FileNotFoundError(f"Nenhum bundle válido em {destino}")
+
+    objetos = {nome: _decodificar(v) for nome, v in manifesto["valores"].items()}
+    for nome, info in manifesto["tabelas"].items():
+        objetos[nome] = _ler_tabela(os.path.join(destino, info["arquivo"]))
+    for nome, colecao in manifesto["colecoes"].items():
+        objetos[nome] = {
+            chave: _ler_tabela(os.path.join(destino, info["arquivo"])) for chave, info in colecao.items()
+        }
+    return objetos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera o bundle de resultados consumido pelo dashboard.")
+    parser.add_argument("--input", help="Base agregada (padrão: a mesma do script.py)")
+    parser.add_argument("--destino", help="Pasta do bundle (padrão: resultados/ ao lado do app)")
+    args = parser.parse_args()
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import script
+
+    pipeline = script.PipelineRetencao(args.input or script.file_path)
+    destino = args.destino or os.path.join(script.BASE_DIR, "resultados")
+    manifesto = gravar_bundle(pipeline, destino)
+    print(f"Bundle {manifesto['impressao']} gravado em {destino}: "
+          f"{len(manifesto['tabelas'])} tabelas, {len(manifesto['colecoes'])} coleções")
@@ -0,0 +1,169 @@
+import os
+import sys
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Orçamento padrão de memória do cache de resultados (MB), ajustável por variável de ambiente
+LIMITE_CACHE_MB = int(os.environ.get("CASE_STONE_CACHE_MB", "512"))
+
+# Hash de conteúdo memorizado por (caminho, tamanho, mtime): só relê o arquivo quando ele muda
+_hashes_arquivo = {}
+_hashes_lock = threading.Lock()
+
+log = logging.getLogger("case_stone")
+
+
+def hash_arquivo(file_path: str) -> str:
+    """
+    SHA-256 do conteúdo do arquivo, lido em blocos.
+
+    O hash é memorizado pela assinatura (tamanho + mtime) do arquivo, então
+    chamadas repetidas (ex.: a cada rerun do Streamlit) custam apenas um stat.
+    """
+    st = os.stat(file_path)
+    assinatura = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+
+    with _hashes_lock:
+        if assinatura in _hashes_arquivo:
+            return _hashes_arquivo[assinatura]
+
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    digest = h.hexdigest()
+
+    with _hashes_lock:
+        _hashes_arquivo[assinatura] = digest
+    return digest
+
+
+def impressao_digital(file_path: str, versao_pipeline) -> str:
+    """
+    Impressão digital dos dados de entrada: hash do conteúdo + versão do pipeline.
+
+    Muda quando o arquivo fonte muda ou quando a lógica da análise muda
+    (VERSAO_PIPELINE em script.py), invalidando tudo que foi calculado antes.
+    """
+    return f"{hash_arquivo(file_path)[:16]}-v{versao_pipeline}"
+
+
+def tamanho_objeto(obj) -> int:
+    """
+    Estimativa do tamanho em memória (bytes) de um resultado em cache.
+
+    Objetos com tamanho_bytes() (ex.: cubo.CuboRetencao) informam o próprio tamanho.
+    """
+    if hasattr(obj, "tamanho_bytes"):
+        return obj.tamanho_bytes()
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        uso = obj.memory_usage(deep=True)
+        return int(uso.sum() if isinstance(obj, pd.DataFrame) else uso)
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamanho_objeto(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(tamanho_objeto(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+class CacheResultados:
+    """
+    Cache LRU em memória com orçamento de bytes, seguro entre threads.
+
+    - Pensado para ser um singleton de módulo: no Streamlit os módulos
+      importados sobrevivem aos reruns e são compartilhados entre sessões
+    - As chaves devem incluir a impressão digital dos dados, assim qualquer
+      mudança na base gera chaves novas e as antigas saem por LRU
+    - Cada chave é calculada uma única vez mesmo com sessões concorrentes
+    """
+
+    def __init__(self, limite_bytes: int = LIMITE_CACHE_MB * 1024 * 1024):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()  # chave -> (valor, tamanho)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._locks_chave = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        with self._lock:
+            return chave in self._itens
+
+    @property
+    def bytes_em_uso(self) -> int:
+        return self._bytes
+
+    def get(self, chave, default=None):
+        with self._lock:
+            if chave not in self._itens:
+                return default
+            self._itens.move_to_end(chave)
+            return self._itens[chave][0]
+
+    def put(self, chave, valor):
+        tamanho = tamanho_objeto(valor)
+        with self._lock:
+            if chave in self._itens:
+                self._bytes -= self._itens.pop(chave)[1]
+            # Itens maiores que o orçamento inteiro não são guardados (e seriam recalculados a cada pedido)
+            if tamanho > self.limite_bytes:
+                log.warning(
+                    "Cache: %r (%.1f MB) maior que o orçamento (%.1f MB); não guardado",
+                    chave, tamanho / 2**20, self.limite_bytes / 2**20,
+                )
+                return
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.limite_bytes:
+                _, (_, tam_removido) = self._itens.popitem(last=False)
+                self._bytes -= tam_removido
+
+    def obter(self, chave, construir):
+        """
+        Retorna o valor da chave; se não existir, calcula com construir()
+        e guarda. Sessões concorrentes pedindo a mesma chave esperam o
+        primeiro cálculo em vez de repeti-lo.
+        """
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave][0]
+            lock_chave = self._locks_chave.setdefault(chave, threading.Lock())
+
+        try:
+            with lock_chave:
+                with self._lock:
+                    if chave in self._itens:
+                        self._itens.move_to_end(chave)
+                        self.acertos += 1
+                        return self._itens[chave][0]
+                    self.falhas += 1
+
+                valor = construir()
+                self.put(chave, valor)
+        finally:
+            # Também quando construir() falha: o lock da chave não fica para trás
+            with self._lock:
+                self._locks_chave.pop(chave, None)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+
+# Cache compartilhado do processo (todas as sessões do dashboard)
+cache_resultados = CacheResultados()
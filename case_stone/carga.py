@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import pandas as pd
+
+
+# Pasta onde ficam as cópias colunares da base (ao lado do script)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def _assinatura_arquivo(file_path: str) -> dict:
+    """
+    Assinatura barata do arquivo fonte (tamanho + mtime), usada para decidir
+    se a cópia colunar ainda é válida sem precisar ler o Excel.
+    """
+    st = os.stat(file_path)
+    return {
+        "fonte": os.path.abspath(file_path),
+        "tamanho": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+
+def caminhos_cache(file_path: str, cache_dir: str = None):
+    """
+    Retorna (parquet, manifesto) da cópia colunar de um arquivo fonte.
+
+    O nome leva um hash curto do caminho absoluto da fonte: arquivos com o
+    mesmo nome em pastas diferentes não disputam a mesma cópia.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    nome = os.path.splitext(os.path.basename(file_path))[0]
+    origem = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:8]
+    parquet_path = os.path.join(cache_dir, f"{nome}.{origem}.parquet")
+    return parquet_path, parquet_path + ".json"
+
+
+def _cache_valido(file_path: str, parquet_path: str, manifesto_path: str) -> bool:
+    if not (os.path.exists(parquet_path) and os.path.exists(manifesto_path)):
+        return False
+    try:
+        with open(manifesto_path, "r", encoding="utf-8") as f:
+            manifesto = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return manifesto == _assinatura_arquivo(file_path)
+
+
+def _gravar_cache(df: pd.DataFrame, file_path: str, parquet_path: str, manifesto_path: str):
+    """
+    Grava a cópia colunar de forma atômica (arquivo temporário + rename),
+    para que uma execução concorrente nunca leia um parquet pela metade.
+    """
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    tmp_parquet = f"{parquet_path}.{os.getpid()}.tmp"
+    tmp_manifesto = f"{manifesto_path}.{os.getpid()}.tmp"
+
+    df.to_parquet(tmp_parquet, index=False)
+    with open(tmp_manifesto, "w", encoding="utf-8") as f:
+        json.dump(_assinatura_arquivo(file_path), f)
+
+    os.replace(tmp_parquet, parquet_path)
+    os.replace(tmp_manifesto, manifesto_path)
+
+
+def carregar_base(file_path: str, cache_dir: str = None, usar_cache: bool = True) -> pd.DataFrame:
+    """
+    Carrega a base agregada de sessões (export Excel do SELECT de tabelas_fonte.sql).
+
+    - Na primeira execução lê o Excel e salva uma cópia em Parquet em `cache_dir`
+    - Nas execuções seguintes lê direto do Parquet, enquanto tamanho e mtime
+      do Excel forem os mesmos registrados no manifesto
+    - Sem pyarrow instalado (ou com usar_cache=False), lê sempre o Excel
+    """
+    if not usar_cache:
+        return pd.read_excel(file_path)
+
+    parquet_path, manifesto_path = caminhos_cache(file_path, cache_dir)
+
+    try:
+        if _cache_valido(file_path, parquet_path, manifesto_path):
+            return pd.read_parquet(parquet_path)
+    except ImportError:
+        return pd.read_excel(file_path)
+    except Exception:
+        # Cópia corrompida ou ilegível: reconstrói a partir do Excel
+        pass
+
+    df = pd.read_excel(file_path)
+    try:
+        _gravar_cache(df, file_path, parquet_path, manifesto_path)
+    except (ImportError, OSError):
+        # Sem pyarrow ou sem permissão de escrita: segue só com o Excel
+        pass
+    return df
+
+
+# Dimensões da base agregada (granularidade do SELECT em tabelas_fonte.sql)
+DIMENSOES = [
+    "chatbot",
+    "fonte",
+    "tecnologia_do_chatbot",
+    "topico_da_sessao",
+    "assunto_da_sessao",
+]
+
+# Contadores aditivos da base agregada
+CONTADORES = [
+    "sessoes_total",
+    "sessoes_retidas",
+    "sessoes_com_pedido_de_atendimento",
+]
+
+
+def chave_mes(periodo) -> int:
+    """
+    Converte um mês (Period, Timestamp ou 'AAAA-MM') na chave inteira AAAAMM.
+    """
+    periodo = pd.Period(periodo, freq="M")
+    return periodo.year * 100 + periodo.month
+
+
+def tabela_codigos(df: pd.DataFrame) -> dict:
+    """
+    Tabela de códigos compartilhada: {dimensão: CategoricalDtype}.
+
+    Reaproveitar esses dtypes ao codificar outros frames (ex.: um novo dia de
+    dados) garante que os códigos batem, e merges/concats continuam categóricos.
+    """
+    return {
+        dim: df[dim].dtype
+        for dim in DIMENSOES
+        if dim in df.columns and isinstance(df[dim].dtype, pd.CategoricalDtype)
+    }
+
+
+def normalizar_esquema(df: pd.DataFrame, codigos: dict = None) -> pd.DataFrame:
+    """
+    Normaliza a base logo após a carga, para um frame compacto e tipado:
+
+    - Dimensões (chatbot, fonte, tecnologia, tópico, assunto) viram categóricas
+      com categorias ordenadas; se `codigos` for passado, reaproveita as
+      categorias existentes e acrescenta apenas valores novos ao final
+    - session_date vira datetime, com chaves inteiras mes_key (AAAAMM) e
+      dia_key (AAAAMMDD) para filtros sem comparar strings
+    - Contadores sessoes_* são reduzidos ao menor inteiro sem sinal que
+      comporta os valores
+    """
+    df = df.copy()
+    codigos = codigos or {}
+
+    for dim in DIMENSOES:
+        if dim not in df.columns:
+            continue
+        valores = df[dim].astype("category").cat.categories
+        if dim in codigos:
+            existentes = codigos[dim].categories
+            novos = valores.difference(existentes).sort_values()
+            categorias = existentes.append(novos)
+        else:
+            categorias = valores.sort_values()
+        df[dim] = pd.Categorical(df[dim], categories=categorias)
+
+    df["session_date"] = pd.to_datetime(df["session_date"])
+    datas = df["session_date"].dt
+    df["mes_key"] = (datas.year * 100 + datas.month).astype("int32")
+    df["dia_key"] = (df["mes_key"] * 100 + datas.day).astype("int32")
+
+    for col in CONTADORES:
+        if col in df.columns and (df[col] >= 0).all():
+            df[col] = pd.to_numeric(df[col], downcast="unsigned")
+
+    return df
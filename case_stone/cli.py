@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Execução sem tela: backend não interativo antes de qualquer import do pyplot/seaborn
+import matplotlib
+
+matplotlib.use("Agg")
+
+import pandas as pd
+
+from etapas import ETAPAS, GRAFO, ExecutorEtapas, MemoEtapas, fechar_dependencias
+
+log = logging.getLogger("case_stone")
+
+# Códigos de saída
+OK, FALHA_ETAPA, ERRO_USO = 0, 1, 2
+
+
+def gravar_saidas(resultados: dict, destino: str, impressao: str, csv: bool = False) -> dict:
+    """
+    Grava os resultados públicos como bundle (ver bundle.py) e, com `csv`,
+    também cada tabela em destino/csv/<nome>.csv.
+
+    resultados_por_feature sai como as tabelas df_mix_* (uma por feature, como
+    no pipeline e no dashboard), não em duplicata.
+    """
+    from bundle import gravar_objetos
+    from script import TABELAS_MIX
+
+    publicos = {nome: valor for nome, valor in resultados.items() if not nome.startswith("_")}
+    if "resultados_por_feature" in publicos:
+        mix = publicos.pop("resultados_por_feature")
+        publicos.update({nome: mix[feature] for nome, feature in TABELAS_MIX.items() if feature in mix})
+    manifesto = gravar_objetos(publicos, destino, impressao)
+
+    if csv:
+        pasta = os.path.join(destino, "csv")
+        os.makedirs(pasta, exist_ok=True)
+        for nome, valor in publicos.items():
+            tabelas = valor if isinstance(valor, dict) else {None: valor}
+            for chave, df in tabelas.items():
+                if isinstance(df, pd.DataFrame):
+                    arquivo = f"{nome}[{chave}].csv" if chave is not None else f"{nome}.csv"
+                    df.to_csv(os.path.join(pasta, arquivo), index=False)
+    return manifesto
+
+
+def comando_run(args) -> int:
+    import script
+    from carga import carregar_base
+    from cache import impressao_digital
+    from incremental import ler_tabela
+
+    entrada = args.input or script.file_path
+    if not os.path.exists(entrada):
+        log.error("arquivo de entrada não encontrado: %s", entrada)
+        return ERRO_USO
+
+    desconhecidas = [e for e in (args.etapas or []) if e not in ETAPAS]
+    if desconhecidas:
+        log.error("etapas desconhecidas: %s (disponíveis: %s)", desconhecidas, ", ".join(ETAPAS))
+        return ERRO_USO
+    etapas = fechar_dependencias(args.etapas or list(ETAPAS))
+
+    inicio = time.perf_counter()
+    impressao = impressao_digital(entrada, script.VERSAO_PIPELINE)
+    horizonte = script.HORIZONTE_PROJECAO if args.horizonte is None else args.horizonte
+
+    if args.orcamento_mb:
+        # Fora da memória: a base é lida em blocos quando a carga rodar (ver fora_memoria.py)
+        from fora_memoria import ETAPAS_GRAO_FINO, PipelineForaMemoria
+
+        if args.as_of:
+            log.error("--as-of não é suportado com --orcamento-mb")
+            return ERRO_USO
+        grao_fino = [e for e in etapas if e in ETAPAS_GRAO_FINO]
+        if args.etapas and grao_fino:
+            log.error("etapas que precisam do grão fino não rodam fora da memória: %s", grao_fino)
+            return ERRO_USO
+        etapas = [e for e in etapas if e not in ETAPAS_GRAO_FINO]
+        pipeline = PipelineForaMemoria(entrada, orcamento_mb=args.orcamento_mb, horizonte=horizonte)
+        log.info("modo fora da memória (orçamento de %.0f MB); etapas: %s", args.orcamento_mb, ", ".join(etapas))
+    else:
+        if entrada.lower().endswith((".xlsx", ".xls")):
+            df = carregar_base(entrada)
+        else:
+            df = ler_tabela(entrada)
+        if args.as_of:
+            data_corte = pd.Timestamp(args.as_of)
+            df = df[pd.to_datetime(df["session_date"]) <= data_corte]
+            impressao = f"{impressao}-ate{data_corte:%Y%m%d}"
+            if df.empty:
+                log.error("nenhuma linha até %s", args.as_of)
+                return ERRO_USO
+        log.info("base carregada: %d linhas; etapas: %s", len(df), ", ".join(etapas))
+        pipeline = script.PipelineRetencao(entrada, df=df, horizonte=horizonte, processos=args.processos or 1)
+
+    memo = None if args.sem_memo else MemoEtapas(args.memo) if args.memo else MemoEtapas()
+    executor = ExecutorEtapas(pipeline, impressao, memo=memo, jobs=args.jobs or 1)
+    resultados = executor.executar(etapas)
+    falhas = executor.falhas
+    reaproveitadas = [nome for nome, origem, _ in executor.historico if origem == "memo"]
+    if reaproveitadas:
+        log.info("etapas reaproveitadas da memória: %s", ", ".join(reaproveitadas))
+
+    # A base e o rollup (etapa de carga) não vão para a saída
+    carga = {saida for etapa in GRAFO if not etapa.memorizar for saida in etapa.saidas}
+    resultados = {nome: valor for nome, valor in resultados.items() if nome not in carga}
+
+    saida = args.output or os.path.join(script.BASE_DIR, "resultados")
+    manifesto = gravar_saidas(resultados, saida, impressao, csv=args.csv)
+    log.info(
+        "saídas em %s (%d tabelas, %d coleções) em %.2fs",
+        saida, len(manifesto["tabelas"]), len(manifesto["colecoes"]), time.perf_counter() - inicio,
+    )
+
+    if falhas:
+        for etapa, erro in falhas.items():
+            log.error("etapa %s não concluída: %s", etapa, erro)
+        return FALHA_ETAPA
+    return OK
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m case_stone", description="Análise de retenção em lote (sem tela).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_run = sub.add_parser("run", help="Roda as etapas da análise e grava as saídas em disco")
+    p_run.add_argument("--input", help="Base agregada (.xlsx, .csv ou .parquet; padrão: a do case)")
+    p_run.add_argument("--output", help="Pasta de saída (bundle de resultados; padrão: resultados/)")
+    p_run.add_argument("--as-of", help="Data de corte (AAAA-MM-DD): ignora linhas posteriores")
+    p_run.add_argument("--etapas", nargs="+", metavar="ETAPA", help=f"Etapas a rodar (com dependências): {', '.join(ETAPAS)}")
+    p_run.add_argument("--jobs", type=int, default=1, help="Processos para etapas independentes")
+    p_run.add_argument("--processos", type=int, default=1,
+                       help="Processos da agregação do rollup (particionada por data, memória compartilhada)")
+    p_run.add_argument("--horizonte", type=int, default=None, help="Meses projetados além do mês atual (padrão: até dezembro)")
+    p_run.add_argument("--memo", help="Pasta da memória de etapas (padrão: .cache/etapas)")
+    p_run.add_argument("--sem-memo", action="store_true", help="Recalcula todas as etapas, sem ler nem gravar memória")
+    p_run.add_argument("--orcamento-mb", type=float, default=None,
+                       help="Modo fora da memória: lê a base em blocos com este orçamento de memória (MB)")
+    p_run.add_argument("--csv", action="store_true", help="Grava também cada tabela em CSV")
+    p_run.add_argument("--quiet", action="store_true", help="Só avisos e erros no log")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        stream=sys.stderr,
+    )
+    if args.comando == "run":
+        return comando_run(args)
+    return ERRO_USO
+
+
+if __name__ == "__main__":
+    sys.exit(main())
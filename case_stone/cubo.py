@@ -0,0 +1,208 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from carga import CONTADORES
+from agregacao import adicionar_taxas, codigos_coluna, somar_codigos
+
+# Dimensões que o cubo soma/filtra além de data e bot (sempre presentes em todo cuboide)
+DIMENSOES_CUBO = ["fonte", "tecnologia_do_chatbot", "topico_da_sessao", "assunto_da_sessao"]
+
+# Dimensões aceitas em filtros (valores permitidos por dimensão)
+DIMENSOES_FILTRO = ["chatbot"] + DIMENSOES_CUBO
+
+# Chaves de tempo aceitas em nivel(): data ou mês
+CHAVES_DATA = {"session_date"}
+CHAVES_MES = {"session_month", "mes_key"}
+
+
+class CuboRetencao:
+    """
+    Cubo agregado em memória para filtros interativos.
+
+    - A base no grão fino (data x bot x fonte x tecnologia x tópico x assunto,
+      ex.: rollup.base) vira códigos inteiros + contadores, uma única vez
+    - Todos os marginais (cuboides) sobre as dimensões de DIMENSOES_CUBO são
+      pré-calculados, sempre com data e bot; cada um é derivado do menor
+      cuboide já calculado que o contém
+    - Uma consulta filtrada usa o menor cuboide com as dimensões filtradas e
+      agrupadas: máscaras por código + bincount, sem groupby na base
+    """
+
+    def __init__(self, base: pd.DataFrame):
+        codigos_data, self._datas = codigos_coluna(base["session_date"])
+        datas = pd.DatetimeIndex(self._datas)
+        # Mês de cada data (códigos em ordem crescente de mês)
+        mes_key_data = (datas.year * 100 + datas.month).to_numpy(dtype="int32")
+        self.meses, self._mes_da_data = np.unique(mes_key_data, return_inverse=True)
+        self._dia_da_data = datas.day.to_numpy(dtype="int32")
+
+        self._valores, self._tipos = {}, {}
+        codigos = {"data": codigos_data}
+        for dimensao in DIMENSOES_FILTRO:
+            codigos[dimensao], self._valores[dimensao] = codigos_coluna(base[dimensao])
+            # Tipo categórico de saída montado uma vez (from_codes não revalida as categorias)
+            self._tipos[dimensao] = pd.CategoricalDtype(self._valores[dimensao])
+
+        self._dtype_contadores = {
+            c: np.zeros(0, dtype=base[c].dtype).sum().dtype for c in CONTADORES
+        }
+        contadores = base[CONTADORES].to_numpy(dtype="float64")
+
+        # Cuboides, do mais fino (todas as dimensões) ao mais grosso (só data x bot)
+        self._cuboides = {}
+        for tamanho in range(len(DIMENSOES_CUBO), -1, -1):
+            for dims in combinations(DIMENSOES_CUBO, tamanho):
+                origem = self._origem(set(dims)) if self._cuboides else (codigos, contadores)
+                self._cuboides[frozenset(dims)] = self._somar(origem, list(dims))
+
+    def _cardinalidade(self, coluna: str) -> int:
+        return len(self._datas) if coluna == "data" else len(self._valores[coluna])
+
+    def _somar(self, origem: tuple, dims: list) -> tuple:
+        codigos, contadores = origem
+        colunas = ["data", "chatbot"] + dims
+        novos, somas = somar_codigos(
+            [codigos[c] for c in colunas],
+            [self._cardinalidade(c) for c in colunas],
+            contadores,
+        )
+        return dict(zip(colunas, novos)), somas
+
+    def _origem(self, dims: set) -> tuple:
+        # Menor cuboide memorizado que contém as dimensões pedidas
+        candidatos = [c for chave, c in self._cuboides.items() if dims <= chave]
+        return min(candidatos, key=lambda c: len(c[1]))
+
+    def tamanho_bytes(self) -> int:
+        """
+        Memória ocupada pelo cubo (bytes): soma dos arrays dos cuboides e das
+        tabelas de códigos (usada pelo orçamento do cache, ver cache.tamanho_objeto).
+        """
+        arrays = [self.meses, self._mes_da_data, self._dia_da_data]
+        for codigos, somas in self._cuboides.values():
+            arrays.extend(codigos.values())
+            arrays.append(somas)
+        indices = [self._datas] + list(self._valores.values())
+        return int(sum(a.nbytes for a in arrays) + sum(i.memory_usage(deep=True) for i in indices))
+
+    def valores(self, dimensao: str) -> list:
+        """
+        Valores possíveis de uma dimensão (para montar os filtros).
+        """
+        return list(self._valores[dimensao])
+
+    def recortar(self, filtros: dict = None, meses: tuple = None) -> "RecorteCubo":
+        """
+        Recorte do cubo para `filtros` ({dimensão: valores permitidos}; lista
+        vazia ou None = sem filtro) e `meses` (mes_key inicial e final, inclusive).
+        """
+        return RecorteCubo(self, filtros, meses)
+
+
+class RecorteCubo:
+    """
+    Fatia filtrada do cubo com a mesma interface de RollupRetencao (nivel,
+    agregar): serve às funções da análise que recebem um rollup, como
+    comparar_mix_lote e construir_df_diario.
+    """
+
+    def __init__(self, cubo: CuboRetencao, filtros: dict = None, meses: tuple = None):
+        self.cubo = cubo
+        self.filtros = {}
+        for dimensao, valores in (filtros or {}).items():
+            if dimensao not in DIMENSOES_FILTRO:
+                raise KeyError(f"Dimensão fora do cubo: {dimensao}")
+            if valores:
+                permitido = np.zeros(len(cubo._valores[dimensao]), dtype=bool)
+                posicoes = cubo._valores[dimensao].get_indexer(pd.Index(list(valores)))
+                permitido[posicoes[posicoes >= 0]] = True
+                self.filtros[dimensao] = permitido
+
+        self._datas_permitidas = None
+        if meses is not None:
+            inicio, fim = meses
+            mes_ok = (cubo.meses >= inicio) & (cubo.meses <= fim)
+            self._datas_permitidas = mes_ok[cubo._mes_da_data]
+        self._niveis = {}
+
+    def _mascara(self, codigos: dict, n: int) -> np.ndarray:
+        mascara = np.ones(n, dtype=bool)
+        for dimensao, permitido in self.filtros.items():
+            mascara &= permitido[codigos[dimensao]]
+        if self._datas_permitidas is not None:
+            mascara &= self._datas_permitidas[codigos["data"]]
+        return mascara
+
+    def nivel(self, chaves: list) -> pd.DataFrame:
+        """
+        Somas dos contadores no nível `chaves` dentro do recorte (sem
+        percentuais), memorizado; mesmo formato de RollupRetencao.nivel.
+        """
+        chave_nivel = tuple(chaves)
+        if chave_nivel in self._niveis:
+            return self._niveis[chave_nivel]
+
+        cubo = self.cubo
+        tempo = set(chaves) & (CHAVES_DATA | CHAVES_MES)
+        por_data = bool(tempo & CHAVES_DATA)
+        fora = set(chaves) - tempo - set(DIMENSOES_FILTRO)
+        if fora:
+            raise KeyError(f"Chaves fora do cubo: {sorted(fora)}")
+
+        dims = {c for c in chaves if c in DIMENSOES_CUBO} | (set(self.filtros) - {"chatbot"})
+        codigos, contadores = cubo._cuboides[frozenset(dims)]
+        mascara = self._mascara(codigos, len(contadores))
+
+        # Colunas de agrupamento na ordem das chaves (chaves de tempo viram um único código)
+        colunas, cardinalidades, nomes = [], [], []
+        for chave in chaves:
+            if chave in tempo:
+                if "tempo" in nomes:
+                    continue
+                if por_data:
+                    colunas.append(codigos["data"][mascara])
+                    cardinalidades.append(len(cubo._datas))
+                else:
+                    colunas.append(cubo._mes_da_data[codigos["data"][mascara]])
+                    cardinalidades.append(len(cubo.meses))
+                nomes.append("tempo")
+            else:
+                colunas.append(codigos[chave][mascara])
+                cardinalidades.append(len(cubo._valores[chave]))
+                nomes.append(chave)
+
+        grupos, somas = somar_codigos(colunas, cardinalidades, contadores[mascara])
+
+        g = {}
+        for nome, cod in zip(nomes, grupos):
+            if nome != "tempo":
+                g[nome] = pd.Categorical.from_codes(cod, dtype=cubo._tipos[nome])
+            elif por_data:
+                g["session_date"] = cubo._datas[cod]
+                meses = cubo.meses[cubo._mes_da_data[cod]]
+                g["session_month"] = pd.PeriodIndex.from_fields(year=meses // 100, month=meses % 100, freq="M")
+                g["mes_key"] = meses
+                g["day"] = cubo._dia_da_data[cod]
+            else:
+                meses = cubo.meses[cod]
+                if "session_month" in tempo:
+                    g["session_month"] = pd.PeriodIndex.from_fields(year=meses // 100, month=meses % 100, freq="M")
+                g["mes_key"] = meses
+        for j, contador in enumerate(CONTADORES):
+            g[contador] = somas[:, j].astype(cubo._dtype_contadores[contador])
+
+        df = pd.DataFrame(g)
+        # Mesma ordem de colunas do rollup: chaves, contadores, derivadas da data
+        derivadas = [c for c in ["session_month", "mes_key", "day"] if c in df.columns and c not in chaves]
+        df = df[list(chaves) + CONTADORES + derivadas]
+        self._niveis[chave_nivel] = df
+        return df
+
+    def agregar(self, chaves: list) -> pd.DataFrame:
+        """
+        Nível `chaves` com contadores + percentuais, em um frame novo.
+        """
+        g = self.nivel(chaves)[list(chaves) + CONTADORES].copy()
+        return adicionar_taxas(g)
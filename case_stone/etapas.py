@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from carga import CACHE_DIR
+
+log = logging.getLogger("case_stone")
+
+# Pasta padrão da memorização das etapas (um pickle por etapa e chave)
+MEMO_DIR = os.path.join(CACHE_DIR, "etapas")
+
+
+class Etapa:
+    """
+    Nó do grafo da análise.
+
+    - entradas: etapas de que depende (os resultados delas são reaproveitados, não recalculados)
+    - saidas: atributos do PipelineRetencao calculados na etapa; os com "_" são
+      intermediários que passam entre etapas
+    - parametros: atributos do pipeline que mudam o resultado (entram na chave)
+    - memorizar: False para etapas que não compensam ir para disco (ex.: a carga,
+      que já tem a cópia colunar de carga.py)
+    """
+
+    def __init__(self, nome: str, entradas: list, saidas: list, parametros: list = (), memorizar: bool = True):
+        self.nome = nome
+        self.entradas = list(entradas)
+        self.saidas = list(saidas)
+        self.parametros = list(parametros)
+        self.memorizar = memorizar
+
+    def __repr__(self):
+        return f"Etapa({self.nome!r}, entradas={self.entradas})"
+
+
+# Grafo da análise, em ordem topológica
+GRAFO = [
+    # A base (df) entra no pipeline junto com o rollup; só o rollup é exigido, para que o
+    # modo fora da memória (fora_memoria.py, rollup pronto e sem base) não carregue a base inteira
+    Etapa("carga", [], ["rollup"], memorizar=False),
+    Etapa("mensal", ["carga"], ["df_monthly_macro", "bots", "palette"]),
+    Etapa("cubo", ["carga"], ["df_cubo"]),
+    Etapa("diario", ["carga"], ["df_daily", "_resumo_mes", "resumo", "mes_atual", "mes_anterior", "max_day_atual"]),
+    # As tabelas df_mix_* são vistas de resultados_por_feature, separadas só na gravação (cli.gravar_saidas)
+    Etapa("mix", ["mensal", "diario"], ["resultados_por_feature", "df_q10"]),
+    Etapa("segmentos", ["mensal", "diario", "mix"], [
+        "_segmentos_criticos", "topicos_criticos_por_bot", "assuntos_criticos_por_bot",
+        "_dfs_criticos", "dfs_topicos_criticos", "dfs_assuntos_criticos",
+        "_segmentos_positivos", "topicos_positivos_por_bot", "assuntos_positivos_por_bot",
+        "_dfs_positivos", "dfs_topicos_positivos", "dfs_assuntos_positivos",
+    ]),
+    Etapa("anomalias", ["carga"], ["df_anomalias", "df_episodios_anomalos"], parametros=["parametros_anomalias"]),
+    Etapa("deep_dive", ["diario", "anomalias"], ["segmento_deep_fonte", "deep_fonte", "deep_dive_2"]),
+    Etapa("projecao_agosto", ["diario"], ["df_projecoes"]),
+    Etapa("projecao_segmentos", ["carga"], ["df_projecoes_segmentos"]),
+    Etapa("projecao_futura", ["mensal", "projecao_agosto"], [
+        "_projecoes_futuras", "df_projecoes_metodos", "df_future_trend",
+    ], parametros=["horizonte"]),
+    Etapa("serie_2025", ["mensal", "projecao_agosto", "projecao_futura"], ["df_2025_full"]),
+    Etapa("indicador_anual", ["serie_2025"], ["df_indicador_anual"]),
+]
+
+ETAPAS = {etapa.nome: etapa for etapa in GRAFO}
+
+
+def fechar_dependencias(nomes: list) -> list:
+    """
+    Etapas pedidas + tudo de que dependem, em ordem topológica.
+    """
+    pedidas = set()
+    pendentes = list(nomes)
+    while pendentes:
+        nome = pendentes.pop()
+        if nome not in pedidas:
+            pedidas.add(nome)
+            pendentes.extend(ETAPAS[nome].entradas)
+    return [e.nome for e in GRAFO if e.nome in pedidas]
+
+
+def chaves_etapas(pipeline, nomes: list, impressao: str) -> dict:
+    """
+    Chave de conteúdo de cada etapa: hash da etapa, da versão da análise, dos
+    seus parâmetros e das chaves das entradas (as etapas raiz usam a impressão
+    digital dos dados). Mudar um parâmetro muda só a chave da etapa dele e das
+    que dependem dela.
+    """
+    import script
+
+    chaves = {}
+    for nome in fechar_dependencias(nomes):
+        etapa = ETAPAS[nome]
+        conteudo = {
+            "etapa": nome,
+            "versao_pipeline": script.VERSAO_PIPELINE,
+            "parametros": {p: getattr(pipeline, p) for p in etapa.parametros},
+            "entradas": [chaves[e] for e in etapa.entradas] or [impressao],
+        }
+        texto = json.dumps(conteudo, sort_keys=True, default=str)
+        chaves[nome] = hashlib.sha256(texto.encode("utf-8")).hexdigest()[:24]
+    return chaves
+
+
+class MemoEtapas:
+    """
+    Resultados de etapas em disco: <diretorio>/<etapa>/<chave>.pkl, gravados
+    de forma atômica. Só há uma versão por chave; chaves velhas podem ser apagadas à vontade.
+    """
+
+    def __init__(self, diretorio: str = MEMO_DIR):
+        self.diretorio = diretorio
+
+    def _caminho(self, etapa: str, chave: str) -> str:
+        return os.path.join(self.diretorio, etapa, f"{chave}.pkl")
+
+    def obter(self, etapa: str, chave: str):
+        try:
+            with open(self._caminho(etapa, chave), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def gravar(self, etapa: str, chave: str, valores: dict):
+        caminho = self._caminho(etapa, chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = caminho + f".{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            pickle.dump(valores, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+
+
+def _memorizaveis(pipeline, valores: dict) -> dict:
+    # Só atributos cached_property podem ser semeados no __dict__ do pipeline
+    return {
+        nome: valor for nome, valor in valores.items()
+        if isinstance(getattr(type(pipeline), nome, None), cached_property)
+    }
+
+
+def executar_etapa(pipeline, nome: str, dependencias: dict = None) -> dict:
+    """
+    Calcula as saídas da etapa `nome`, semeando antes os resultados das
+    etapas anteriores em `dependencias` (não recalcula o que já veio pronto).
+    """
+    if dependencias:
+        pipeline.__dict__.update(_memorizaveis(pipeline, dependencias))
+    return {saida: getattr(pipeline, saida) for saida in ETAPAS[nome].saidas}
+
+
+# Pipeline compartilhado por processo (enviado uma vez a cada worker, já com a carga feita)
+_pipeline_worker = None
+
+
+def _iniciar_worker(pipeline):
+    global _pipeline_worker
+    _pipeline_worker = pipeline
+
+
+def _executar_no_worker(nome: str, dependencias: dict):
+    inicio = time.perf_counter()
+    resultado = executar_etapa(_pipeline_worker, nome, dependencias)
+    return resultado, time.perf_counter() - inicio
+
+
+class ExecutorEtapas:
+    """
+    Executa um subconjunto do grafo sobre um PipelineRetencao.
+
+    - Cada etapa memorizável é procurada primeiro no disco pela chave de
+      conteúdo (chaves_etapas); só roda o que não está lá
+    - Etapas sem memorização (a carga) rodam no processo atual e só se alguma
+      etapa que depende delas precisar rodar
+    - Com jobs > 1, ramos independentes rodam ao mesmo tempo num pool de
+      processos; cada worker recebe o pipeline com a carga pronta, e cada etapa
+      recebe os resultados das etapas de que depende
+    """
+
+    def __init__(self, pipeline, impressao: str, memo: MemoEtapas = None, jobs: int = 1):
+        self.pipeline = pipeline
+        self.impressao = impressao
+        self.memo = memo
+        self.jobs = jobs or 1
+        self.resultados = {}
+        self.falhas = {}
+        # (etapa, origem: "memo" | "calculada" | "falhou", segundos)
+        self.historico = []
+
+    def _dependencias(self, nome: str) -> dict:
+        # Resultados de todas as etapas a montante, menos as não memorizáveis (já estão no pipeline)
+        return {
+            saida: self.resultados[saida]
+            for dep in fechar_dependencias(ETAPAS[nome].entradas)
+            if ETAPAS[dep].memorizar
+            for saida in ETAPAS[dep].saidas
+        }
+
+    def _concluir(self, nome: str, valores: dict, origem: str, segundos: float):
+        self.resultados.update(valores)
+        self.pipeline.__dict__.update(_memorizaveis(self.pipeline, valores))
+        if origem == "calculada" and self.memo is not None and ETAPAS[nome].memorizar:
+            self.memo.gravar(nome, self.chaves[nome], valores)
+        self.historico.append((nome, origem, round(segundos, 4)))
+        log.info("etapa %s %s em %.2fs", nome, origem, segundos)
+
+    def _falhar(self, nome: str, erro: str):
+        self.falhas[nome] = erro
+        self.historico.append((nome, "falhou", None))
+
+    def executar(self, nomes: list) -> dict:
+        """
+        Executa as etapas `nomes` (e suas dependências); retorna os resultados
+        {atributo: valor}. Falhas ficam em self.falhas.
+        """
+        ordem = fechar_dependencias(nomes)
+        self.chaves = chaves_etapas(self.pipeline, ordem, self.impressao)
+
+        # 1) Memorizadas: lidas do disco, sem rodar nada
+        pendentes = []
+        for nome in ordem:
+            etapa = ETAPAS[nome]
+            valores = None
+            if etapa.memorizar and self.memo is not None:
+                inicio = time.perf_counter()
+                valores = self.memo.obter(nome, self.chaves[nome])
+                if valores is not None:
+                    self._concluir(nome, valores, "memo", time.perf_counter() - inicio)
+            if valores is None:
+                pendentes.append(nome)
+
+        # 2) Etapas sem memorização só rodam se alguém que depende delas vai rodar
+        sem_memo = [n for n in pendentes if not ETAPAS[n].memorizar]
+        pendentes = [n for n in pendentes if ETAPAS[n].memorizar]
+        necessarias = set(fechar_dependencias(pendentes))
+        for nome in sem_memo:
+            if nome not in necessarias:
+                continue
+            inicio = time.perf_counter()
+            try:
+                self._concluir(nome, executar_etapa(self.pipeline, nome), "calculada", time.perf_counter() - inicio)
+            except Exception as erro:
+                log.exception("etapa %s falhou", nome)
+                self._falhar(nome, repr(erro))
+
+        # 3) Demais etapas, respeitando dependências (em paralelo com jobs > 1)
+        if self.jobs <= 1:
+            self._executar_sequencial(pendentes)
+        else:
+            self._executar_paralelo(pendentes)
+        return self.resultados
+
+    def _prontas(self, pendentes: list) -> list:
+        feitas = {n for n, origem, _ in self.historico if origem != "falhou"}
+        return [n for n in pendentes if all(d in feitas for d in ETAPAS[n].entradas)]
+
+    def _bloquear(self, pendentes: list):
+        for nome in [n for n in pendentes if any(d in self.falhas for d in ETAPAS[n].entradas)]:
+            pendentes.remove(nome)
+            self._falhar(nome, "dependência falhou")
+
+    def _executar_sequencial(self, pendentes: list):
+        while pendentes:
+            self._bloquear(pendentes)
+            prontas = self._prontas(pendentes)
+            if not prontas:
+                break
+            nome = prontas[0]
+            pendentes.remove(nome)
+            inicio = time.perf_counter()
+            try:
+                self._concluir(nome, executar_etapa(self.pipeline, nome), "calculada", time.perf_counter() - inicio)
+            except Exception as erro:
+                log.exception("etapa %s falhou", nome)
+                self._falhar(nome, repr(erro))
+
+    def _executar_paralelo(self, pendentes: list):
+        if not pendentes:
+            return
+        with ProcessPoolExecutor(
+            max_workers=self.jobs, initializer=_iniciar_worker, initargs=(self.pipeline,)
+        ) as pool:
+            em_execucao = {}
+            while pendentes or em_execucao:
+                self._bloquear(pendentes)
+                for nome in self._prontas(pendentes):
+                    pendentes.remove(nome)
+                    futuro = pool.submit(_executar_no_worker, nome, self._dependencias(nome))
+                    em_execucao[futuro] = nome
+                if not em_execucao:
+                    break
+
+                concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidas:
+                    nome = em_execucao.pop(futuro)
+                    try:
+                        valores, segundos = futuro.result()
+                        self._concluir(nome, valores, "calculada", segundos)
+                    except Exception as erro:
+                        log.error("etapa %s falhou: %r", nome, erro)
+                        self._falhar(nome, repr(erro))
@@ -0,0 +1,328 @@
+import os
+import argparse
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from carga import CONTADORES, normalizar_esquema, tabela_codigos
+from agregacao import GRAO_FINO, RollupRetencao, somar
+from cache import tamanho_objeto
+from incremental import NIVEIS_PERSISTIDOS, NIVEIS_VARREDURA_PERSISTIDOS
+from instrumentacao import instrumentar
+from script import PipelineRetencao, preparar_base
+
+
+# Execução fora da memória: a base agregada nunca é carregada inteira. O arquivo
+# é lido em blocos de tamanho fixo (xlsx em modo somente leitura, parquet por
+# lotes dos row groups, csv em chunks); cada bloco vira somas parciais dos níveis
+# que a análise consome, e as parciais são somadas entre si (associativo) sempre
+# que passam da fatia do orçamento reservada a elas.
+
+# Colunas lidas na passada de agregação (as demais só nas fatias de drill-down)
+COLUNAS_AGREGACAO = GRAO_FINO + CONTADORES
+
+# Níveis que o pipeline lê do rollup, menos o grão fino: série diária, mensal,
+# deep dive por fonte, mix e data x bot x feature (varredura de anomalias)
+NIVEIS_FORA_MEMORIA = NIVEIS_PERSISTIDOS
+
+# Varredura de anomalias sem o grão completo (do tamanho da própria base)
+NIVEIS_VARREDURA_FORA_MEMORIA = NIVEIS_VARREDURA_PERSISTIDOS
+
+# Etapas do grafo (etapas.py) que precisam do grão fino e ficam de fora neste modo
+ETAPAS_GRAO_FINO = ["cubo"]
+
+# Orçamento padrão de memória (dados da leitura e da agregação; não inclui o
+# interpretador, as bibliotecas nem o buffer de um row group do parquet) e como ele é repartido
+ORCAMENTO_MB = 512
+FRACAO_BLOCO = 0.25       # bloco lido + cópias intermediárias da agregação do bloco
+FRACAO_PARCIAIS = 0.75    # somas parciais + cópias da consolidação
+FATOR_PICO_BLOCO = 4      # pico da agregação de um bloco, em múltiplos do bloco cru
+FATOR_PICO_CONSOLIDACAO = 3  # pico da consolidação (concat + groupby), em múltiplos das parciais
+LINHAS_AMOSTRA = 10_000   # linhas lidas para estimar os bytes por linha
+LINHAS_MINIMAS = 1_000
+
+
+def _ler_xlsx(caminho: str, linhas: int, colunas: list = None):
+    # openpyxl em modo somente leitura: as linhas são lidas do XML sob demanda
+    from openpyxl import load_workbook
+
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        iterador = livro.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [str(c) for c in next(iterador, ())]
+        colunas = colunas or cabecalho
+        posicoes = [cabecalho.index(c) for c in colunas]
+        bloco = []
+        for valores in iterador:
+            bloco.append([valores[i] for i in posicoes])
+            if len(bloco) == linhas:
+                yield pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas)
+    finally:
+        livro.close()
+
+
+def ler_blocos(caminho: str, linhas: int, colunas: list = None):
+    """
+    Lê a base agregada (mesmas colunas do SELECT) em blocos de no máximo
+    `linhas` linhas, sem carregar o arquivo inteiro: xlsx/xls por um leitor em
+    streaming, parquet por lotes dos row groups, csv em chunks.
+
+    Cada bloco tem como índice a posição das suas linhas no arquivo (como numa
+    leitura completa). Com `colunas`, só essas colunas são lidas.
+    """
+    ext = os.path.splitext(caminho)[1].lower()
+    if ext in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        blocos = (lote.to_pandas() for lote in pq.ParquetFile(caminho).iter_batches(batch_size=linhas, columns=colunas))
+    elif ext == ".csv":
+        blocos = pd.read_csv(caminho, usecols=colunas, chunksize=linhas)
+    elif ext in (".xlsx", ".xls"):
+        blocos = _ler_xlsx(caminho, linhas, colunas)
+    else:
+        raise ValueError(f"Formato não suportado para leitura em blocos: {caminho}")
+
+    inicio = 0
+    for bloco in blocos:
+        bloco.index = pd.RangeIndex(inicio, inicio + len(bloco))
+        inicio += len(bloco)
+        yield bloco
+
+
+def limite_parciais(orcamento_mb: float = ORCAMENTO_MB) -> int:
+    """
+    Bytes de somas parciais que podem se acumular antes de consolidar, para que
+    o pico da consolidação caiba na fatia FRACAO_PARCIAIS do orçamento.
+    """
+    return int(orcamento_mb * 2**20 * FRACAO_PARCIAIS / FATOR_PICO_CONSOLIDACAO)
+
+
+def linhas_por_bloco(caminho: str, orcamento_mb: float = ORCAMENTO_MB, colunas: list = None) -> int:
+    """
+    Linhas por bloco que cabem na fatia FRACAO_BLOCO do orçamento, pelos bytes
+    por linha de uma amostra do começo do arquivo.
+    """
+    amostra = next(ler_blocos(caminho, LINHAS_AMOSTRA, colunas), None)
+    if amostra is None or amostra.empty:
+        return LINHAS_MINIMAS
+    bytes_linha = tamanho_objeto(amostra) / len(amostra)
+    limite = orcamento_mb * 2**20 * FRACAO_BLOCO
+    return max(LINHAS_MINIMAS, int(limite / (bytes_linha * FATOR_PICO_BLOCO)))
+
+
+class AgregadorNiveis:
+    """
+    Soma dos contadores em vários níveis, dobrando blocos da base um a um.
+
+    - Cada bloco é normalizado com a tabela de códigos acumulada (dimensões
+      categóricas) e reduzido a cada nível pelo RollupRetencao do próprio bloco
+    - As parciais de um nível são somadas entre si (a soma é associativa) sempre
+      que o total das parciais passa de `limite_bytes`; a memória depende do
+      número de grupos dos níveis, não do tamanho do arquivo
+    - Se os níveis já consolidados não couberem em `limite_bytes`, o orçamento
+      é insuficiente para esta base: MemoryError, em vez de estourar a memória
+    """
+
+    def __init__(self, niveis: list = NIVEIS_FORA_MEMORIA, limite_bytes: int = None):
+        self.niveis = [list(chaves) for chaves in niveis]
+        self.limite_bytes = limite_bytes or limite_parciais()
+        self.codigos = {}
+        self.linhas_lidas = 0
+        self.consolidacoes = 0
+        self._parciais = {tuple(chaves): [] for chaves in self.niveis}
+        self._bytes_parciais = 0
+
+    def adicionar(self, bloco: pd.DataFrame):
+        self.linhas_lidas += len(bloco)
+        bloco = normalizar_esquema(bloco[COLUNAS_AGREGACAO], self.codigos)
+        self.codigos = tabela_codigos(bloco)
+
+        rollup = RollupRetencao(bloco)
+        for chaves in self.niveis:
+            parcial = rollup.nivel(chaves)[chaves + CONTADORES]
+            self._parciais[tuple(chaves)].append(parcial)
+            self._bytes_parciais += tamanho_objeto(parcial)
+        if self._bytes_parciais > self.limite_bytes:
+            self._consolidar()
+
+    def _consolidar(self):
+        self.consolidacoes += 1
+        self._bytes_parciais = 0
+        for chaves, parciais in self._parciais.items():
+            if len(parciais) > 1:
+                # Alinha as parciais à tabela de códigos mais recente antes de somar
+                tipos = {c: t for c, t in self.codigos.items() if c in chaves}
+                juntas = pd.concat([p.astype(tipos) for p in parciais], ignore_index=True)
+                parciais[:] = [somar(juntas, list(chaves))]
+            self._bytes_parciais += sum(tamanho_objeto(p) for p in parciais)
+
+        if self._bytes_parciais > self.limite_bytes:
+            minimo = self._bytes_parciais * FATOR_PICO_CONSOLIDACAO / FRACAO_PARCIAIS / 2**20
+            raise MemoryError(
+                f"Os níveis agregados ocupam {self._bytes_parciais / 2**20:.0f} MB, acima dos "
+                f"{self.limite_bytes / 2**20:.0f} MB reservados às parciais; use um orçamento "
+                f"de pelo menos {minimo:.0f} MB."
+            )
+
+    def codigos_ordenados(self) -> dict:
+        """
+        Tabela de códigos com categorias em ordem alfabética, como numa carga completa.
+        """
+        return {dim: pd.CategoricalDtype(sorted(dtype.categories)) for dim, dtype in self.codigos.items()}
+
+    def resultado(self) -> dict:
+        """
+        {tupla de chaves: nível} com os contadores somados, nas categorias e na
+        ordem de linhas de RollupRetencao.nivel sobre a base inteira.
+        """
+        self._consolidar()
+        tipos = self.codigos_ordenados()
+        niveis = {}
+        for chaves, parciais in self._parciais.items():
+            chaves = list(chaves)
+            nivel = parciais[0] if parciais else pd.DataFrame(columns=chaves + CONTADORES)
+            for c in chaves:
+                if c in tipos:
+                    # set_categories recodifica (astype entre categóricas com as mesmas categorias não reordena)
+                    nivel[c] = nivel[c].cat.set_categories(tipos[c].categories)
+            niveis[tuple(chaves)] = nivel.sort_values(chaves, kind="stable").reset_index(drop=True)
+        return niveis
+
+    def rollup(self) -> RollupRetencao:
+        """
+        Rollup só com os níveis agregados (sem o grão fino).
+        """
+        return RollupRetencao.de_niveis(None, self.resultado())
+
+
+class IndiceEmBlocos:
+    """
+    Drill-downs de IndiceSegmentos (linhas da base por mês, bot e valores de
+    uma dimensão) lendo o arquivo em blocos, para quando a base não cabe na memória.
+
+    - As linhas saem como na base do pipeline (script.preparar_base, mesmas
+      categorias e índice = posição no arquivo), na ordem do arquivo
+    - Na primeira consulta de um mês, as linhas daquele mês ficam em memória se
+      couberem em `limite_bytes`; as consultas seguintes do mesmo mês não releem
+      o arquivo. Se não couberem, cada consulta faz a sua passada
+    """
+
+    def __init__(self, caminho: str, linhas: int, codigos: dict, limite_bytes: int):
+        self.caminho = caminho
+        self.linhas = linhas
+        self.codigos = codigos
+        self.limite_bytes = limite_bytes
+        self._mes = None
+
+    def _blocos(self):
+        for bloco in ler_blocos(self.caminho, self.linhas):
+            yield preparar_base(bloco, self.codigos)
+
+    @staticmethod
+    def _mascara(df: pd.DataFrame, mes_key: int, chatbot, dimensao: str = None, valores=None) -> np.ndarray:
+        mascara = (df["mes_key"] == mes_key) & (df["chatbot"] == chatbot)
+        if valores is not None:
+            mascara &= df[dimensao].isin(list(valores))
+        return mascara.to_numpy(dtype=bool)
+
+    def _linhas_do_mes(self, mes_key: int):
+        # Linhas do mês em memória (memorizadas), ou None se passarem do limite
+        if self._mes is not None and self._mes[0] == mes_key:
+            return self._mes[1]
+        partes, tamanho = [], 0
+        for bloco in self._blocos():
+            parte = bloco[(bloco["mes_key"] == mes_key).to_numpy(dtype=bool)]
+            tamanho += tamanho_objeto(parte)
+            if tamanho > self.limite_bytes:
+                self._mes = (mes_key, None)
+                return None
+            partes.append(parte)
+        self._mes = (mes_key, pd.concat(partes) if partes else self.vazio())
+        return self._mes[1]
+
+    def fatiar(self, mes_key: int, chatbot, dimensao: str = None, valores=None) -> pd.DataFrame:
+        """
+        Linhas da base para (mês, bot[, valores da dimensão]), como IndiceSegmentos.fatiar.
+        """
+        do_mes = self._linhas_do_mes(mes_key)
+        if do_mes is not None:
+            return do_mes[self._mascara(do_mes, mes_key, chatbot, dimensao, valores)]
+        partes = [b[self._mascara(b, mes_key, chatbot, dimensao, valores)] for b in self._blocos()]
+        return pd.concat(partes) if partes else self.vazio()
+
+    def vazio(self) -> pd.DataFrame:
+        """
+        Fatia vazia, com as colunas e tipos da base.
+        """
+        return next(self._blocos()).iloc[0:0]
+
+
+def agregar_em_blocos(caminho: str, orcamento_mb: float = ORCAMENTO_MB, niveis: list = NIVEIS_FORA_MEMORIA) -> AgregadorNiveis:
+    """
+    Uma passada em blocos sobre `caminho`, somando os `niveis` dentro do orçamento.
+    """
+    agregador = AgregadorNiveis(niveis, limite_bytes=limite_parciais(orcamento_mb))
+    for bloco in ler_blocos(caminho, linhas_por_bloco(caminho, orcamento_mb, COLUNAS_AGREGACAO), COLUNAS_AGREGACAO):
+        agregador.adicionar(bloco)
+    return agregador
+
+
+class PipelineForaMemoria(PipelineRetencao):
+    """
+    PipelineRetencao sobre um arquivo que não cabe na memória.
+
+    - O rollup sai de uma passada em blocos (agregar_em_blocos) com os níveis
+      da análise, e os drill-downs leem o arquivo em blocos (IndiceEmBlocos);
+      a leitura e a agregação ficam dentro de `orcamento_mb`
+    - As etapas seguintes trabalham sobre os níveis agregados, que têm o
+      tamanho dos grupos (dias x segmentos), não o da base
+    - O grão fino não existe neste modo: a varredura de anomalias vai até
+      bot x dimensão (NIVEIS_VARREDURA_FORA_MEMORIA), o cubo do dashboard não
+      é montado (ETAPAS_GRAO_FINO) e a base inteira (df) não pode ser pedida
+    """
+
+    def __init__(self, file_path: str, orcamento_mb: float = ORCAMENTO_MB, parametros_anomalias: dict = None, **kwargs):
+        parametros_anomalias = {"niveis": NIVEIS_VARREDURA_FORA_MEMORIA, **(parametros_anomalias or {})}
+        super().__init__(file_path, parametros_anomalias=parametros_anomalias, **kwargs)
+        self.orcamento_mb = orcamento_mb
+        self._codigos = None
+
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        raise MemoryError("Modo fora da memória: a base inteira não é carregada; use rollup e indice")
+
+    @cached_property
+    @instrumentar("rollup_em_blocos")
+    def rollup(self) -> RollupRetencao:
+        agregador = agregar_em_blocos(self.file_path, self.orcamento_mb)
+        # Só a tabela de códigos fica (para os drill-downs); as parciais vão embora com o agregador
+        self._codigos = agregador.codigos_ordenados()
+        return agregador.rollup()
+
+    @cached_property
+    def indice(self) -> IndiceEmBlocos:
+        self.rollup  # a tabela de códigos sai da passada de agregação
+        return IndiceEmBlocos(
+            self.file_path,
+            linhas_por_bloco(self.file_path, self.orcamento_mb),
+            self._codigos,
+            limite_bytes=limite_parciais(self.orcamento_mb),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Agrega a base em blocos, sem carregá-la inteira, e mostra os níveis da análise."
+    )
+    parser.add_argument("fonte", help="Base agregada (.xlsx, .csv ou .parquet)")
+    parser.add_argument("--orcamento-mb", type=float, default=ORCAMENTO_MB, help="Orçamento de memória em MB")
+    args = parser.parse_args()
+
+    agregador = agregar_em_blocos(args.fonte, args.orcamento_mb)
+    print(f"{agregador.linhas_lidas} linhas lidas; {agregador.consolidacoes} consolidações")
+    for chaves, nivel in agregador.resultado().items():
+        print(f"  {' x '.join(chaves)}: {len(nivel)} linhas")
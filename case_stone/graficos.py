@@ -0,0 +1,134 @@
+import io
+
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Figuras do dashboard pela API orientada a objetos do matplotlib (Figure + canvas Agg):
+# nada passa pelo estado global do pyplot, então nenhuma figura fica registrada
+# no processo depois de renderizada.
+
+
+def nova_figura(figsize) -> tuple:
+    """
+    Figure + Axes soltos (fora do pyplot), já ligados a um canvas Agg.
+    """
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def renderizar_png(fig: Figure, dpi: int = 150) -> bytes:
+    """
+    Renderiza a figura em PNG e libera seus artistas logo em seguida.
+    """
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=dpi)
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+
+def historico_mensal(df_monthly_macro: pd.DataFrame, palette: dict, bots: list) -> Figure:
+    fig, ax = nova_figura((12, 5))
+
+    # Retenção - linha cheia
+    sns.lineplot(
+        data=df_monthly_macro,
+        x="session_month",
+        y="retencao_pct",
+        hue="chatbot",
+        palette=palette,
+        marker="o",
+        linewidth=2,
+        legend=False,
+        ax=ax,
+    )
+
+    # Pedido de atendimento - linha tracejada
+    sns.lineplot(
+        data=df_monthly_macro,
+        x="session_month",
+        y="pct_pedido_atendimento",
+        hue="chatbot",
+        palette=palette,
+        marker="o",
+        linewidth=2,
+        linestyle="--",
+        legend=False,
+        ax=ax,
+    )
+
+    ax.set_xlabel("Mês")
+    ax.set_ylabel("Percentual (%)")
+    ax.set_title("Histórico Mensal: Retenção x Pedido de Atendimento por Chatbot")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.grid(True)
+
+    custom_lines = []
+    for bot in bots:
+        custom_lines += [
+            Line2D([0], [0], color=palette[bot], lw=2, marker="o", linestyle="-",
+                   label=f"{bot} - Retenção"),
+            Line2D([0], [0], color=palette[bot], lw=2, marker="", linestyle="--",
+                   label=f"{bot} - Pedido de atendimento"),
+        ]
+    ax.legend(handles=custom_lines, title="Métrica", loc="best")
+    return fig
+
+
+def correlacao(corr_matrix: pd.DataFrame, bot: str) -> Figure:
+    fig, ax = nova_figura((4, 3))
+    sns.heatmap(
+        corr_matrix,
+        annot=True,
+        cmap="Blues",
+        fmt=".2f",
+        vmin=-1,
+        vmax=1,
+        ax=ax,
+    )
+    ax.set_title(f"Correlação - {bot}")
+    return fig
+
+
+def retencao_2025(df_2025_full: pd.DataFrame, bot: str, mes_projetado: str) -> Figure:
+    # mes_projetado: primeiro mês projetado da série ('AAAA-MM', o mês atual parcial)
+    df_bot_2025 = df_2025_full[df_2025_full["chatbot"] == bot].copy()
+    df_bot_2025 = df_bot_2025.sort_values("session_month")
+
+    df_bot_2025["tipo"] = df_bot_2025["session_month"].apply(
+        lambda m: "Projetado" if m >= mes_projetado else "Real"
+    )
+
+    fig, ax = nova_figura((10, 4))
+    sns.lineplot(
+        data=df_bot_2025[df_bot_2025["tipo"] == "Real"],
+        x="session_month",
+        y="retencao_pct",
+        marker="o",
+        label="Real",
+        ax=ax,
+    )
+    sns.lineplot(
+        data=df_bot_2025[df_bot_2025["tipo"] == "Projetado"],
+        x="session_month",
+        y="retencao_pct",
+        marker="o",
+        linestyle="--",
+        label="Projetado",
+        ax=ax,
+    )
+
+    # --- ajuste da escala do eixo Y ---
+    ax.set_ylim(0, 100)
+
+    ax.set_title(f"Retenção 2025 - {bot}")
+    ax.set_xlabel("Mês")
+    ax.set_ylabel("Retenção (%)")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.grid(True)
+    return fig
@@ -0,0 +1,313 @@
+import os
+import json
+import argparse
+from functools import cached_property
+
+import pandas as pd
+
+from carga import DIMENSOES, CONTADORES, normalizar_esquema, tabela_codigos
+from agregacao import GRAO_FINO, RollupRetencao
+from anomalias import NIVEIS_VARREDURA
+from indice import IndiceSegmentos
+from script import PipelineRetencao, preparar_base
+
+
+# Features usadas nas tabelas de mix (todas as dimensões menos o chatbot)
+FEATURES_MIX = [d for d in DIMENSOES if d != "chatbot"]
+
+# Níveis consumidos pelo pipeline, persistidos por partição mensal.
+# Todos têm uma chave de mês (ou de data), então um dia novo só altera a partição do seu mês.
+NIVEIS_PERSISTIDOS = [
+    ["session_date", "chatbot"],              # df_daily
+    ["session_month", "chatbot"],             # df_monthly_macro
+    ["session_month", "chatbot", "fonte"],    # deep_fonte
+] + [["mes_key", "chatbot", f] for f in FEATURES_MIX] + [  # tabelas de mix
+    ["session_date", "chatbot", f] for f in FEATURES_MIX   # varredura de anomalias
+]
+
+# Varredura de anomalias a partir dos níveis persistidos (até bot x dimensão, sem o grão fino)
+NIVEIS_VARREDURA_PERSISTIDOS = [dims for dims in NIVEIS_VARREDURA if len(dims) <= 2]
+
+VERSAO_ESTADO = 2
+
+
+def _nome_nivel(chaves: list) -> str:
+    return "-".join(chaves)
+
+
+def _gravar_parquet(df: pd.DataFrame, caminho: str):
+    # Gravação atômica, como em carga._gravar_cache
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, caminho)
+
+
+def ler_tabela(caminho: str) -> pd.DataFrame:
+    """
+    Lê uma tabela agregada (mesmas colunas do SELECT) de xlsx, csv ou parquet.
+    """
+    ext = os.path.splitext(caminho)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return pd.read_parquet(caminho)
+    if ext == ".csv":
+        return pd.read_csv(caminho)
+    return pd.read_excel(caminho)
+
+
+class EstadoIncremental:
+    """
+    Estado agregado persistido em disco, particionado por mês (mes_key).
+
+    - base/AAAAMM.parquet guarda o grão mais fino do mês
+    - niveis/<chaves>/AAAAMM.parquet guarda cada nível de NIVEIS_PERSISTIDOS
+    - estado.json guarda a tabela de códigos das dimensões e os dias aplicados
+
+    Como as somas são aditivas, aplicar um dia novo relê e regrava apenas a
+    partição do mês daquele dia; os demais meses ficam intocados.
+    """
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        self.manifesto_path = os.path.join(diretorio, "estado.json")
+        self.codigos = {}
+        self.meses = []
+        self.dias = []
+        self._niveis_lidos = {}
+
+        if os.path.exists(self.manifesto_path):
+            with open(self.manifesto_path, "r", encoding="utf-8") as f:
+                manifesto = json.load(f)
+            if manifesto.get("versao") != VERSAO_ESTADO:
+                raise ValueError(
+                    f"Estado em {diretorio} tem versão {manifesto.get('versao')}; "
+                    f"esperado {VERSAO_ESTADO}. Reinicialize com inicializar()."
+                )
+            self.codigos = {
+                dim: pd.CategoricalDtype(categorias)
+                for dim, categorias in manifesto["codigos"].items()
+            }
+            self.meses = manifesto["meses"]
+            self.dias = manifesto["dias"]
+
+    # ----------------------------------------------------------------- caminhos
+    def _caminho_base(self, mes: int) -> str:
+        return os.path.join(self.diretorio, "base", f"{mes}.parquet")
+
+    def _caminho_nivel(self, chaves: list, mes: int) -> str:
+        return os.path.join(self.diretorio, "niveis", _nome_nivel(chaves), f"{mes}.parquet")
+
+    def _gravar_manifesto(self):
+        manifesto = {
+            "versao": VERSAO_ESTADO,
+            "codigos": {dim: list(dtype.categories) for dim, dtype in self.codigos.items()},
+            "meses": self.meses,
+            "dias": self.dias,
+        }
+        os.makedirs(self.diretorio, exist_ok=True)
+        tmp = f"{self.manifesto_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f)
+        os.replace(tmp, self.manifesto_path)
+
+    @property
+    def ultimo_dia(self):
+        return pd.to_datetime(str(self.dias[-1]), format="%Y%m%d") if self.dias else None
+
+    # ------------------------------------------------------------- atualização
+    def _gravar_mes(self, mes: int, particao: pd.DataFrame):
+        """
+        Regrava a partição de um mês: grão fino + níveis persistidos.
+        """
+        rollup = RollupRetencao(particao)
+        _gravar_parquet(rollup.base[GRAO_FINO + CONTADORES], self._caminho_base(mes))
+        for chaves in NIVEIS_PERSISTIDOS:
+            _gravar_parquet(rollup.nivel(chaves), self._caminho_nivel(chaves, mes))
+
+    def _ler_mes(self, mes: int) -> pd.DataFrame:
+        return pd.read_parquet(self._caminho_base(mes)).astype(self.codigos)
+
+    def inicializar(self, df: pd.DataFrame):
+        """
+        Constrói o estado do zero a partir do histórico completo (uma única vez).
+        """
+        df = normalizar_esquema(df)
+        self.codigos = tabela_codigos(df)
+        self.meses = sorted(int(m) for m in df["mes_key"].unique())
+        self.dias = sorted(int(d) for d in df["dia_key"].unique())
+        for mes, particao in df.groupby("mes_key", sort=True):
+            self._gravar_mes(int(mes), particao)
+        self._niveis_lidos = {}
+        self._gravar_manifesto()
+
+    def aplicar_delta(self, df_delta: pd.DataFrame, substituir_dias: bool = True) -> list:
+        """
+        Aplica um delta (ex.: o dia novo) já no formato agregado do SELECT.
+
+        - Só as partições dos meses presentes no delta são relidas e regravadas
+        - Com substituir_dias=True, dias do delta que já existiam no estado são
+          substituídos (reprocessar a mesma manhã não duplica contagens);
+          com False, as contagens são somadas às existentes
+        - Retorna as mes_key afetadas
+        """
+        delta = normalizar_esquema(df_delta, self.codigos)
+        self.codigos = tabela_codigos(delta)
+
+        afetados = sorted(int(m) for m in delta["mes_key"].unique())
+        for mes in afetados:
+            parte = delta[delta["mes_key"] == mes]
+            if mes in self.meses:
+                atual = self._ler_mes(mes)
+                if substituir_dias:
+                    atual = atual[~atual["session_date"].isin(parte["session_date"].unique())]
+                parte = pd.concat([atual.astype(self.codigos), parte[GRAO_FINO + CONTADORES]], ignore_index=True)
+            self._gravar_mes(mes, parte)
+
+        self.meses = sorted(set(self.meses) | set(afetados))
+        self.dias = sorted(set(self.dias) | {int(d) for d in delta["dia_key"].unique()})
+        self._niveis_lidos = {}
+        self._gravar_manifesto()
+        return afetados
+
+    # ------------------------------------------------------------------ leitura
+    def _dtypes_ordenados(self) -> dict:
+        # Categorias em ordem alfabética, como numa carga completa (normalizar_esquema)
+        return {
+            dim: pd.CategoricalDtype(sorted(dtype.categories))
+            for dim, dtype in self.codigos.items()
+        }
+
+    def _concatenar(self, caminhos: list, chaves: list) -> pd.DataFrame:
+        dtypes = self._dtypes_ordenados()
+        partes = [pd.read_parquet(c) for c in caminhos]
+        df = pd.concat(partes, ignore_index=True)
+        df = df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+        return df.sort_values(chaves, kind="stable").reset_index(drop=True)
+
+    def base(self, meses: list = None) -> pd.DataFrame:
+        """
+        Base no grão mais fino das partições `meses` (padrão: todas), normalizada.
+        """
+        meses = self.meses if meses is None else [m for m in meses if m in self.meses]
+        if not meses:
+            return normalizar_esquema(pd.DataFrame(columns=GRAO_FINO + CONTADORES), self._dtypes_ordenados())
+        df = self._concatenar([self._caminho_base(m) for m in meses], GRAO_FINO)
+        return normalizar_esquema(df, self._dtypes_ordenados())
+
+    def nivel(self, chaves: list) -> pd.DataFrame:
+        """
+        Nível persistido `chaves`, juntando as partições mensais.
+        """
+        nome = _nome_nivel(chaves)
+        if nome not in self._niveis_lidos:
+            self._niveis_lidos[nome] = self._concatenar(
+                [self._caminho_nivel(chaves, m) for m in self.meses], chaves
+            )
+        return self._niveis_lidos[nome]
+
+    def rollup(self, base: pd.DataFrame = None) -> RollupRetencao:
+        """
+        Rollup pré-carregado com os níveis persistidos: o pipeline lê
+        df_daily, df_monthly_macro, os mixes e a varredura de anomalias daqui,
+        sem reagregar o histórico. Sem `base`, o rollup não tem o grão fino.
+        """
+        niveis = {tuple(chaves): self.nivel(chaves) for chaves in NIVEIS_PERSISTIDOS}
+        if base is not None:
+            base = base[GRAO_FINO + CONTADORES].copy()
+        return RollupRetencao.de_niveis(base, niveis)
+
+    def pipeline(self, **kwargs) -> "PipelineIncremental":
+        """
+        PipelineRetencao sobre o estado incremental (ver PipelineIncremental).
+        """
+        return PipelineIncremental(self, **kwargs)
+
+
+class IndiceIncremental:
+    """
+    Drill-downs de IndiceSegmentos sobre o estado: na primeira consulta de um
+    mês, só a partição do grão fino daquele mês é lida e indexada.
+
+    O pipeline só consulta o mês atual e o anterior, então o histórico no
+    grão fino nunca é carregado inteiro.
+    """
+
+    def __init__(self, estado: EstadoIncremental):
+        self.estado = estado
+        self._meses = {}
+
+    def _indice(self, mes_key: int) -> IndiceSegmentos:
+        if mes_key not in self._meses:
+            base = self.estado.base([mes_key])
+            self._meses[mes_key] = IndiceSegmentos(preparar_base(base, self.estado._dtypes_ordenados()))
+        return self._meses[mes_key]
+
+    def fatiar(self, mes_key: int, chatbot, dimensao: str = None, valores=None) -> pd.DataFrame:
+        """
+        Linhas da base para (mês, bot[, valores da dimensão]), como IndiceSegmentos.fatiar.
+        """
+        return self._indice(mes_key).fatiar(mes_key, chatbot, dimensao, valores)
+
+    def vazio(self) -> pd.DataFrame:
+        """
+        Fatia vazia, com as colunas e tipos da base.
+        """
+        return self._indice(self.estado.meses[-1]).vazio()
+
+
+class PipelineIncremental(PipelineRetencao):
+    """
+    PipelineRetencao a partir do estado incremental, sem reler o histórico no grão fino.
+
+    - O rollup é montado dos níveis persistidos (uma partição pequena por mês)
+    - Os drill-downs (indice) leem só as partições dos meses consultados
+    - Sem o grão fino: a varredura de anomalias vai até bot x dimensão
+      (NIVEIS_VARREDURA_PERSISTIDOS) e o cubo do dashboard não é montado;
+      a base inteira (df) só é lida se pedida explicitamente (ex.: relatorio)
+    """
+
+    def __init__(self, estado: EstadoIncremental, parametros_anomalias: dict = None, **kwargs):
+        parametros_anomalias = {"niveis": NIVEIS_VARREDURA_PERSISTIDOS, **(parametros_anomalias or {})}
+        super().__init__(estado.diretorio, rollup=estado.rollup(), parametros_anomalias=parametros_anomalias, **kwargs)
+        self.estado = estado
+
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        return preparar_base(self.estado.base(), self.estado._dtypes_ordenados())
+
+    @cached_property
+    def indice(self) -> IndiceIncremental:
+        return IndiceIncremental(self.estado)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mantém o estado agregado incremental (partições mensais em parquet)."
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_init = sub.add_parser("inicializar", help="Constrói o estado a partir do histórico completo")
+    p_init.add_argument("estado", help="Pasta do estado")
+    p_init.add_argument("fonte", help="Base agregada completa (.xlsx, .csv ou .parquet)")
+
+    p_delta = sub.add_parser("aplicar", help="Aplica o delta de um ou mais dias")
+    p_delta.add_argument("estado", help="Pasta do estado")
+    p_delta.add_argument("fonte", help="Delta agregado, ou sessões com --sessoes")
+    p_delta.add_argument("--sessoes", action="store_true", help="Fonte é silver_sessions (uma linha por sessão)")
+    p_delta.add_argument("--somar", action="store_true", help="Soma aos dias existentes em vez de substituí-los")
+
+    args = parser.parse_args()
+    estado = EstadoIncremental(args.estado)
+
+    if args.comando == "inicializar":
+        estado.inicializar(ler_tabela(args.fonte))
+        print(f"Estado criado com {len(estado.meses)} meses e {len(estado.dias)} dias em {args.estado}")
+    else:
+        if args.sessoes:
+            from ingestao import agregar_silver_sessions
+
+            df_delta = agregar_silver_sessions(args.fonte)
+        else:
+            df_delta = ler_tabela(args.fonte)
+        afetados = estado.aplicar_delta(df_delta, substituir_dias=not args.somar)
+        print(f"Partições atualizadas: {afetados}; último dia: {estado.ultimo_dia:%Y-%m-%d}")
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+def _codigos(serie: pd.Series):
+    # Códigos inteiros (>= 0) e valores de uma coluna; categóricas reaproveitam os próprios códigos
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(dtype="int64") + 1, serie.cat.categories
+    codigos, valores = pd.factorize(serie)
+    return codigos.astype("int64") + 1, pd.Index(valores)
+
+
+class IndiceSegmentos:
+    """
+    Índice ordenado da base por (mês, bot, valor de uma dimensão).
+
+    - Para cada dimensão consultada, as linhas são ordenadas uma única vez por
+      uma chave inteira composta (mês, bot, código do valor); a ordenação fica
+      memorizada
+    - Um drill-down ("linhas de agosto do BOT_A com estes assuntos") vira uma
+      busca binária por valor + fatia, em vez de máscaras booleanas na base toda
+    - fatiar() devolve as linhas na ordem original da base, igual a df[mascara]
+    """
+
+    def __init__(self, df: pd.DataFrame, mes: str = "mes_key", chave: str = "chatbot"):
+        self.df = df
+        self._meses, cod_mes = np.unique(df[mes].to_numpy(), return_inverse=True)
+        cod_chave, self._valores_chave = _codigos(df[chave])
+        self._n_chave = len(self._valores_chave) + 1
+        # Prefixo (mês, bot) de cada linha, comum a todas as dimensões
+        self._prefixo = cod_mes.astype("int64") * self._n_chave + cod_chave
+        self._ordens = {}
+
+    def _ordem(self, dimensao: str):
+        # (chaves ordenadas, permutação, valores, largura) da dimensão, calculado uma vez
+        if dimensao not in self._ordens:
+            if dimensao is None:
+                cod, valores = np.zeros(len(self.df), dtype="int64"), pd.Index([])
+            else:
+                cod, valores = _codigos(self.df[dimensao])
+            largura = len(valores) + 1
+            chaves = self._prefixo * largura + cod
+            perm = np.argsort(chaves, kind="stable")
+            self._ordens[dimensao] = (chaves[perm], perm, valores, largura)
+        return self._ordens[dimensao]
+
+    def posicoes(self, mes_key: int, chatbot, dimensao: str = None, valores=None) -> np.ndarray:
+        """
+        Posições (iloc, em ordem crescente) das linhas do mês `mes_key` e do bot
+        `chatbot`; com `dimensao`/`valores`, só as linhas com esses valores.
+        """
+        i_mes = np.searchsorted(self._meses, mes_key)
+        i_chave = self._valores_chave.get_indexer([chatbot])[0]
+        if i_mes >= len(self._meses) or self._meses[i_mes] != mes_key or i_chave < 0:
+            return np.array([], dtype="int64")
+
+        chaves, perm, valores_dim, largura = self._ordem(dimensao if valores is not None else None)
+        base = (i_mes * self._n_chave + i_chave + 1) * largura
+
+        if valores is None:
+            inicios = np.searchsorted(chaves, [base], side="left")
+            fins = np.searchsorted(chaves, [base + largura], side="left")
+        else:
+            codigos = valores_dim.get_indexer(pd.Index(list(valores)).unique())
+            alvos = base + codigos[codigos >= 0] + 1
+            inicios = np.searchsorted(chaves, alvos, side="left")
+            fins = np.searchsorted(chaves, alvos, side="right")
+
+        if not len(inicios):
+            return np.array([], dtype="int64")
+        return np.sort(np.concatenate([perm[a:b] for a, b in zip(inicios, fins)]))
+
+    def fatiar(self, mes_key: int, chatbot, dimensao: str = None, valores=None) -> pd.DataFrame:
+        """
+        Linhas da base para (mês, bot[, valores da dimensão]), como df[mascara].
+        """
+        return self.df.iloc[self.posicoes(mes_key, chatbot, dimensao, valores)]
+
+    def vazio(self) -> pd.DataFrame:
+        """
+        Fatia vazia, com as colunas e tipos da base.
+        """
+        return self.df.iloc[0:0]
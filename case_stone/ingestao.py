@@ -0,0 +1,190 @@
+import os
+import logging
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from carga import CONTADORES, normalizar_esquema, tabela_codigos
+from agregacao import GRAO_FINO
+
+log = logging.getLogger("case_stone")
+
+# Colunas de silver_sessions necessárias para o SELECT de tabelas_fonte.sql
+COLUNAS_SESSAO = GRAO_FINO + ["flag_sessao_retida", "flag_pedido_atendimento"]
+
+TAMANHO_CHUNK = 1_000_000
+
+_VERDADEIROS = {"true", "t", "1", "yes", "y", "sim", "s"}
+
+
+def _flag_para_int(serie: pd.Series) -> np.ndarray:
+    """
+    Equivalente a CASE WHEN flag = TRUE THEN 1 ELSE 0 END:
+    True/1/'true' contam 1; False, 0 e NULL contam 0.
+    """
+    if pd.api.types.is_bool_dtype(serie) and not serie.hasnans:
+        return serie.to_numpy(dtype="uint8")
+    if pd.api.types.is_numeric_dtype(serie):
+        return (serie.fillna(0).to_numpy() == 1).astype("uint8")
+    texto = serie.astype("string").str.strip().str.lower()
+    return texto.isin(_VERDADEIROS).fillna(False).to_numpy(dtype="uint8")
+
+
+def ler_sessoes_em_chunks(fonte: str, tamanho_chunk: int = TAMANHO_CHUNK, tabela: str = "silver_sessions"):
+    """
+    Lê silver_sessions (uma linha por sessão) em blocos de no máximo
+    `tamanho_chunk` linhas, a partir de CSV, Parquet ou SQLite.
+
+    Só as colunas usadas na agregação são lidas.
+    """
+    ext = os.path.splitext(fonte)[1].lower()
+
+    if ext in (".csv", ".txt", ".gz"):
+        yield from pd.read_csv(fonte, usecols=COLUNAS_SESSAO, chunksize=tamanho_chunk)
+
+    elif ext in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        arquivo = pq.ParquetFile(fonte)
+        for lote in arquivo.iter_batches(batch_size=tamanho_chunk, columns=COLUNAS_SESSAO):
+            yield lote.to_pandas()
+
+    elif ext in (".db", ".sqlite", ".sqlite3"):
+        query = f"SELECT {', '.join(COLUNAS_SESSAO)} FROM {tabela}"
+        with sqlite3.connect(fonte) as conn:
+            yield from pd.read_sql_query(query, conn, chunksize=tamanho_chunk)
+
+    else:
+        raise ValueError(f"Formato não suportado para silver_sessions: {fonte}")
+
+
+def agregar_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agrega um bloco de sessões no grão diário do SELECT de tabelas_fonte.sql:
+    COUNT(*) e SUM(CASE WHEN flag = TRUE ...) por data x bot x fonte x tecnologia x tópico x assunto.
+    """
+    contagens = pd.DataFrame({
+        "sessoes_total": np.ones(len(chunk), dtype="uint8"),
+        "sessoes_retidas": _flag_para_int(chunk["flag_sessao_retida"]),
+        "sessoes_com_pedido_de_atendimento": _flag_para_int(chunk["flag_pedido_atendimento"]),
+    })
+    chaves = chunk[GRAO_FINO].reset_index(drop=True)
+    if not pd.api.types.is_datetime64_any_dtype(chaves["session_date"]):
+        chaves["session_date"] = pd.to_datetime(chaves["session_date"])
+    chaves["session_date"] = chaves["session_date"].dt.normalize()
+
+    # dropna=False: como no GROUP BY do SQL, NULL forma um grupo próprio
+    return (
+        pd.concat([chaves, contagens], axis=1)
+        .groupby(GRAO_FINO, observed=True, dropna=False, sort=False)[CONTADORES]
+        .sum()
+        .reset_index()
+    )
+
+
+class AgregadorSessoes:
+    """
+    Dobra blocos de sessões na tabela agregada diária, incrementalmente.
+
+    - Cada bloco é agregado e codificado com a mesma tabela de códigos
+      (dimensões categóricas), então o estado guarda só códigos + contadores
+    - As parciais são consolidadas sempre que passam de `limite_linhas` ou
+      do dobro do último consolidado (o que for maior), de modo que a memória
+      depende do número de grupos distintos (dias x segmentos), e não do
+      número de sessões lidas, e cada consolidação custa no máximo o dobro
+      das linhas novas desde a anterior
+    - Sessões sem session_date são descartadas e contadas em
+      `sessoes_sem_data`: diferente do GROUP BY do SQL, a análise é por dia e
+      não tem onde pôr um grupo de data NULL (NULL nas dimensões continua
+      formando grupo próprio)
+    """
+
+    def __init__(self, limite_linhas: int = 2 * TAMANHO_CHUNK):
+        self.limite_linhas = limite_linhas
+        self.codigos = {}
+        self.sessoes_lidas = 0
+        self.sessoes_sem_data = 0
+        self._parciais = []
+        self._linhas_parciais = 0
+        self._linhas_consolidadas = 0
+
+    def adicionar(self, chunk: pd.DataFrame):
+        self.sessoes_lidas += len(chunk)
+        sem_data = chunk["session_date"].isna()
+        if sem_data.any():
+            self.sessoes_sem_data += int(sem_data.sum())
+            chunk = chunk[~sem_data]
+            if chunk.empty:
+                return
+        parcial = normalizar_esquema(agregar_chunk(chunk), self.codigos)
+        self.codigos = tabela_codigos(parcial)
+
+        self._parciais.append(parcial)
+        self._linhas_parciais += len(parcial)
+        if self._linhas_parciais > max(self.limite_linhas, 2 * self._linhas_consolidadas):
+            self._consolidar()
+
+    def _consolidar(self):
+        if len(self._parciais) <= 1:
+            return
+        # Alinha todas as parciais à tabela de códigos mais recente antes de somar
+        parciais = [p.astype(self.codigos) for p in self._parciais]
+        consolidado = (
+            pd.concat(parciais, ignore_index=True)
+            .groupby(GRAO_FINO, observed=True, dropna=False, sort=False)[CONTADORES]
+            .sum()
+            .reset_index()
+        )
+        self._parciais = [normalizar_esquema(consolidado, self.codigos)]
+        self._linhas_parciais = self._linhas_consolidadas = len(self._parciais[0])
+
+    def resultado(self) -> pd.DataFrame:
+        """
+        Tabela agregada final, nas colunas e ordem do SELECT, ordenada pelo grão.
+        """
+        if not self._parciais:
+            return pd.DataFrame(columns=GRAO_FINO + CONTADORES)
+        self._consolidar()
+        df = self._parciais[0]
+        return (
+            df[GRAO_FINO + CONTADORES]
+            .sort_values(GRAO_FINO)
+            .reset_index(drop=True)
+        )
+
+
+def agregar_silver_sessions(fonte: str, tamanho_chunk: int = TAMANHO_CHUNK, tabela: str = "silver_sessions") -> pd.DataFrame:
+    """
+    Lê silver_sessions em blocos e devolve a tabela agregada diária,
+    com as mesmas contagens do SELECT de tabelas_fonte.sql.
+    """
+    agregador = AgregadorSessoes(limite_linhas=2 * tamanho_chunk)
+    for chunk in ler_sessoes_em_chunks(fonte, tamanho_chunk, tabela):
+        agregador.adicionar(chunk)
+    if agregador.sessoes_sem_data:
+        log.warning("%d sessões sem session_date descartadas", agregador.sessoes_sem_data)
+    return agregador.resultado()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Agrega silver_sessions (CSV/Parquet/SQLite) no grão diário usado pela análise."
+    )
+    parser.add_argument("fonte", help="Arquivo de sessões (.csv, .parquet ou .db/.sqlite)")
+    parser.add_argument("saida", help="Arquivo de saída (.parquet, .csv ou .xlsx)")
+    parser.add_argument("--chunk", type=int, default=TAMANHO_CHUNK, help="Linhas por bloco de leitura")
+    parser.add_argument("--tabela", default="silver_sessions", help="Tabela no SQLite")
+    args = parser.parse_args()
+
+    df_agregado = agregar_silver_sessions(args.fonte, args.chunk, args.tabela)
+
+    ext_saida = os.path.splitext(args.saida)[1].lower()
+    if ext_saida == ".csv":
+        df_agregado.to_csv(args.saida, index=False)
+    elif ext_saida == ".xlsx":
+        df_agregado.to_excel(args.saida, index=False)
+    else:
+        df_agregado.to_parquet(args.saida, index=False)
+    print(f"{len(df_agregado)} linhas agregadas gravadas em {args.saida}")
@@ -0,0 +1,321 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+import functools
+import tracemalloc
+
+import pandas as pd
+
+
+# Modos de instrumentação:
+# - "tempo": tempo, linhas de entrada/saída e variação de RSS por etapa
+# - "memoria": idem, com alocações medidas por tracemalloc (delta e pico)
+# - "perfil": idem, com cProfile nas etapas de nível mais alto
+MODOS = ("tempo", "memoria", "perfil")
+
+
+def _modo_ambiente():
+    # CASE_STONE_INSTRUMENTACAO=1|tempo|memoria|perfil liga a instrumentação no processo todo
+    valor = os.environ.get("CASE_STONE_INSTRUMENTACAO", "").strip().lower()
+    if valor in ("", "0", "false", "nao", "não"):
+        return None
+    return valor if valor in MODOS else "tempo"
+
+
+def _rss_mb():
+    # Memória residente do processo (Linux); None onde /proc não existe
+    try:
+        with open("/proc/self/statm", "r") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def contar_linhas(obj):
+    """
+    Linhas de um resultado: len() de DataFrame/Series, soma para dict/list/tuple
+    de frames; de um rollup (agregacao.RollupRetencao), as linhas do grão fino.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if hasattr(obj, "grao") and hasattr(obj, "nivel"):
+        try:
+            return len(obj.base)
+        except KeyError:
+            # Rollup montado só com níveis agregados (sem grão fino)
+            return None
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (list, tuple)):
+        contagens = [contar_linhas(o) for o in obj]
+        contagens = [c for c in contagens if c is not None]
+        return sum(contagens) if contagens else None
+    return None
+
+
+class _SemMedicao:
+    """
+    Contexto nulo devolvido quando a instrumentação está desligada:
+    um único objeto compartilhado, sem custo além da chamada.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+
+_SEM_MEDICAO = _SemMedicao()
+
+
+class _UsoTracemalloc:
+    """
+    tracemalloc é do processo inteiro, mas o modo "memoria" é escolhido por
+    thread (sessão do Streamlit). As medições em curso de todas as threads
+    são contadas sob um lock:
+
+    - tracemalloc liga na primeira e desliga na última (se foi ligado aqui)
+    - o pico só é zerado quando uma etapa mais externa começa sem nenhuma
+      outra em curso; etapas externas que se sobrepõem no tempo não têm pico
+      atribuível e ficam com pico_mb vazio (os deltas, memoria_mb, incluem
+      as alocações das outras threads nesse intervalo)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_uso = 0
+        self._ligado_aqui = False
+        self._externas = set()
+
+    def entrar(self, medicao) -> int:
+        with self._lock:
+            if self._em_uso == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._ligado_aqui = True
+            self._em_uso += 1
+            if medicao.nivel == 0:
+                if self._externas:
+                    medicao._pico_compartilhado = True
+                    for outra in self._externas:
+                        outra._pico_compartilhado = True
+                else:
+                    tracemalloc.reset_peak()
+                self._externas.add(medicao)
+            return tracemalloc.get_traced_memory()[0]
+
+    def sair(self, medicao) -> tuple:
+        with self._lock:
+            atual, pico = tracemalloc.get_traced_memory()
+            self._externas.discard(medicao)
+            self._em_uso -= 1
+            if self._em_uso == 0 and self._ligado_aqui:
+                tracemalloc.stop()
+                self._ligado_aqui = False
+            return atual, pico
+
+
+_tracemalloc = _UsoTracemalloc()
+
+
+class Medicao:
+    """
+    Medição de uma etapa: use como context manager (via RegistroEtapas.medir).
+    Dentro do bloco, `linhas_saida` pode ser preenchido pelo chamador.
+    """
+
+    def __init__(self, registro, nome: str, linhas_entrada=None):
+        self.registro = registro
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.nivel = 0
+        self.segundos = None
+        self.memoria_mb = None
+        self.pico_mb = None
+        self.perfil = None
+
+    def __enter__(self):
+        local = self.registro._local
+        self.nivel = local.profundidade
+        local.profundidade = self.nivel + 1
+        modo = self._modo = self.registro.modo
+
+        self._pico_compartilhado = False
+        if modo == "memoria":
+            # O pico só é zerado na etapa mais externa, para não afetar a medição de quem a chamou
+            self._memoria_inicio = _tracemalloc.entrar(self)
+        else:
+            self._memoria_inicio = _rss_mb()
+
+        # cProfile só na etapa mais externa (não aceita perfis aninhados)
+        self._perfil = None
+        if modo == "perfil" and self.nivel == 0:
+            self._perfil = cProfile.Profile()
+            self._perfil.enable()
+
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self._inicio
+
+        if self._perfil is not None:
+            self._perfil.disable()
+            saida = io.StringIO()
+            pstats.Stats(self._perfil, stream=saida).sort_stats("cumulative").print_stats(20)
+            self.perfil = saida.getvalue()
+
+        if self._modo == "memoria":
+            atual, pico = _tracemalloc.sair(self)
+            self.memoria_mb = (atual - self._memoria_inicio) / 1024 ** 2
+            if self.nivel == 0 and not self._pico_compartilhado:
+                self.pico_mb = (pico - self._memoria_inicio) / 1024 ** 2
+        elif self._memoria_inicio is not None:
+            rss = _rss_mb()
+            self.memoria_mb = rss - self._memoria_inicio if rss is not None else None
+
+        local = self.registro._local
+        local.profundidade = self.nivel
+        self.registro._registrar(self)
+        return False
+
+    def como_dict(self) -> dict:
+        return {
+            "etapa": ("· " * self.nivel) + self.nome,
+            "segundos": round(self.segundos, 4) if self.segundos is not None else None,
+            "linhas_entrada": self.linhas_entrada,
+            "linhas_saida": self.linhas_saida,
+            "memoria_mb": round(self.memoria_mb, 2) if self.memoria_mb is not None else None,
+            "pico_mb": round(self.pico_mb, 2) if self.pico_mb is not None else None,
+        }
+
+
+class _EstadoThread(threading.local):
+    # Valores padrão como atributos de classe: ler o estado de uma thread que
+    # nunca iniciou execução não levanta AttributeError (leitura barata)
+    modo = None
+    medicoes = None
+    profundidade = 0
+
+
+class RegistroEtapas:
+    """
+    Registro das medições por etapa.
+
+    - Desligado por padrão: medir() devolve um contexto nulo compartilhado
+    - Liga no processo todo por CASE_STONE_INSTRUMENTACAO, ou só na thread
+      atual com iniciar_execucao(modo) (no Streamlit, cada sessão roda o
+      script numa thread própria, então uma sessão não liga a das outras)
+    - Cada execução guarda suas medições em ordem de término
+    """
+
+    def __init__(self, modo: str = None):
+        self.modo_global = modo
+        self._local = _EstadoThread()
+        self._lock = threading.Lock()
+        self._medicoes_globais = []
+
+    @property
+    def modo(self):
+        return self._local.modo or self.modo_global
+
+    def iniciar_execucao(self, modo: str = None) -> list:
+        """
+        Começa uma nova execução na thread atual (ex.: um rerun do dashboard)
+        e define o modo dela; devolve a lista onde as medições vão entrar.
+        """
+        self._local.modo = modo if modo in MODOS else None
+        self._local.medicoes = []
+        self._local.profundidade = 0
+        return self._local.medicoes
+
+    def _registrar(self, medicao: Medicao):
+        medicoes = self._local.medicoes
+        if medicoes is not None:
+            medicoes.append(medicao)
+        else:
+            with self._lock:
+                self._medicoes_globais.append(medicao)
+
+    def medicoes(self) -> list:
+        medicoes = self._local.medicoes
+        return medicoes if medicoes is not None else list(self._medicoes_globais)
+
+    def medir(self, nome: str, linhas_entrada=None):
+        if not self.modo:
+            return _SEM_MEDICAO
+        return Medicao(self, nome, linhas_entrada)
+
+    def tabela(self) -> pd.DataFrame:
+        """
+        Medições da execução atual, na ordem em que as etapas começaram
+        (etapas internas aparecem indentadas logo abaixo da etapa que as chamou).
+        """
+        medicoes = sorted(self.medicoes(), key=lambda m: m._inicio)
+        return pd.DataFrame(
+            [m.como_dict() for m in medicoes],
+            columns=["etapa", "segundos", "linhas_entrada", "linhas_saida", "memoria_mb", "pico_mb"],
+        )
+
+    def perfis(self) -> dict:
+        return {m.nome: m.perfil for m in self.medicoes() if m.perfil}
+
+
+# Registro compartilhado do processo
+registro = RegistroEtapas(_modo_ambiente())
+
+
+def medir_etapa(nome: str, linhas_entrada=None):
+    """
+    Context manager de uma etapa no registro do processo:
+
+        with medir_etapa("grafico historico") as m:
+            ...
+            m.linhas_saida = len(df)
+    """
+    return registro.medir(nome, linhas_entrada)
+
+
+def instrumentar(nome: str = None, entrada: str = None):
+    """
+    Decorator que mede uma função ou método como etapa.
+
+    - Linhas de saída: contadas no retorno (DataFrame, ou dict/tuple de frames)
+    - Linhas de entrada: primeiro DataFrame dos argumentos, ou, em métodos,
+      o atributo `entrada` de self se já estiver calculado (não dispara cálculo)
+    - Desligado, custa só a checagem do modo
+    """
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not registro.modo:
+                return funcao(*args, **kwargs)
+
+            linhas_entrada = None
+            if entrada is not None and args:
+                linhas_entrada = contar_linhas(getattr(args[0], "__dict__", {}).get(entrada))
+            else:
+                linhas_entrada = next(
+                    (len(a) for a in args if isinstance(a, pd.DataFrame)), None
+                )
+
+            with registro.medir(rotulo, linhas_entrada) as medicao:
+                resultado = funcao(*args, **kwargs)
+                medicao.linhas_saida = contar_linhas(resultado)
+            return resultado
+
+        return envolvida
+
+    return decorador
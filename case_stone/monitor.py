@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+from carga import DIMENSOES, CONTADORES
+from agregacao import RollupRetencao, somar
+from anomalias import NIVEIS_VARREDURA, MIN_SESSOES, LIMIAR_QUEDA_PP, LIMIAR_Z
+from incremental import ler_tabela
+
+
+# Níveis monitorados: os mesmos da varredura de anomalias, sem o grão completo
+# (no grão completo quase todo segmento tem um dia só, não há média a acompanhar)
+NIVEIS_MONITOR = [dims for dims in NIVEIS_VARREDURA if dims != DIMENSOES]
+
+MEIA_VIDA_DIAS = 28      # meia-vida (em dias observados) do peso de cada dia nas estatísticas
+AQUECIMENTO_DIAS = 7     # dias fechados mínimos antes de alertar queda num segmento
+EXTENSOES = (".csv", ".parquet", ".pq", ".xlsx")
+COLUNAS_LOTE = ["session_date"] + DIMENSOES + CONTADORES
+
+log = logging.getLogger("case_stone")
+
+
+class EstatisticaSegmento:
+    """
+    Média e variância da retenção diária de um segmento, atualizadas em O(1).
+
+    - Welford ponderado (West, 1979): cada dia pesa o seu volume de sessões
+    - Esquecimento exponencial: o peso acumulado decai a cada dia fechado, então a
+      média acompanha mudanças de regime sem guardar a série
+    - O dia corrente fica "aberto" (acumulando arquivos do mesmo dia) e só entra
+      nas estatísticas quando chega um dia posterior; dias zerados não entram
+    """
+
+    __slots__ = ("peso", "media", "m2", "dias", "dia_aberto", "total_aberto", "retidas_aberto", "alertados")
+
+    def __init__(self):
+        self.peso = 0.0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.dias = 0
+        self.dia_aberto = None
+        self.total_aberto = 0.0
+        self.retidas_aberto = 0.0
+        self.alertados = set()
+
+    @property
+    def desvio(self) -> float:
+        return float(np.sqrt(self.m2 / self.peso)) if self.peso > 0 else float("nan")
+
+    def _fechar_dia(self, decaimento: float):
+        total, retidas = self.total_aberto, self.retidas_aberto
+        if total <= 0 or retidas == 0:
+            return
+        x = retidas / total
+        self.peso *= decaimento
+        self.m2 *= decaimento
+        self.peso += total
+        delta = x - self.media
+        self.media += delta * total / self.peso
+        self.m2 += total * delta * (x - self.media)
+        self.dias += 1
+
+    def adicionar(self, dia: pd.Timestamp, total: float, retidas: float, decaimento: float) -> bool:
+        """
+        Soma um pedaço do dia `dia`; devolve False para dias já fechados (dados atrasados).
+        """
+        if self.dia_aberto is None or dia > self.dia_aberto:
+            if self.dia_aberto is not None:
+                self._fechar_dia(decaimento)
+            self.dia_aberto = dia
+            self.total_aberto = 0.0
+            self.retidas_aberto = 0.0
+            self.alertados = set()
+        elif dia < self.dia_aberto:
+            return False
+        self.total_aberto += total
+        self.retidas_aberto += retidas
+        return True
+
+
+class SaidaJsonl:
+    """
+    Destino dos alertas: um JSON por linha, com flush a cada alerta.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+
+    def emitir(self, alerta: dict):
+        self._arquivo.write(json.dumps(alerta, ensure_ascii=False, default=str) + "\n")
+        self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class MonitorRetencao:
+    """
+    Monitor contínuo de retenção sobre linhas agregadas diárias (mesmo esquema da base).
+
+    - Cada lote novo é somado só nele mesmo, por nível (dia x segmento): o
+      histórico nunca é reagregado; o estado é uma EstatisticaSegmento por segmento
+    - Alertas (retencao_zero e queda vs a média do próprio segmento) vão para
+      `saida` assim que o lote é processado, uma vez por segmento, dia e tipo
+    - Fontes: lotes diretos (processar), uma fila local (consumir_fila) ou uma
+      pasta observada (observar_diretorio)
+    """
+
+    def __init__(
+        self,
+        saida=None,
+        niveis: list = NIVEIS_MONITOR,
+        meia_vida_dias: float = MEIA_VIDA_DIAS,
+        aquecimento_dias: int = AQUECIMENTO_DIAS,
+        min_sessoes: int = MIN_SESSOES,
+        limiar_queda_pp: float = LIMIAR_QUEDA_PP,
+        limiar_z: float = LIMIAR_Z,
+    ):
+        self.saida = saida
+        self.niveis = [list(dims) for dims in niveis]
+        self.decaimento = 0.5 ** (1 / meia_vida_dias)
+        self.aquecimento_dias = aquecimento_dias
+        self.min_sessoes = min_sessoes
+        self.limiar_queda_pp = limiar_queda_pp
+        self.limiar_z = limiar_z
+        self.estatisticas = {}
+        self.linhas_atrasadas = 0
+        self.arquivos_invalidos = 0
+        # Arquivos da pasta observada: nome -> (nome, mtime, tamanho) da última versão vista
+        self._processados = {}
+        self._falhas = {}
+
+    def _segmento(self, nivel: str, chave: tuple) -> EstatisticaSegmento:
+        est = self.estatisticas.get((nivel, chave))
+        if est is None:
+            est = self.estatisticas[(nivel, chave)] = EstatisticaSegmento()
+        return est
+
+    def _avaliar(self, nivel: str, chave: tuple, est: EstatisticaSegmento, origem: str, chegada: float) -> list:
+        total, retidas = est.total_aberto, est.retidas_aberto
+        if total < self.min_sessoes:
+            return []
+
+        taxa = retidas / total
+        queda_pp = (est.media - taxa) * 100 if est.dias else float("nan")
+        desvio = est.desvio
+        z = (est.media - taxa) / desvio if est.dias and desvio > 0 else float("nan")
+
+        tipos = []
+        if retidas == 0:
+            tipos.append("retencao_zero")
+        elif (
+            est.dias >= self.aquecimento_dias
+            and queda_pp >= self.limiar_queda_pp
+            and z >= self.limiar_z
+        ):
+            tipos.append("queda")
+
+        alertas = []
+        for tipo in tipos:
+            if tipo in est.alertados:
+                continue
+            est.alertados.add(tipo)
+            agora = time.time()
+            alertas.append({
+                "emitido_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+                "session_date": est.dia_aberto.strftime("%Y-%m-%d"),
+                "nivel": nivel,
+                "segmento": " / ".join(chave),
+                "tipo": tipo,
+                "sessoes_total": int(total),
+                "sessoes_retidas": int(retidas),
+                "retencao_pct": round(taxa * 100, 2),
+                "media_pct": round(est.media * 100, 2) if est.dias else None,
+                "desvio_pct": round(desvio * 100, 2) if est.dias else None,
+                "queda_pp": round(queda_pp, 2) if est.dias else None,
+                "z_queda": round(z, 2) if np.isfinite(z) else None,
+                "dias_historico": est.dias,
+                "origem": origem,
+                "atraso_s": round(agora - chegada, 3) if chegada is not None else None,
+            })
+        return alertas
+
+    def processar(self, lote: pd.DataFrame, origem: str = None, chegada: float = None, alertar: bool = True) -> list:
+        """
+        Incorpora um lote de linhas agregadas diárias e devolve os alertas emitidos.
+
+        `chegada` (epoch) é o momento em que o dado ficou disponível, para medir o atraso do alerta.
+        """
+        lote = lote.copy()
+        lote["session_date"] = pd.to_datetime(lote["session_date"]).dt.normalize()
+        alertas = []
+        for dims in self.niveis:
+            nome = " x ".join(dims)
+            g = somar(lote, ["session_date"] + dims)
+            colunas = [g["session_date"]] + [g[d].astype(str) for d in dims] + [g["sessoes_total"], g["sessoes_retidas"]]
+            tocados = {}
+            for dia, *valores, total, retidas in zip(*colunas):
+                chave = tuple(valores)
+                est = self._segmento(nome, chave)
+                if est.adicionar(dia, float(total), float(retidas), self.decaimento):
+                    tocados[chave] = est
+                else:
+                    self.linhas_atrasadas += 1
+            if alertar:
+                for chave, est in tocados.items():
+                    alertas.extend(self._avaliar(nome, chave, est, origem, chegada))
+
+        if self.saida is not None:
+            for alerta in alertas:
+                self.saida.emitir(alerta)
+        return alertas
+
+    def aquecer(self, rollup: RollupRetencao):
+        """
+        Carrega o histórico nas estatísticas sem emitir alertas (uma única vez, na partida):
+        cada nível é lido do rollup e percorrido em ordem de data.
+        """
+        for dims in self.niveis:
+            nome = " x ".join(dims)
+            g = rollup.nivel(["session_date"] + dims).sort_values("session_date", kind="stable")
+            colunas = [g["session_date"]] + [g[d].astype(str) for d in dims] + [g["sessoes_total"], g["sessoes_retidas"]]
+            for dia, *valores, total, retidas in zip(*colunas):
+                self._segmento(nome, tuple(valores)).adicionar(dia, float(total), float(retidas), self.decaimento)
+
+    def consumir_fila(self, fila: queue.Queue, parar: threading.Event = None):
+        """
+        Consome lotes de uma fila local (DataFrame ou (DataFrame, origem));
+        None na fila encerra o consumo.
+        """
+        while parar is None or not parar.is_set():
+            try:
+                item = fila.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            lote, origem = item if isinstance(item, tuple) else (item, "fila")
+            self.processar(lote, origem=origem, chegada=time.time())
+
+    def _arquivos_novos(self, diretorio: str) -> list:
+        novos = []
+        for entrada in os.scandir(diretorio):
+            nome = entrada.name
+            # Arquivos ocultos ou temporários ainda estão sendo escritos (gravar e renomear)
+            if not entrada.is_file() or nome.startswith(".") or not nome.lower().endswith(EXTENSOES):
+                continue
+            stat = entrada.stat()
+            marca = (nome, stat.st_mtime_ns, stat.st_size)
+            if nome in self._processados:
+                # Lotes são somados uma única vez: um arquivo regravado não entra de novo
+                if self._processados[nome] != marca:
+                    log.warning("%s foi regravado depois de processado; nova versão ignorada", nome)
+                    self._processados[nome] = marca
+                continue
+            if self._falhas.get(nome) != marca:
+                novos.append((stat.st_mtime, nome, marca))
+        return sorted(novos)
+
+    def _ler_lote(self, caminho: str) -> pd.DataFrame:
+        lote = ler_tabela(caminho)
+        faltando = [c for c in COLUNAS_LOTE if c not in lote.columns]
+        if faltando:
+            raise ValueError(f"colunas ausentes: {', '.join(faltando)}")
+        return lote
+
+    def observar_diretorio(self, diretorio: str, intervalo: float = 1.0, parar: threading.Event = None, ciclos: int = None):
+        """
+        Observa `diretorio` por polling a cada `intervalo` segundos e processa
+        cada arquivo novo uma vez, em ordem de chegada.
+
+        - Os arquivos são lotes só de acréscimo: um arquivo já processado e
+          regravado (mesmo nome) é ignorado, para não somar o lote duas vezes
+        - Um arquivo ilegível ou truncado é registrado no log e pulado; ele só
+          é tentado de novo se for regravado
+        """
+        ciclo = 0
+        while parar is None or not parar.is_set():
+            for mtime, nome, marca in self._arquivos_novos(diretorio):
+                try:
+                    lote = self._ler_lote(os.path.join(diretorio, nome))
+                except Exception as erro:
+                    log.warning("Arquivo %s ignorado: %s", nome, erro)
+                    self.arquivos_invalidos += 1
+                    self._falhas[nome] = marca
+                    continue
+                self.processar(lote, origem=nome, chegada=mtime)
+                self._falhas.pop(nome, None)
+                self._processados[nome] = marca
+            ciclo += 1
+            if ciclos is not None and ciclo >= ciclos:
+                break
+            if parar is not None:
+                parar.wait(intervalo)
+            else:
+                time.sleep(intervalo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor contínuo de retenção com alertas em JSONL.")
+    parser.add_argument("diretorio", help="Pasta observada: cada arquivo novo (.csv, .parquet, .xlsx) é um lote diário agregado")
+    parser.add_argument("--alertas", default="alertas.jsonl", help="Arquivo JSONL de saída dos alertas")
+    parser.add_argument("--historico", help="Base agregada para aquecer as estatísticas na partida")
+    parser.add_argument("--intervalo", type=float, default=1.0, help="Segundos entre varreduras da pasta")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    saida = SaidaJsonl(args.alertas)
+    monitor = MonitorRetencao(saida)
+    if args.historico:
+        from carga import carregar_base, normalizar_esquema
+
+        monitor.aquecer(RollupRetencao(normalizar_esquema(carregar_base(args.historico))))
+        print(f"Estatísticas aquecidas: {len(monitor.estatisticas)} segmentos")
+
+    print(f"Observando {args.diretorio} (Ctrl+C para sair); alertas em {args.alertas}")
+    try:
+        monitor.observar_diretorio(args.diretorio, args.intervalo)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        saida.fechar()
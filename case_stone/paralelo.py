@@ -0,0 +1,256 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from carga import CONTADORES
+from agregacao import GRAO_FINO, RollupRetencao, codigos_coluna, somar_codigos
+from incremental import NIVEIS_PERSISTIDOS
+
+
+# Agregação particionada em vários processos: os contadores são aditivos, então
+# cada processo soma uma faixa de linhas da base e as parciais se juntam depois.
+# As colunas (já como códigos inteiros) vão uma única vez para memória
+# compartilhada; os processos só recebem nomes de blocos e faixas de linhas.
+
+# Níveis somados junto com o grão fino, na mesma passada: série diária, mensal,
+# deep dive por fonte, mix e data x bot x dimensão (varredura de anomalias)
+NIVEIS_PARALELOS = NIVEIS_PERSISTIDOS
+
+# Chaves de partição aceitas: faixas de dias (em ordem de data) ou bot x faixas de dias
+PARTICOES = ("mes", "chatbot")
+
+# Tarefas por processo: fatias menores equilibram processos com partições desiguais
+TAREFAS_POR_PROCESSO = 4
+
+# Chaves de tempo, servidas pelos códigos de data e de mês
+CHAVES_MES = ("session_month", "mes_key")
+
+
+class ColunasCompartilhadas:
+    """
+    Arrays numpy copiados para blocos de shared_memory, um por coluna.
+
+    - adicionar() copia uma coluna (uma de cada vez, para não duplicar a base toda)
+    - descritor() é o que vai para os processos: {coluna: (bloco, dtype, linhas)}
+    - anexar() abre os blocos num processo e devolve views, sem cópia
+    - fechar() libera os blocos (só no processo que os criou)
+    """
+
+    def __init__(self):
+        self._blocos = {}
+        self._descritor = {}
+
+    def adicionar(self, nome: str, valores: np.ndarray):
+        # Copia `valores` para um bloco novo; o chamador pode descartar o original em seguida
+        valores = np.ascontiguousarray(valores)
+        bloco = shared_memory.SharedMemory(create=True, size=max(valores.nbytes, 1))
+        self._blocos[nome] = bloco
+        np.ndarray(valores.shape, dtype=valores.dtype, buffer=bloco.buf)[:] = valores
+        self._descritor[nome] = (bloco.name, valores.dtype.str, len(valores))
+
+    def descritor(self) -> dict:
+        return dict(self._descritor)
+
+    @staticmethod
+    def anexar(descritor: dict) -> tuple:
+        """
+        ({coluna: array}, blocos abertos) a partir do descritor; os blocos
+        devem ser fechados (close) depois do uso, sem unlink.
+        """
+        blocos, arrays = [], {}
+        for nome, (bloco_nome, dtype, linhas) in descritor.items():
+            bloco = shared_memory.SharedMemory(name=bloco_nome)
+            blocos.append(bloco)
+            arrays[nome] = np.ndarray((linhas,), dtype=np.dtype(dtype), buffer=bloco.buf)
+        return arrays, blocos
+
+    def fechar(self):
+        for bloco in self._blocos.values():
+            bloco.close()
+            bloco.unlink()
+        self._blocos = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def _colunas_nivel(chaves: list) -> list:
+    # Colunas de códigos de um nível: session_date -> "data", mês -> "mes", dimensões pelo nome
+    colunas = []
+    for chave in chaves:
+        coluna = "data" if chave == "session_date" else "mes" if chave in CHAVES_MES else chave
+        if coluna not in colunas:
+            colunas.append(coluna)
+    return colunas
+
+
+def _compactar(valores: np.ndarray) -> np.ndarray:
+    # Menor inteiro sem sinal que comporta os valores (menos bytes na memória compartilhada e no retorno)
+    return valores.astype(np.min_scalar_type(max(int(valores.max(initial=0)), 1)))
+
+
+def _somar_faixa(descritor: dict, inicio: int, fim: int, niveis: list, cardinalidades: dict) -> list:
+    """
+    Tarefa de um processo: soma os contadores das linhas [inicio, fim) em cada
+    nível. Retorna [(códigos por coluna, somas)] na ordem de `niveis`.
+    """
+    arrays, blocos = ColunasCompartilhadas.anexar(descritor)
+    try:
+        contadores = np.column_stack([arrays[c][inicio:fim] for c in CONTADORES])
+        resultado = []
+        for colunas in niveis:
+            codigos, somas = somar_codigos(
+                [arrays[c][inicio:fim] for c in colunas],
+                [cardinalidades[c] for c in colunas],
+                contadores,
+            )
+            resultado.append(([_compactar(c) for c in codigos], _compactar(somas.astype("uint64"))))
+        del arrays, contadores
+        return resultado
+    finally:
+        for bloco in blocos:
+            bloco.close()
+
+
+def _faixas(chave_particao: np.ndarray, tarefas: int) -> list:
+    """
+    Faixas [inicio, fim) de linhas (já ordenadas pela chave de partição) com
+    tamanhos parecidos, cortadas só entre valores diferentes da chave: cada
+    valor da chave fica inteiro numa única faixa.
+    """
+    n = len(chave_particao)
+    if n == 0:
+        return []
+    cortes = np.flatnonzero(np.diff(chave_particao)) + 1
+    alvos = np.linspace(0, n, tarefas + 1)[1:-1]
+    escolhidos = np.unique(cortes[np.clip(np.searchsorted(cortes, alvos), 0, max(len(cortes) - 1, 0))]) if len(cortes) else []
+    limites = [0] + [int(c) for c in escolhidos] + [n]
+    return [(a, b) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+
+
+def _juntar(partes: list, cardinalidades: list, ordenadas: bool) -> tuple:
+    """
+    Junta as parciais de um nível. Com `ordenadas`, as faixas não compartilham
+    grupos e já vêm em ordem: basta concatenar. Senão, soma de novo os grupos
+    repetidos entre faixas (a soma é associativa).
+    """
+    colunas = [np.concatenate([p[0][i] for p in partes]) for i in range(len(cardinalidades))]
+    somas = np.concatenate([p[1] for p in partes])
+    if ordenadas:
+        return colunas, somas
+    colunas, somas = somar_codigos(colunas, cardinalidades, somas)
+    return colunas, _compactar(somas.astype("uint64"))
+
+
+def rollup_paralelo(
+    df: pd.DataFrame,
+    processos: int = None,
+    particao: str = "mes",
+    niveis: list = NIVEIS_PARALELOS,
+    grao: list = GRAO_FINO,
+) -> RollupRetencao:
+    """
+    RollupRetencao de `df` com o grão fino e os `niveis` somados em `processos`
+    processos (padrão: todos os núcleos).
+
+    - As linhas são ordenadas pela partição ("mes": data; "chatbot": bot e
+      data) e cortadas em faixas que não dividem um dia (de um bot)
+    - Códigos das colunas e contadores vão uma vez para memória compartilhada;
+      cada processo soma as suas faixas em todos os níveis
+    - Níveis que contêm a chave de partição inteira só concatenam as parciais;
+      os demais somam de novo as parciais, que já são pequenas
+    - O resultado tem os mesmos níveis, categorias e ordem de linhas do
+      RollupRetencao sequencial
+    """
+    if particao not in PARTICOES:
+        raise ValueError(f"Partição desconhecida: {particao} (aceitas: {', '.join(PARTICOES)})")
+    processos = processos or os.cpu_count() or 1
+    dims = [c for c in grao if c != "session_date"]
+
+    # Códigos inteiros: data, mês (da data) e cada dimensão
+    codigos, valores = {}, {}
+    for coluna, serie in [("data", df["session_date"])] + [(dim, df[dim]) for dim in dims]:
+        cod, valores[coluna] = codigos_coluna(serie)
+        codigos[coluna] = cod.astype(np.int16 if len(valores[coluna]) < 2 ** 15 else np.int32)
+    datas = pd.DatetimeIndex(valores["data"])
+    meses, mes_da_data = np.unique((datas.year * 100 + datas.month).to_numpy(dtype="int64"), return_inverse=True)
+    cardinalidades = {c: len(v) for c, v in valores.items()}
+    cardinalidades["mes"] = len(meses)
+
+    # Ordem das linhas pela partição; as faixas são contíguas nessa ordem.
+    # Linhas com chave nula ficam de fora, como no groupby de somar()
+    if particao == "mes":
+        chave_particao = codigos["data"]
+    else:
+        chave_particao = codigos["chatbot"].astype("int64") * cardinalidades["data"] + codigos["data"]
+    ordem = np.argsort(chave_particao, kind="stable")
+    validas = np.logical_and.reduce([codigos[c] >= 0 for c in codigos])
+    if not validas.all():
+        ordem = ordem[validas[ordem]]
+    faixas = _faixas(chave_particao[ordem], processos * TAREFAS_POR_PROCESSO)
+
+    todos = [grao] + [list(chaves) for chaves in niveis]
+    colunas_niveis = [_colunas_nivel(chaves) for chaves in todos]
+
+    with ColunasCompartilhadas() as compartilhadas:
+        # Colunas já na ordem da partição, copiadas uma a uma
+        compartilhadas.adicionar("mes", _compactar(mes_da_data[codigos["data"][ordem]]))
+        for c in list(codigos):
+            compartilhadas.adicionar(c, _compactar(codigos.pop(c)[ordem]))
+        for c in CONTADORES:
+            compartilhadas.adicionar(c, df[c].to_numpy()[ordem])
+        del ordem, chave_particao
+
+        descritor = compartilhadas.descritor()
+        if processos <= 1 or len(faixas) <= 1:
+            parciais = [_somar_faixa(descritor, a, b, colunas_niveis, cardinalidades) for a, b in faixas]
+        else:
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                futuros = [
+                    pool.submit(_somar_faixa, descritor, a, b, colunas_niveis, cardinalidades)
+                    for a, b in faixas
+                ]
+                parciais = [f.result() for f in futuros]
+
+    resultado = {}
+    for i, (chaves, cols) in enumerate(zip(todos, colunas_niveis)):
+        partes = [p[i] for p in parciais]
+        for p in parciais:
+            p[i] = None
+        # Com partição por data, cada dia está numa só faixa e as faixas vêm em
+        # ordem: níveis que começam pela data já saem somados e ordenados
+        ordenadas = particao == "mes" and cols[0] == "data"
+        if partes:
+            grupos, somas = _juntar(partes, [cardinalidades[c] for c in cols], ordenadas)
+        else:
+            grupos, somas = [np.array([], dtype="int64") for _ in cols], np.zeros((0, len(CONTADORES)))
+
+        nivel = {}
+        for chave in chaves:
+            coluna = _colunas_nivel([chave])[0]
+            cod = grupos[cols.index(coluna)]
+            if chave == "session_date":
+                nivel[chave] = valores["data"][cod]
+            elif chave == "session_month":
+                nivel[chave] = pd.PeriodIndex.from_fields(year=meses[cod] // 100, month=meses[cod] % 100, freq="M")
+            elif chave == "mes_key":
+                nivel[chave] = meses[cod].astype("int32")
+            elif isinstance(df[chave].dtype, pd.CategoricalDtype):
+                nivel[chave] = pd.Categorical.from_codes(cod, dtype=df[chave].dtype)
+            else:
+                nivel[chave] = valores[chave][cod]
+        for j, contador in enumerate(CONTADORES):
+            # Grão fino no tipo dos contadores da entrada (como o groupby); níveis derivados em uint64
+            tipo = np.promote_types(somas.dtype, df[contador].dtype) if chaves is grao else "uint64"
+            nivel[contador] = somas[:, j].astype(tipo)
+        resultado[tuple(chaves)] = pd.DataFrame(nivel)
+        del partes, grupos, somas, nivel
+
+    base = resultado.pop(tuple(grao))
+    return RollupRetencao.de_niveis(base, resultado, grao=grao)
@@ -0,0 +1,351 @@
+import numpy as np
+import pandas as pd
+
+
+# Métodos de projeção, na ordem em que entram no ensemble
+METODOS = ["regime_adaptativo", "media_movel_ponderada", "conservador"]
+
+# Pesos da média móvel ponderada (do mais antigo para o mais recente)
+PESOS_MEDIA_MOVEL = np.array([0.2, 0.3, 0.5])
+
+
+def alinhar_direita(Y: np.ndarray) -> np.ndarray:
+    """
+    Compacta cada linha removendo os NaN e encosta os valores à direita.
+
+    Assim a última coluna é sempre o último mês observado de cada série, e
+    séries com históricos de tamanhos diferentes convivem na mesma matriz
+    (equivale a olhar só os meses em que o segmento tem dados, como no filtro por bot).
+    """
+    ordem = np.argsort(~np.isnan(Y), axis=1, kind="stable")
+    return np.take_along_axis(Y, ordem, axis=1)
+
+
+def matriz_series(df: pd.DataFrame, chaves: list, valor: str = "retencao_pct", mes: str = "session_month"):
+    """
+    Pivota um histórico mensal longo (chaves x mês) numa matriz séries x meses.
+
+    Retorna (indice, meses, Y):
+    - indice: DataFrame com as chaves de cada série (uma linha por série, ordenado)
+    - meses: PeriodIndex mensal das colunas
+    - Y: matriz float64 alinhada à direita (ver alinhar_direita)
+    """
+    dados = df[list(chaves) + [valor]].copy()
+    dados["_mes"] = pd.PeriodIndex(df[mes].astype(str), freq="M")
+
+    largo = dados.pivot_table(
+        index=list(chaves), columns="_mes", values=valor, aggfunc="first", observed=True, dropna=False,
+    ).sort_index(axis=1)
+    largo = largo.dropna(how="all")
+
+    indice = largo.index.to_frame(index=False)
+    Y = alinhar_direita(largo.to_numpy(dtype="float64"))
+    return indice, largo.columns, Y
+
+
+def _desvio(Y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # Desvio padrão amostral (ddof=1) por linha, só nas posições de mask; NaN com menos de 2 valores
+    n = mask.sum(axis=1)
+    media = np.where(mask, Y, 0).sum(axis=1) / np.where(n > 0, n, np.nan)
+    dev = np.where(mask, Y - media[:, None], 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n >= 2, np.sqrt((dev ** 2).sum(axis=1) / (n - 1)), np.nan)
+
+
+def projetar_regime_adaptativo(Y: np.ndarray, base: np.ndarray, horizonte: int, threshold: float = 2.0) -> np.ndarray:
+    """
+    Versão matricial de projetar_com_regime_adaptativo, a antiga versão por
+    bot de script.py (removida; ver o histórico do git).
+
+    - Mudança de regime: |Δ - média(Δ)| > threshold * desvio(Δ); o regime atual
+      começa na última mudança (sem mudança: últimos 3 meses)
+    - Tendência: inclinação de mínimos quadrados no regime atual, com decaimento 0.8^i
+    - Limites: [mín histórico - volatilidade, máx histórico + volatilidade] ∩ [0, 100]
+    """
+    n, T = Y.shape
+    posicoes = np.arange(T)
+    valido = ~np.isnan(Y)
+    tamanho = valido.sum(axis=1)
+
+    # Mudanças de regime nas variações mês a mês
+    deltas = np.full_like(Y, np.nan)
+    deltas[:, 1:] = np.diff(Y, axis=1)
+    mask_delta = ~np.isnan(deltas)
+    n_delta = mask_delta.sum(axis=1)
+    media_delta = np.where(mask_delta, deltas, 0).sum(axis=1) / np.where(n_delta > 0, n_delta, np.nan)
+    std_delta = _desvio(deltas, mask_delta)
+    with np.errstate(invalid="ignore"):
+        mudancas = np.abs(deltas - media_delta[:, None]) > (threshold * std_delta[:, None])
+
+    # Início do regime atual: última mudança ou, sem mudança, os últimos 3 meses
+    tem_mudanca = mudancas.any(axis=1)
+    ultima_mudanca = T - 1 - np.argmax(mudancas[:, ::-1], axis=1)
+    inicio_cauda = np.maximum(T - 3, T - tamanho)
+    inicio = np.where(tem_mudanca, ultima_mudanca, inicio_cauda)
+
+    regime = valido & (posicoes[None, :] >= inicio[:, None])
+    n_regime = regime.sum(axis=1)
+
+    # Inclinação da regressão linear no regime (x = 0, 1, 2, ...)
+    x = np.where(regime, posicoes[None, :] - inicio[:, None], 0).astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_medio = x.sum(axis=1) / n_regime
+        y_medio = np.where(regime, Y, 0).sum(axis=1) / n_regime
+        dx = np.where(regime, x - x_medio[:, None], 0)
+        dy = np.where(regime, Y - y_medio[:, None], 0)
+        slope = np.where(n_regime >= 2, (dx * dy).sum(axis=1) / (dx ** 2).sum(axis=1), 0)
+
+    # Limites pelo histórico, alargados pela volatilidade do regime atual
+    volatilidade = _desvio(Y, regime)
+    with np.errstate(invalid="ignore"):
+        min_hist = np.nanmin(np.where(valido, Y, np.inf), axis=1) - volatilidade
+        max_hist = np.nanmax(np.where(valido, Y, -np.inf), axis=1) + volatilidade
+        limite_inf = np.where(min_hist > 0, min_hist, 0)
+        limite_sup = np.where(max_hist < 100, max_hist, 100)
+
+    i = np.arange(1, horizonte + 1)
+    decay = 0.8 ** i
+    valor = base[:, None] + (slope[:, None] * i[None, :] * decay[None, :])
+    valor = np.clip(valor, limite_inf[:, None], limite_sup[:, None])
+    return np.round(valor, 2)
+
+
+def projetar_media_movel_ponderada(Y: np.ndarray, base: np.ndarray, horizonte: int) -> np.ndarray:
+    """
+    Versão matricial de projetar_com_media_movel_ponderada, a antiga versão
+    por bot de script.py (removida; ver o histórico do git): média ponderada
+    (0.2, 0.3, 0.5) dos 3 últimos meses, peso decrescente da base
+    (0.7 * 0.9^i) e tendência suave.
+    """
+    janela = len(PESOS_MEDIA_MOVEL)
+    ultimos = Y[:, -janela:]
+    valido = ~np.isnan(ultimos)
+    k = valido.sum(axis=1)
+
+    pesos = np.where(valido, PESOS_MEDIA_MOVEL[-ultimos.shape[1]:][None, :], 0)
+    pesos = pesos / pesos.sum(axis=1, keepdims=True)
+    media_ponderada = np.where(valido, ultimos * pesos, 0).sum(axis=1) / pesos.sum(axis=1)
+
+    primeiro = ultimos[np.arange(len(Y)), ultimos.shape[1] - k]
+    ultimo = ultimos[:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tendencia = np.where(k >= 2, (ultimo - primeiro) / k, 0)
+
+    i = np.arange(1, horizonte + 1)
+    peso_base = 0.7 * (0.9 ** i)
+    valor = (
+        (base[:, None] * peso_base[None, :] + media_ponderada[:, None] * (1 - peso_base[None, :]))
+        + (tendencia[:, None] * i[None, :] * 0.3)
+    )
+    return np.round(np.clip(valor, 0, 100), 2)
+
+
+def projetar_conservador(Y: np.ndarray, base: np.ndarray, horizonte: int, janela: int = 6) -> np.ndarray:
+    """
+    Versão matricial de projetar_conservador, a antiga versão por bot de
+    script.py (removida; ver o histórico do git): convergência da base para
+    a média dos últimos `janela` meses, com peso 0.9^i.
+    """
+    ultimos = Y[:, -janela:]
+    valido = ~np.isnan(ultimos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_recente = np.where(valido, ultimos, 0).sum(axis=1) / valido.sum(axis=1)
+
+    i = np.arange(1, horizonte + 1)
+    peso_base = 0.9 ** i
+    valor = base[:, None] * peso_base[None, :] + media_recente[:, None] * (1 - peso_base[None, :])
+    return np.round(valor, 2)
+
+
+def projetar_matriz(Y: np.ndarray, base: np.ndarray, horizonte: int = 4) -> dict:
+    """
+    Projeta todas as séries de Y (séries x meses, alinhada à direita) por
+    todos os métodos e pelo ensemble (média dos 3), para `horizonte` meses.
+
+    Retorna {metodo: matriz séries x horizonte}, incluindo "ensemble".
+    """
+    base = np.asarray(base, dtype="float64")
+    projecoes = {
+        "regime_adaptativo": projetar_regime_adaptativo(Y, base, horizonte),
+        "media_movel_ponderada": projetar_media_movel_ponderada(Y, base, horizonte),
+        "conservador": projetar_conservador(Y, base, horizonte),
+    }
+    soma = projecoes[METODOS[0]] + projecoes[METODOS[1]] + projecoes[METODOS[2]]
+    projecoes["ensemble"] = np.round(soma / 3, 2)
+    return projecoes
+
+
+def projetar_series(
+    df_historico: pd.DataFrame,
+    df_base: pd.DataFrame,
+    chaves: tuple = ("chatbot",),
+    horizonte: int = 4,
+    coluna_base: str = "retencao_proj_final_agosto",
+    valor: str = "retencao_pct",
+    mes: str = "session_month",
+):
+    """
+    Projeções futuras para qualquer nível de segmento (bot, bot x fonte, bot x fonte x tópico, ...).
+
+    - df_historico: série mensal longa com `chaves`, `mes` e `valor`
+      (ex.: df_monthly_macro)
+    - df_base: valor de partida de cada série em `coluna_base`
+      (ex.: df_projecoes com a projeção de fechamento do mês corrente)
+    - Os meses projetados começam no mês seguinte ao último mês do histórico
+
+    Retorna (df_metodos, df_ensemble) no formato longo:
+    chaves + session_month ('AAAA-MM') + retencao_pct_proj (+ metodo em df_metodos).
+    """
+    chaves = list(chaves)
+    indice, meses, Y = matriz_series(df_historico, chaves, valor, mes)
+
+    # Valor de partida alinhado às séries do histórico (séries sem base ficam de fora)
+    base = indice.merge(df_base[chaves + [coluna_base]], on=chaves, how="left")[coluna_base].to_numpy(dtype="float64")
+    com_base = ~np.isnan(base)
+    indice, Y, base = indice[com_base].reset_index(drop=True), Y[com_base], base[com_base]
+
+    projecoes = projetar_matriz(Y, base, horizonte)
+    meses_futuros = pd.period_range(meses[-1] + 1, periods=horizonte, freq="M").astype(str)
+
+    def formato_longo(matriz: np.ndarray) -> pd.DataFrame:
+        longo = indice.loc[indice.index.repeat(horizonte)].reset_index(drop=True)
+        longo[mes] = np.tile(np.asarray(meses_futuros), len(indice))
+        longo["retencao_pct_proj"] = matriz.ravel()
+        return longo
+
+    df_metodos = pd.concat(
+        [formato_longo(projecoes[m]).assign(metodo=m) for m in METODOS],
+        ignore_index=True,
+    )
+    df_ensemble = formato_longo(projecoes["ensemble"])
+    return df_metodos, df_ensemble
+
+
+# Eixo de dias das somas acumuladas por dia do mês (o maior mês)
+DIAS_MES_MAX = 31
+
+# Primeiro mês do histórico do fator de fechamento (regime pós-maio; usado no pipeline e no backtest)
+MES_INICIO = "2025-05"
+
+
+def projetar_fechamento(
+    df_diario: pd.DataFrame,
+    chaves: tuple = ("chatbot",),
+    dia_corte: int = None,
+    dias_mes: int = None,
+    mes_inicio=None,
+    valor: str = "retencao_pct",
+) -> pd.DataFrame:
+    """
+    Projeção de fechamento do mês corrente para qualquer nível de segmento
+    (bot, bot x fonte, bot x tópico, ...), todos os segmentos de uma vez.
+
+    - df_diario: série diária longa com session_date, `chaves` e `valor`
+      (ex.: df_daily, ou rollup.agregar(["session_date", "chatbot", "fonte"]))
+    - Mês corrente: o último mês da série; os anteriores (desde `mes_inicio`) formam o histórico
+    - dia_corte: dias 1..dia_corte são os observados (padrão: último dia com dados
+      no mês corrente); dias_mes: tamanho do mês projetado (padrão: o do calendário)
+    - As médias antes/depois do corte saem de somas acumuladas por dia do mês
+      (segmentos x meses x 31 dias): mudar o corte é só mudar o índice lido
+
+    Uma linha por segmento (ordenada pelas chaves):
+    - media_ate_corte: média dos percentuais diários dos dias 1..dia_corte do mês corrente
+    - fator_historico: média, nos meses do histórico, de média após o corte / média até o corte
+      (só meses com as duas partes e média até o corte > 0)
+    - proj_apos_corte: media_ate_corte x fator_historico
+    - retencao_proj_fechamento: média das duas partes ponderada pelos dias, em dias_mes dias
+    - meses_fator: meses do histórico que entraram no fator
+    """
+    chaves = list(chaves)
+    datas = pd.to_datetime(df_diario["session_date"])
+    meses_obs = datas.dt.to_period("M")
+    if mes_inicio is not None:
+        recentes = (meses_obs >= pd.Period(mes_inicio, freq="M")).to_numpy()
+        df_diario, datas, meses_obs = df_diario[recentes], datas[recentes], meses_obs[recentes]
+    if df_diario.empty:
+        raise ValueError("Nenhum mês encontrado na base.")
+
+    # Códigos de segmento (ordem das chaves), mês (a partir do primeiro) e dia
+    grupos = df_diario.groupby(chaves, observed=True, sort=True)
+    codigos = grupos.ngroup().to_numpy()
+    indice = grupos.size().index.to_frame(index=False)
+    primeiro, mes_atual = meses_obs.min(), meses_obs.max()
+    idx_mes = ((meses_obs.dt.year - primeiro.year) * 12 + (meses_obs.dt.month - primeiro.month)).to_numpy()
+    idx_dia = datas.dt.day.to_numpy() - 1
+    n_meses = idx_mes.max() + 1
+
+    dias_mes = mes_atual.days_in_month if dias_mes is None else int(dias_mes)
+    if dia_corte is None:
+        dia_corte = int(idx_dia[idx_mes == n_meses - 1].max()) + 1
+    dia_corte = int(dia_corte)
+    if not 1 <= dia_corte <= dias_mes <= DIAS_MES_MAX:
+        raise ValueError(
+            f"Corte inválido: dia_corte={dia_corte}, dias_mes={dias_mes} "
+            f"(esperado 1 <= dia_corte <= dias_mes <= {DIAS_MES_MAX})"
+        )
+
+    # Soma e contagem dos percentuais diários em segmentos x meses x dias, acumuladas nos dias
+    pct = df_diario[valor].to_numpy(dtype="float64", na_value=np.nan)
+    presentes = ~np.isnan(pct) & (codigos >= 0)
+    posicao = ((codigos * n_meses + idx_mes) * DIAS_MES_MAX + idx_dia)[presentes]
+    forma = (len(indice), n_meses, DIAS_MES_MAX)
+    tamanho = int(np.prod(forma))
+    acum_pct = np.bincount(posicao, weights=pct[presentes], minlength=tamanho).reshape(forma).cumsum(axis=2)
+    acum_dias = np.bincount(posicao, minlength=tamanho).reshape(forma).cumsum(axis=2)
+
+    fechamento = fechamento_no_corte(acum_pct, acum_dias, n_meses - 1, dia_corte, dias_mes)
+
+    resultado = indice.copy()
+    for coluna, valores in fechamento.items():
+        resultado[coluna] = valores
+    return resultado
+
+
+def fechamento_no_corte(
+    acum_pct: np.ndarray,
+    acum_dias: np.ndarray,
+    mes: int,
+    dia_corte: int,
+    dias_mes: int,
+    inicio: int = 0,
+) -> dict:
+    """
+    Núcleo da projeção de fechamento sobre somas acumuladas por dia do mês.
+
+    - acum_pct / acum_dias: soma e contagem dos percentuais diários,
+      segmentos x meses x 31 dias, acumuladas no eixo dos dias
+    - mes: índice do mês corrente (observado até dia_corte); os meses
+      [inicio, mes) formam o histórico do fator
+
+    Retorna {coluna: array por segmento} com media_ate_corte, fator_historico,
+    proj_apos_corte, retencao_proj_fechamento e meses_fator (ver projetar_fechamento).
+    """
+    c = dia_corte - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dias_ate = acum_dias[:, inicio:mes + 1, c]
+        dias_apos = acum_dias[:, inicio:mes + 1, -1] - dias_ate
+        media_ate = np.where(dias_ate > 0, acum_pct[:, inicio:mes + 1, c] / dias_ate, np.nan)
+        media_apos = np.where(
+            dias_apos > 0, (acum_pct[:, inicio:mes + 1, -1] - acum_pct[:, inicio:mes + 1, c]) / dias_apos, np.nan,
+        )
+
+        # Razão após/até o corte em cada mês do histórico (todos menos o corrente)
+        razao = np.where(media_ate[:, :-1] > 0, media_apos[:, :-1] / media_ate[:, :-1], np.nan)
+        meses_fator = (~np.isnan(razao)).sum(axis=1)
+        fator = np.where(meses_fator > 0, np.nansum(razao, axis=1) / np.maximum(meses_fator, 1), np.nan)
+
+    media_atual = media_ate[:, -1]
+    proj_apos = media_atual * fator
+    if dia_corte < dias_mes:
+        fechamento = (dia_corte * media_atual + (dias_mes - dia_corte) * proj_apos) / dias_mes
+    else:
+        # Mês já fechado no corte: não há dias a projetar
+        fechamento = media_atual
+
+    return {
+        "media_ate_corte": media_atual,
+        "fator_historico": fator,
+        "proj_apos_corte": proj_apos,
+        "retencao_proj_fechamento": fechamento,
+        "meses_fator": meses_fator,
+    }
@@ -1,211 +1,61 @@
 import os
-import pandas as pd 
-import numpy as np 
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.lines import Line2D
-from scipy import stats
+from functools import cached_property
 
+import pandas as pd
+import numpy as np
 
-pd.set_option('display.max_columns', None)
+from carga import carregar_base, normalizar_esquema, chave_mes, CONTADORES
+from agregacao import RollupRetencao, somar, adicionar_taxas
+from projecao import projetar_series, projetar_fechamento, MES_INICIO
+from anomalias import varrer_anomalias, episodios_anomalos
+from indice import IndiceSegmentos
+from cubo import CuboRetencao, RecorteCubo, DIMENSOES_FILTRO
+from instrumentacao import instrumentar, registro
+
+# Bibliotecas de gráfico e estatística (matplotlib, seaborn) são importadas
+# dentro das funções que as usam: importar este módulo não roda análise nem plota nada.
+# Os resultados ficam em PipelineRetencao e são calculados sob demanda.
+
+# Versão da lógica da análise: incrementar ao mudar cálculos, para invalidar resultados em cache
+VERSAO_PIPELINE = 2
 
-#%% Carregando e explorando dados
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Monta o caminho completo do Excel relativo a esse script
 file_path = os.path.join(BASE_DIR, "Case_Data_Analyst_Pl.xlsx")
-df = pd.read_excel(file_path)
-
-### Conhecendo a base 
-df.head()
-df.columns
-df.info()
-df.describe()
-df.session_date.unique()
-df.topico_da_sessao.nunique()
-df.assunto_da_sessao.nunique()
-
-### Verificando valores nulos
-df.isnull().sum()
-
-### Criação do indicador de retenção
-df['retencao_percent'] = ((df['sessoes_retidas']/ df['sessoes_total'])* 100).round(2)
-
-### Criação da coluna mês para análise temporal
-df['session_month'] = pd.to_datetime(df['session_date']).dt.to_period('M')
 
 ## fazer analise em loop para cada marca -> canal -> depois agrupar por tecnologias (dentro do canal, comparar as tecnologias)
 #Resumo da retenção por marca, por canal para cada tecnologia
-#Mensurar volume de sessões 
+#Mensurar volume de sessões
 #Identificar blocos que chamam atenção para detalhar mais em topico da sessao e assunto da sessao
 #Identificar padrões de comportamento ao longo dos meses e mudanças que ocorreram
 
-### Olhar histórico geral de retenção por marca para referência]
-
-#%% Visão Geral Mensal de Retenção vs Pedido de Atendimento por Chatbot para entender perfil histórico
-
-df_monthly_macro = df.groupby(['session_month', 'chatbot']).agg(
-    sessoes_total=('sessoes_total', 'sum'),
-    sessoes_retidas=('sessoes_retidas', 'sum'),
-    sessoes_com_pedido_de_atendimento = ('sessoes_com_pedido_de_atendimento', 'sum')
-
-).reset_index()
-
-df_monthly_macro['retencao_pct'] = (
-    df_monthly_macro['sessoes_retidas'] / df_monthly_macro['sessoes_total'] * 100
-).round(2)
-
-df_monthly_macro['pct_pedido_atendimento'] = (
-    (df_monthly_macro['sessoes_com_pedido_de_atendimento'] / df_monthly_macro['sessoes_total'] * 100).round(2)
-)
-df_monthly_macro['session_month'] = df_monthly_macro['session_month'].astype(str)
-
-# Garante ordem fixa e paleta
-bots = sorted(df_monthly_macro['chatbot'].unique())
-base_colors = sns.color_palette("tab10", n_colors=len(bots))
-palette = {bot: base_colors[i] for i, bot in enumerate(bots)}
-
-fig, ax = plt.subplots(figsize=(14, 6))
-
-# 1) Retenção - linha cheia
-sns.lineplot(
-    data=df_monthly_macro,
-    x='session_month',
-    y='retencao_pct',
-    hue='chatbot',
-    palette=palette,
-    marker='o',
-    linewidth=2,
-    legend=False,
-    ax=ax
-)
-
-# 2) Pedido de atendimento - linha tracejada
-sns.lineplot(
-    data=df_monthly_macro,
-    x='session_month',
-    y='pct_pedido_atendimento',
-    hue='chatbot',
-    palette=palette,
-    marker='o',
-    linewidth=2,
-    linestyle='--', # Define o estilo tracejado no plot
-    legend=False,
-    ax=ax
-)
-
-ax.set_title('Histórico Mensal: Retenção vs Pedido de Atendimento por Chatbot')
-ax.set_xlabel('Mês')
-ax.set_ylabel('Percentual (%)')
-plt.xticks(rotation=45)
-ax.grid(True)
-
-custom_lines = [
-    # BOT A (Cor A, Sólido)
-    Line2D([0], [0], color=palette[bots[0]], lw=2, marker='o', linestyle='-', label=f'{bots[0]} - Retenção'),
-    # BOT A (Cor A, Tracejado)
-    Line2D([0], [0], color=palette[bots[0]], lw=2, marker='', linestyle='--', label=f'{bots[0]} - Pedido de atendimento'),
-    
-    # BOT B (Cor B, Sólido)
-    Line2D([0], [0], color=palette[bots[1]], lw=2, marker='o', linestyle='-', label=f'{bots[1]} - Retenção'),
-    # BOT B (Cor B, Tracejado)
-    Line2D([0], [0], color=palette[bots[1]], lw=2, marker='', linestyle='--', label=f'{bots[1]} - Pedido de atendimento')
-]
-
-ax.legend(handles=custom_lines, title='Métrica', loc='best')
-
-fig.tight_layout()
-plt.show()
-
-### Correlação de pearson entre retenção e pedido de atendimento para cada chatbot
-for bot in bots:
-    print(f"\n===============================")
-    print(f"Analisando correlação para o chatbot: {bot}")
-    print(f"===============================\n")
-
-    # Filtra o dataframe para o bot atual
-    df_bot = df_monthly_macro[df_monthly_macro['chatbot'] == bot]
-
-    # 1) Matriz de Correlação
-    corr_matrix = df_bot[['retencao_pct', 'pct_pedido_atendimento']].corr(method='pearson')
-    print("Matriz de correlação:")
-    print(corr_matrix, "\n")
-
-    # 2) Scatterplot individual
-    plt.figure(figsize=(7,5))
-    sns.scatterplot(
-        data=df_bot,
-        x='pct_pedido_atendimento',
-        y='retencao_pct',
-        s=120,
-        color='blue'
-    )
-    plt.title(f"Scatterplot — {bot}\nRetenção vs Pedido de Atendimento")
-    plt.xlabel("Pct Pedido de Atendimento (%)")
-    plt.ylabel("Retenção (%)")
-    plt.grid(True, linestyle='--', alpha=0.3)
-    plt.show()
-
-    # 3) Regressão linear individual
-    g = sns.lmplot(
-        data=df_bot,
-        x='pct_pedido_atendimento',
-        y='retencao_pct',
-        height=5,
-        aspect=1.2,
-        line_kws={'color': 'red'}
-    )
-    g.fig.suptitle(f"Regressão Linear — {bot}\nRelação entre Retenção e Pedido de Atendimento", y=1.03)
-    plt.show()
-
-    # 4) Heatmap da correlação
-    plt.figure(figsize=(5,4))
-    sns.heatmap(corr_matrix, annot=True, cmap="Blues", fmt=".2f", vmin=-1, vmax=1)
-    plt.title(f"Matriz de Correlação — {bot}")
-    plt.show()
-
-
 ### RESUMO DAS DESCOBERTAS
 ### Chatbot A com um crescimento na retenção entre julho e até o momento de agosto, apesar de ter um histórico inferior
 ### Chatbot B históricamente superior, mas com uma leve queda na retenção no mês de agosto após um crescimento relevante nos 2 meses anteriores
 ### Correlação relevante negativa entre retenção e pedido para chatbot B, indicando que quanto mais pedidos de atendimento, menor a retenção
-### Correlação relevante positiva entre retenção e pedido para chatbot A, indicando que quanto mais pedidos de atendimento, maior a retenção - contra intuitivo 
+### Correlação relevante positiva entre retenção e pedido para chatbot A, indicando que quanto mais pedidos de atendimento, maior a retenção - contra intuitivo
 
 ### Hipóteses para investigar:
 ### 1) Mudanças nas tecnologias utilizadas - tecnologia_do_chatbot
 ### 2) Mudanças no mix de canais - fonte
-### 3) Mudanças na volumetria de cada chatbot, podendo alterar a dinâmica de retenção - exemplo assuntos com alta retenção tiveram menor volumetria e vice versa - volumetria + assuntos 
+### 3) Mudanças na volumetria de cada chatbot, podendo alterar a dinâmica de retenção - exemplo assuntos com alta retenção tiveram menor volumetria e vice versa - volumetria + assuntos
 
 # %% Análise diária + benchmark histórico para o mês atual
-def construir_df_diario(df: pd.DataFrame) -> pd.DataFrame:
-    df_daily = (
-        df.groupby(["session_date", "chatbot"])
-        .agg(
-            sessoes_total=("sessoes_total", "sum"),
-            sessoes_retidas=("sessoes_retidas", "sum"),
-            sessoes_com_pedido_de_atendimento=(
-                "sessoes_com_pedido_de_atendimento",
-                "sum",
-            ),
-        )
-        .reset_index()
-    )
+def construir_df_diario(df: pd.DataFrame, rollup: RollupRetencao = None) -> pd.DataFrame:
+    """
+    Série diária por chatbot. Com `rollup`, deriva do rollup já calculado
+    em vez de varrer a base de novo.
+    """
+    rollup = rollup or RollupRetencao(df)
+    df_daily = rollup.agregar(["session_date", "chatbot"])
 
     df_daily["session_month"] = df_daily["session_date"].dt.to_period("M")
     df_daily["day"] = df_daily["session_date"].dt.day
 
-    df_daily["retencao_pct"] = (
-        df_daily["sessoes_retidas"] / df_daily["sessoes_total"] * 100
-    ).round(2)
-
-    df_daily["pct_pedido_atendimento"] = (
-        df_daily["sessoes_com_pedido_de_atendimento"]
-        / df_daily["sessoes_total"]
-        * 100
-    ).round(2)
-
-    return df_daily
-
-df_daily = construir_df_diario(df)
+    return df_daily[
+        ["session_date", "chatbot"] + CONTADORES
+        + ["session_month", "day", "retencao_pct", "pct_pedido_atendimento"]
+    ]
 
 def obter_mes_atual_e_anterior(df: pd.DataFrame):
     meses_ordenados = sorted(df["session_month"].unique())
@@ -216,13 +66,14 @@ def obter_mes_atual_e_anterior(df: pd.DataFrame):
     return mes_atual, mes_anterior
 
 
-def resumo_mes_atual_vs_historico(df_daily: pd.DataFrame):
+def resumo_mes_atual_vs_historico(df_daily: pd.DataFrame, verbose: bool = False):
     """
     Compara o mês atual (parcial) com:
     - média histórica de meses anteriores, considerando mesma janela de dias
     - mês imediatamente anterior, também na mesma janela
 
     Isso responde se o mês atual está "indo bem ou mal" com base em benchmarks.
+    Com verbose=True imprime o resumo no console.
     """
     mes_atual, mes_anterior = obter_mes_atual_e_anterior(df_daily)
 
@@ -256,23 +107,7 @@ def resumo_mes_atual_vs_historico(df_daily: pd.DataFrame):
                     "pct_pedido_atendimento",
                 ]
             )
-        agg = df_in.groupby("chatbot").agg(
-            sessoes_total=("sessoes_total", "sum"),
-            sessoes_retidas=("sessoes_retidas", "sum"),
-            sessoes_com_pedido_de_atendimento=(
-                "sessoes_com_pedido_de_atendimento",
-                "sum",
-            ),
-        )
-        agg["retencao_pct"] = (
-            agg["sessoes_retidas"] / agg["sessoes_total"] * 100
-        ).round(2)
-        agg["pct_pedido_atendimento"] = (
-            agg["sessoes_com_pedido_de_atendimento"]
-            / agg["sessoes_total"]
-            * 100
-        ).round(2)
-        return agg.reset_index()
+        return adicionar_taxas(somar(df_in, ["chatbot"]))
 
     resumo_atual = agrega(df_atual)
     resumo_hist = agrega(df_hist)
@@ -327,27 +162,28 @@ def resumo_mes_atual_vs_historico(df_daily: pd.DataFrame):
         resumo["pct_pedido_atual"] - resumo["pct_pedido_ant"]
     ).round(2)
 
-    print("\n===============================")
-    print(f"RESUMO MÊS ATUAL (parcial até dia {max_day_atual})")
-    print(f"Mês atual (session_month): {mes_atual}")
-    if mes_anterior is not None:
-        print(f"Mês anterior (session_month): {mes_anterior}")
-    print("===============================\n")
+    if verbose:
+        print("\n===============================")
+        print(f"RESUMO MÊS ATUAL (parcial até dia {max_day_atual})")
+        print(f"Mês atual (session_month): {mes_atual}")
+        if mes_anterior is not None:
+            print(f"Mês anterior (session_month): {mes_anterior}")
+        print("===============================\n")
 
-    print(resumo.to_string(index=False))
+        print(resumo.to_string(index=False))
 
     return resumo, mes_atual, mes_anterior, max_day_atual
 
-resumo, mes_atual, mes_anterior, max_day_atual = resumo_mes_atual_vs_historico(df_daily)
-
 # %% Comparação de mix por canal/tecnologia/tópico/assunto (mês atual vs anterior)
 def comparar_mix_mes(
     df: pd.DataFrame,
     mes_atual,
     mes_anterior,
     chatbot: str,
-    feature: str, 
+    feature: str,
     max_day : int = None,
+    verbose: bool = False,
+    rollup: RollupRetencao = None,
 ) -> pd.DataFrame:
     """
     Compara o mix de um feature (fonte, tecnologia, topico, assunto) entre
@@ -355,42 +191,26 @@ def comparar_mix_mes(
 
     - Quando não há sessões no mês atual (ou anterior) para aquele feature,
       os percentuais ficam como NaN (não 0), evitando explosão de delta.
+    - Com `rollup`, parte do nível mês x bot x feature já agregado em vez da base crua.
+    - Com verbose=True imprime a comparação no console.
     """
 
     # Filtrar apenas o bot desejado
-    df_bot = df[df["chatbot"] == chatbot].copy()
-
-    # Focar apenas nos meses de interesse
-    df_bot["session_month"] = df_bot["session_date"].dt.to_period("M")
-    df_curr = df_bot[df_bot["session_month"] == mes_atual].copy()
-    df_prev = df_bot[df_bot["session_month"] == mes_anterior].copy()
+    if rollup is not None:
+        df = rollup.nivel(["mes_key", "chatbot", feature])
+    df_bot = df[df["chatbot"] == chatbot]
+
+    # Focar apenas nos meses de interesse (comparação pela chave inteira AAAAMM)
+    df_curr = df_bot[df_bot["mes_key"] == chave_mes(mes_atual)]
+    df_prev = (
+        df_bot[df_bot["mes_key"] == chave_mes(mes_anterior)]
+        if mes_anterior is not None
+        else df_bot.iloc[0:0]
+    )
 
     def agrega(df_in):
-        g = (
-            df_in.groupby(feature)
-            .agg(
-                sessoes_total=("sessoes_total", "sum"),
-                sessoes_retidas=("sessoes_retidas", "sum"),
-                sessoes_com_pedido_de_atendimento=(
-                    "sessoes_com_pedido_de_atendimento",
-                    "sum",
-                ),
-            )
-            .reset_index()
-        )
-
         # Evita divisão por zero: se sessoes_total == 0, fica NaN
-        g["retencao_pct"] = np.where(
-            g["sessoes_total"] > 0,
-            (g["sessoes_retidas"] / g["sessoes_total"] * 100).round(2),
-            np.nan,
-        )
-
-        g["pct_pedido_atendimento"] = np.where(
-            g["sessoes_total"] > 0,
-            (g["sessoes_com_pedido_de_atendimento"] / g["sessoes_total"] * 100).round(2),
-            np.nan,
-        )
+        g = adicionar_taxas(somar(df_in, [feature]))
 
         total = g["sessoes_total"].sum()
         g["share_pct"] = np.where(
@@ -472,42 +292,165 @@ def comparar_mix_mes(
         by="delta_retencao_pp", ascending=True
     ).reset_index(drop=True)
 
-    print("\n===============================")
-    print(f"Comparação de mix - Chatbot: {chatbot} | Feature: {feature}")
-    print(f"Mês atual: {mes_atual} x Mês anterior: {mes_anterior}")
-    print("===============================\n")
-    print(resumo_mix.to_string(index=False))
+    if verbose:
+        print("\n===============================")
+        print(f"Comparação de mix - Chatbot: {chatbot} | Feature: {feature}")
+        print(f"Mês atual: {mes_atual} x Mês anterior: {mes_anterior}")
+        print("===============================\n")
+        print(resumo_mix.to_string(index=False))
 
     return resumo_mix
-features = ['fonte', 'tecnologia_do_chatbot', 'topico_da_sessao', 'assunto_da_sessao']
-resultados_por_feature = {}
-
-for feature in features:
-    dfs_bots = [] 
-
-    for bot in bots:
-        df_mix = comparar_mix_mes(
-            df=df,
-            mes_atual=mes_atual,
-            mes_anterior=mes_anterior,
-            chatbot=bot,
-            feature=feature,
-            max_day=max_day_atual,
-        )
 
-        # garantir que o bot apareça como coluna (se não estiver vindo do comparar_mix_mes)
-        if "chatbot" not in df_mix.columns:
-            df_mix["chatbot"] = bot
+features = ['fonte', 'tecnologia_do_chatbot', 'topico_da_sessao', 'assunto_da_sessao']
 
-        dfs_bots.append(df_mix)
+# Tabela de mix publicada para cada feature (df_mix_* do pipeline e das saídas)
+TABELAS_MIX = {
+    'df_mix_fonte': 'fonte',
+    'df_mix_tecnologia': 'tecnologia_do_chatbot',
+    'df_mix_topico': 'topico_da_sessao',
+    'df_mix_assunto': 'assunto_da_sessao',
+}
 
-    # concatena todos os bots num df só para essa feature
-    resultados_por_feature[feature] = pd.concat(dfs_bots, ignore_index=True)
+def comparar_mix_lote(
+    rollup: RollupRetencao,
+    mes_atual,
+    mes_anterior,
+    features: list = features,
+    chatbots: list = None,
+) -> dict:
+    """
+    Versão em lote de comparar_mix_mes: compara o mix atual x anterior de
+    todos os bots e de todas as features em operações agrupadas, sem loop
+    por (feature, bot), sem cópias por chamada e sem prints.
+
+    - `features` aceita qualquer dimensão do rollup; uma tupla de dimensões
+      compara a combinação delas (ex.: ('fonte', 'tecnologia_do_chatbot'))
+    - `chatbots` restringe os bots (padrão: todos)
+    - Retorna {feature: DataFrame} com as mesmas colunas de comparar_mix_mes
+      + chatbot, bots em ordem alfabética e, dentro de cada bot, pior
+      delta_retencao_pp primeiro
+    """
+    k_atual = chave_mes(mes_atual)
+    k_ant = chave_mes(mes_anterior) if mes_anterior is not None else None
+
+    nomes = {
+        "sessoes_total": "sessoes_total_{}",
+        "sessoes_retidas": "sessoes_retidas_{}",
+        "sessoes_com_pedido_de_atendimento": "sessoes_pedido_{}",
+        "retencao_pct": "retencao_{}_pct",
+        "pct_pedido_atendimento": "pct_pedido_{}",
+        "share_pct": "share_{}_pct",
+    }
+
+    resultados = {}
+    for feature in features:
+        cols = [feature] if isinstance(feature, str) else list(feature)
+
+        nivel = rollup.nivel(["mes_key", "chatbot"] + cols)
+        mes_key = nivel["mes_key"].to_numpy()
+        mascara = (mes_key == k_atual) | (mes_key == k_ant)
+        if chatbots is not None:
+            mascara &= nivel["chatbot"].isin(chatbots).to_numpy()
+        # Formato longo em arrays (um passo vetorizado para os dois meses)
+        sel = {c: nivel[c].array[mascara] for c in ["chatbot"] + cols + CONTADORES}
+        atual = mes_key[mascara] == k_atual
+
+        # Percentuais e share
+        longo = {c: np.asarray(sel[c]) for c in CONTADORES}
+        totais = longo["sessoes_total"].astype("float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for origem, taxa in (("sessoes_retidas", "retencao_pct"), ("sessoes_com_pedido_de_atendimento", "pct_pedido_atendimento")):
+                longo[taxa] = np.where(totais > 0, np.round(longo[origem] / totais * 100, 2), np.nan)
+            bot_mes = pd.factorize(sel["chatbot"])[0] * 2 + atual
+            total_bot_mes = np.bincount(bot_mes, weights=totais)[bot_mes]
+            longo["share_pct"] = np.where(total_bot_mes > 0, np.round(totais / total_bot_mes * 100, 2), np.nan)
+
+        # Formato largo: uma linha por (bot, feature), colunas por período.
+        # Grupos pela chave combinada dos códigos (ordem de bot, feature); cada linha
+        # do formato longo vai direto para a posição do seu grupo (sem unstack)
+        fatores = [pd.factorize(sel[c], sort=True) for c in ["chatbot"] + cols]
+        combinada = np.zeros(len(atual), dtype="int64")
+        for codigos, valores in fatores:
+            combinada = combinada * len(valores) + codigos
+        grupos, posicao = np.unique(combinada, return_inverse=True)
+        codigos_grupo = np.unravel_index(grupos, [len(valores) for _, valores in fatores])
+        chaves = {
+            c: valores.take(codigos)
+            for c, (_, valores), codigos in zip(["chatbot"] + cols, fatores, codigos_grupo)
+        }
+        n = len(grupos)
+        # Como no unstack: contagens só mantêm o tipo inteiro se nenhum (grupo, período) faltar
+        periodos = [p for p, linhas in (("ant", ~atual), ("atual", atual)) if linhas.any()]
+        completo = len(atual) == n * len(periodos)
+
+        colunas = {}
+        for periodo, linhas in (("ant", ~atual), ("atual", atual)):
+            for origem, destino in nomes.items():
+                coluna = np.full(n, np.nan)
+                coluna[posicao[linhas]] = longo[origem][linhas]
+                if completo and periodo in periodos and origem in CONTADORES:
+                    coluna = coluna.astype(longo[origem].dtype)
+                colunas[destino.format(periodo)] = coluna
+
+        # Contagens e shares ausentes viram 0; percentuais continuam NaN
+        cols_zero = [
+            "sessoes_total_atual", "sessoes_retidas_atual", "sessoes_pedido_atual", "share_atual_pct",
+            "sessoes_total_ant", "sessoes_retidas_ant", "sessoes_pedido_ant", "share_ant_pct",
+        ]
+        for col in cols_zero:
+            if colunas[col].dtype.kind == "f":
+                colunas[col] = np.nan_to_num(colunas[col], nan=0.0)
+
+        # Deltas em p.p. (se um dos lados for NaN, delta fica NaN também)
+        colunas["delta_share_pp"] = colunas["share_atual_pct"] - colunas["share_ant_pct"]
+        colunas["delta_retencao_pp"] = colunas["retencao_atual_pct"] - colunas["retencao_ant_pct"]
+        colunas["delta_pedido_pp"] = colunas["pct_pedido_atual"] - colunas["pct_pedido_ant"]
+
+        # Ordena por bot e, dentro do bot, pior delta de retenção primeiro (NaN no fim)
+        delta = colunas["delta_retencao_pp"]
+        ordem = np.lexsort((
+            np.where(np.isnan(delta), np.inf, delta),
+            np.asarray(chaves["chatbot"]).astype(str),
+        ))
+
+        # Mesma ordem de colunas de comparar_mix_mes, com o chatbot no final
+        colunas = {c: chaves[c] for c in cols} | colunas | {"chatbot": chaves["chatbot"]}
+        resultados[feature] = pd.DataFrame({c: valores[ordem] for c, valores in colunas.items()})
+
+    return resultados
+
+
+# %% Visões filtradas (filtros do dashboard), servidas pelo cubo agregado
+def analisar_recorte(recorte: RecorteCubo, bots: list = None) -> dict:
+    """
+    Histórico mensal, resumo mês atual x histórico e mix para um recorte do
+    cubo (ver cubo.py), com as mesmas funções e colunas da análise completa.
 
-df_mix_fonte = resultados_por_feature['fonte']
-df_mix_tecnologia = resultados_por_feature['tecnologia_do_chatbot']
-df_mix_topico = resultados_por_feature['topico_da_sessao']
-df_mix_assunto = resultados_por_feature['assunto_da_sessao']
+    - O mês atual é o último mês com sessões no recorte; o anterior, o mês antes dele
+    - Retorna {} quando o recorte não tem sessões
+    """
+    df_monthly_macro = recorte.agregar(["session_month", "chatbot"])
+    if df_monthly_macro.empty:
+        return {}
+    df_monthly_macro["session_month"] = df_monthly_macro["session_month"].astype(str)
+    bots = [b for b in (bots or sorted(df_monthly_macro["chatbot"].unique())) if b in set(df_monthly_macro["chatbot"])]
+
+    resumo, mes_atual, mes_anterior, max_day_atual = resumo_mes_atual_vs_historico(
+        construir_df_diario(None, recorte)
+    )
+    mix = comparar_mix_lote(recorte, mes_atual, mes_anterior, features=features, chatbots=bots)
+    return {
+        "df_monthly_macro": df_monthly_macro,
+        "bots": bots,
+        "resumo": resumo,
+        "mes_atual": mes_atual,
+        "mes_anterior": mes_anterior,
+        "max_day_atual": max_day_atual,
+        "df_mix_fonte": mix["fonte"],
+        "df_mix_tecnologia": mix["tecnologia_do_chatbot"],
+        "df_mix_topico": mix["topico_da_sessao"],
+        "df_mix_assunto": mix["assunto_da_sessao"],
+    }
 
 ### Anomalias detectadas:
 ### Chatbot A - Fonte: Chat_c com retenção em zero, apesar de uma media histórica relevante - 63%
@@ -532,7 +475,7 @@ for c in df_topicos['chatbot'].unique().tolist():
 
 #Testar Hipóteses para aprofundar avaliação do mês de Agosto
 
-### Agrupamento mensal 
+### Agrupamento mensal
 df_monthly = df.groupby(['session_month','chatbot', 'fonte', 'tecnologia_do_chatbot', 'topico_da_sessao', 'assunto_da_sessao']).agg(
     sessoes_total = ('sessoes_total', 'sum'),
     sessoes_retidas = ('sessoes_retidas', 'sum'),
@@ -560,505 +503,825 @@ for marca in marcas:
 
 '''
 
-
-#%% Deep Dive
-
-### DEEP DIVE 1 - Fonte : Chat_C BOT A - Retenção Zero
-###Historico do Chat_C para BOT A para ver se é um comportamento recorrente a oscilação ou se realmente há algo de errado no mês de agosto
-deep_fonte = (df[(df.chatbot == "BOT_A") & (df.fonte == "Chat_C")].groupby(['session_month', 'fonte']).agg(
-                sessoes_total=("sessoes_total", "sum"),
-                sessoes_retidas=("sessoes_retidas", "sum"),
-                sessoes_com_pedido_de_atendimento=("sessoes_com_pedido_de_atendimento","sum",)
-                )).reset_index()
-deep_fonte["retencao_pct"] = np.where(
-            deep_fonte["sessoes_total"] > 0,
-            (deep_fonte["sessoes_retidas"] / deep_fonte["sessoes_total"] * 100).round(2),
-            np.nan,
-        )
-
-deep_fonte["pct_pedido_atendimento"] = np.where(
-deep_fonte["sessoes_total"] > 0,
-(deep_fonte["sessoes_com_pedido_de_atendimento"] / deep_fonte["sessoes_total"] * 100).round(2),
-np.nan,
-)
-
-total = deep_fonte["sessoes_total"].sum()
-deep_fonte["share_pct"] = np.where(
-total > 0,
-(deep_fonte["sessoes_total"] / total * 100).round(2),
-np.nan,
-)
-
 ### Inconsistência comprovada - Chat_C BOT A com retenção zero no mês de agosto - em 6 dias diferentes com total de 4756 todas com retenção zerada - , apesar de um histórico relevante - 63% de retenção média dos ultimos meses
 
-
-### DEEP DIVE 2 - Tópico da Sessão e Assunto da Sessão com distorções negativas relevantes
-#Ambos com os maiores deltas de retenção vs mês de julho, para assunto e tópico para o chatbot A 
-df[(df.topico_da_sessao == 'db1e24b9c4ec37948ce0acccd0716e08a01ee28d3bbd1c8adfd19f617fd4c3bb') & (df.session_month == '2025-08')]
-df[(df.assunto_da_sessao == 'ee84ca1ecf3b016b684c8a91f78153ddb59f8a716fcf203a1a5fb1d7c9b7c665') & (df.session_month == '2025-08')]
-# Ambos com retenção zerada em 1 dia de registro para cada, ambos na fonte  CHAT_B e tecnologia TECH_A
-
-
-
-### Conhecendo a base de mix topico e mix assunto
-rows = []
-for chatbot in bots:
-    df_mix_assunto[df_mix_assunto.chatbot == chatbot ]['retencao_atual_pct'].describe()
-    df_mix_topico[df_mix_topico.chatbot == chatbot]['retencao_atual_pct'].describe()
-    #Salvar quantis 
-     # --- Assunto ---
-    q10_assunto = (
-        df_mix_assunto[df_mix_assunto.chatbot == chatbot]['retencao_atual_pct']
-        .quantile(0.10)
-    )
-    rows.append({
-        "chatbot": chatbot,
-        "feature": "assunto_da_sessao",
-        "q10_retencao": q10_assunto
-    })
-
-    # --- Tópico ---
-    q10_topico = (
-        df_mix_topico[df_mix_topico.chatbot == chatbot]['retencao_atual_pct']
-        .quantile(0.10)
-    )
-    rows.append({
-        "chatbot": chatbot,
-        "feature": "topico_da_sessao",
-        "q10_retencao": q10_topico
-    })
-df_q10 = pd.DataFrame(rows)
-
-#Análise de quantis se mostrou não aplicável, uma vez que tópicos e assuntos possuem retenção relativamente alta. 
+#Análise de quantis se mostrou não aplicável, uma vez que tópicos e assuntos possuem retenção relativamente alta.
 #Para capturar outliers, vamos considerar um percentual inferior a 20% de retenção como critério para identificar tópicos e assuntos críticos
 # Além disso, vamos considerar apenas aqueles com delta negativo relevante (abaixo de -10 p.p.) para garantir que houve uma anomalia relevante entre um mês e outro
 
-# Criar dicionários onde cada chatbot terá sua lista própria
-topicos_criticos_por_bot = {}
-assuntos_criticos_por_bot = {}
-
-for chatbot in bots:
-    # Filtrar tópicos críticos do BOT
-    topicos_criticos = df_mix_topico[
-        (df_mix_topico.chatbot == chatbot)
-        & (df_mix_topico['retencao_atual_pct'] < 20)
-        & (df_mix_topico['delta_retencao_pp'] < -10)
-    ]['topico_da_sessao'].unique().tolist()
-
-    # Filtrar assuntos críticos do BOT
-    assuntos_criticos = df_mix_assunto[
-        (df_mix_assunto.chatbot == chatbot)
-        & (df_mix_assunto['retencao_atual_pct'] < 20)
-        & (df_mix_assunto['delta_retencao_pp'] < -10)
-    ]['assunto_da_sessao'].unique().tolist()
-
-    # Salvar no dicionário final
-    topicos_criticos_por_bot[chatbot] = topicos_criticos
-    assuntos_criticos_por_bot[chatbot] = assuntos_criticos
-
-# Filtrar os dataframes originais para os tópicos e assuntos críticos identificados para cada chatbot 
-dfs_topicos_criticos = {}
-dfs_assuntos_criticos = {}
-
-for bot in bots:
-    # Tópicos críticos por bot
-    dfs_topicos_criticos[bot] = df[
-        (df["session_month"].astype(str) == "2025-08")
-        & (df["chatbot"] == bot)
-        & (df["topico_da_sessao"].isin(topicos_criticos_por_bot[bot]))
-    ]
-    
-    # Assuntos críticos por bot
-    dfs_assuntos_criticos[bot] = df[
-        (df["session_month"].astype(str) == "2025-08")
-        & (df["chatbot"] == bot)
-        & (df["assunto_da_sessao"].isin(assuntos_criticos_por_bot[bot]))
-    ]
-
 ### Assuntos críticos identificados para cada chatbot, mostrando consistentemente em todos os meses dias com retenção zerada, no mês de agosto tendo um volume maior de sessões com retenção zerada
 ### Em ambos chatbots as tecnologias relacionadas aos assuntos se mostram constantes, no caso do chatbot A a tecnologia TECH_A e no chatbot B a tecnologia TECH_B
 
 ### Chatbot A apresentou 1 tópico crítico com retenção zerada em agosto, mas apenas com 1 dia de amostra, necessitando de mais dados para analisar e decretar alguma anomalia relevante
 ### Chatbot B apresentou nenhum tópico crítico, todos mantiveram retenção acima de 58%
 
-
-### Analise de topicos e assuntos positivos
-
-# Criar dicionários onde cada chatbot terá sua lista própria
-topicos_positivos_por_bot = {}
-assuntos_positivos_por_bot = {}
-
-for chatbot in bots:
-    # Filtrar tópicos críticos do BOT
-    topicos_positivos = df_mix_topico[
-        (df_mix_topico.chatbot == chatbot)
-        & (df_mix_topico['retencao_atual_pct'] > 20)
-        & (df_mix_topico['delta_retencao_pp'] > 10)
-    ]['topico_da_sessao'].unique().tolist()
-
-    # Filtrar assuntos críticos do BOT
-    assuntos_positivos = df_mix_assunto[
-        (df_mix_assunto.chatbot == chatbot)
-        & (df_mix_assunto['retencao_atual_pct'] > 20)
-        & (df_mix_assunto['delta_retencao_pp'] > 10)
-    ]['assunto_da_sessao'].unique().tolist()
-
-    # Salvar no dicionário final
-    topicos_positivos_por_bot[chatbot] = topicos_positivos
-    assuntos_positivos_por_bot[chatbot] = assuntos_positivos
-
-# Filtrar os dataframes originais para os tópicos e assuntos com variancia positiva relevante identificados para cada chatbot 
-dfs_topicos_positivos = {}
-dfs_assuntos_positivos = {}
-
-for bot in bots:
-    # Tópicos críticos por bot
-    dfs_topicos_positivos[bot] = df[
-        (df["session_month"].astype(str) == "2025-08")
-        & (df["chatbot"] == bot)
-        & (df["topico_da_sessao"].isin(topicos_positivos_por_bot[bot]))
-    ]
-    
-    # Assuntos críticos por bot
-    dfs_assuntos_positivos[bot] = df[
-        (df["session_month"].astype(str) == "2025-08")
-        & (df["chatbot"] == bot)
-        & (df["assunto_da_sessao"].isin(assuntos_positivos_por_bot[bot]))
-    ]
-
 ### Assuntos positivos identificados para cada chatbot, mostrando um aumento relevante na retenção no mês de agosto porém ainda mantendo uma oscilação grande, possuindo dias com retenção zerada
 
-### Resultado final encontrado acerca de assuntos: ambos chatbots apresentaram muita oscilação em diversos assuntos, possuindo dias com retenção zerada e outros dias com retenção alta, mesmo com uma volumetria relevante em cada dia amostral 
+### Resultado final encontrado acerca de assuntos: ambos chatbots apresentaram muita oscilação em diversos assuntos, possuindo dias com retenção zerada e outros dias com retenção alta, mesmo com uma volumetria relevante em cada dia amostral
 ### Necessário um monitoramento mais frequente para entender o que está causando essa oscilação, visto que não há um padrão claro de tecnologia ou canal que justifique tais variações
 
 
-#%% Projeção para o fechamento de Agosto 
+#%% Projeção para o fechamento de Agosto
 ### Como evidenciado anteriormente, o mês de Maio trouxe uma mudança relevante na dinâmica de retenção dos chatbots, possivelmente por mudanças nas tecnologias ou canais utilizados
 ### Dessa forma, para projetar o fechamento de agosto, vamos considerar a média móvel dos últimos 3 meses (Maio, Junho e Julho) para projetar o mês de Agosto
 
+# Meses de interesse (maio em diante)
+mes_inicio = MES_INICIO
 
-# 2. Definir meses de interesse (maio em diante)
-
-mes_inicio = "2025-05"
-df_recent = df_daily[df_daily['session_month'] >= mes_inicio]
-
-# Identificar meses disponíveis
-meses = sorted(df_recent['session_month'].unique())
-
-# Último mês é agosto (parcial)
-mes_atual = meses[-1]
 
+# Colunas de projecao.projetar_fechamento -> nomes da projeção de agosto
+COLUNAS_PROJECAO_AGOSTO = {
+    "media_ate_corte": "media_dias_1_14",
+    "fator_historico": "fator_historico_1_14_para_15_31",
+    "proj_apos_corte": "proj_dias_15_31",
+    "retencao_proj_fechamento": "retencao_proj_final_agosto",
+}
 
-# 3. Função para calcular fatores históricos por chatbot
 
-def calcular_fator_historico(df_recent, chatbot, mes_atual):
-    fatores = []
-
-    # Iterar meses anteriores ao atual
-    for mes in meses:
-        if mes == mes_atual:
-            continue
-        
-        df_mes = df_recent[(df_recent['chatbot'] == chatbot) &
-                           (df_recent['session_month'] == mes)]
-
-        # Cálculo da retenção média nos dias 1–14
-        r_1_14 = df_mes[df_mes['day'] <= 14]['retencao_pct'].mean()
+def projetar_fechamento_agosto(
+    df_daily: pd.DataFrame,
+    mes_inicio: str = mes_inicio,
+    dia_corte: int = None,
+    dias_mes: int = None,
+) -> pd.DataFrame:
+    """
+    Projeta o fechamento do mês atual (agosto) por chatbot:
+    - retenção média dos dias 1-14 do mês atual
+    - fator histórico 1-14 -> 15-31 dos meses desde `mes_inicio`
+    - média ponderada final para 31 dias
+
+    Cálculo vetorizado em projecao.projetar_fechamento, com o mesmo padrão de
+    df_projecoes_segmentos: corte no último dia observado e mês do calendário
+    (14 e 31 no case). As colunas mantêm os nomes da análise original.
+    """
+    df_projecoes = projetar_fechamento(df_daily, ["chatbot"], dia_corte, dias_mes, mes_inicio)
+    df_projecoes["chatbot"] = df_projecoes["chatbot"].astype(str)
+    df_projecoes = df_projecoes.rename(columns=COLUNAS_PROJECAO_AGOSTO)
+    return df_projecoes[["chatbot"] + list(COLUNAS_PROJECAO_AGOSTO.values())]
 
-        # Cálculo da retenção nos dias 15–31 (ou até onde houver dados)
-        r_15_31 = df_mes[df_mes['day'] > 14]['retencao_pct'].mean()
+#%% Projeção para os meses de setembro a dezembro de 2025 - pergunta 3
+# ============================================================================
+# PROJEÇÃO
+# (métodos matriciais em projecao.py, que projetam todas as séries e métodos de uma vez)
 
-        if pd.notnull(r_1_14) and pd.notnull(r_15_31) and r_1_14 > 0:
-            fatores.append(r_15_31 / r_1_14)
+# Ano do indicador anual (df_2025_full / df_indicador_anual)
+ANO_INDICADOR = "2025"
 
-    if len(fatores) == 0:
-        return np.nan
+# Meses projetados após o último mês observado; None: até dezembro do ano do mês atual (set-dez no case)
+HORIZONTE_PROJECAO = None
 
-    return np.mean(fatores)  # fator médio pós-disrupção
 
+# ============================================================================
+# PIPELINE DA ANÁLISE (resultados calculados sob demanda e memorizados)
+# ============================================================================
 
+def preparar_base(df: pd.DataFrame, codigos: dict = None) -> pd.DataFrame:
+    """
+    Base pronta para a análise: esquema normalizado (ver carga.normalizar_esquema,
+    com a tabela de códigos `codigos`), retenção por linha e mês da sessão.
+    """
+    ### Normalização do esquema: dimensões categóricas, chaves inteiras de mês/dia e contadores compactos
+    df = normalizar_esquema(df, codigos)
 
-# 4. Projetar agosto por chatbot
+    ### Criação do indicador de retenção
+    df['retencao_percent'] = ((df['sessoes_retidas']/ df['sessoes_total'])* 100).round(2)
 
-projecoes = []
+    ### Criação da coluna mês para análise temporal
+    df['session_month'] = pd.to_datetime(df['session_date']).dt.to_period('M')
+    return df
 
-for bot in df_recent['chatbot'].unique():
 
-    # Dados do mês atual (agosto)
-    df_mes_atual = df_recent[(df_recent['chatbot'] == bot) &
-                             (df_recent['session_month'] == mes_atual)]
+class PipelineRetencao:
+    """
+    Pipeline da análise de retenção, sem efeitos colaterais.
 
-    # Retenção média dias 1–14
-    r_atual_1_14 = df_mes_atual[df_mes_atual['day'] <= 14]['retencao_pct'].mean()
+    - Cada resultado (df_monthly_macro, df_daily, df_mix_*, df_projecoes,
+      df_future_trend, df_2025_full, ...) é um atributo calculado no primeiro
+      acesso e memorizado; só é calculado o que for de fato usado
+    - Gráficos e prints ficam apenas em relatorio()
+    """
 
-    # Fator histórico (1–14 → 15–31)
-    fator = calcular_fator_historico(df_recent, bot, mes_atual)
+    def __init__(
+        self,
+        file_path: str = file_path,
+        df: pd.DataFrame = None,
+        rollup: RollupRetencao = None,
+        horizonte: int = HORIZONTE_PROJECAO,
+        parametros_anomalias: dict = None,
+        processos: int = 1,
+    ):
+        self.file_path = file_path
+        # Processos da agregação do rollup (> 1: particionada por data, ver paralelo.py)
+        self.processos = processos
+        # Parâmetros da análise (entram na chave de memorização das etapas, ver etapas.py)
+        self.horizonte = horizonte
+        self.parametros_anomalias = dict(parametros_anomalias or {})
+        # Base agregada já carregada (ex.: saída de ingestao.agregar_silver_sessions)
+        self._df_entrada = df
+        # Rollup já somado (ex.: estado de incremental.py), evita reagregar o histórico
+        if rollup is not None:
+            self.rollup = rollup
+
+    #%% Carregando dados
+    @cached_property
+    @instrumentar("carga")
+    def df(self) -> pd.DataFrame:
+        if self._df_entrada is not None:
+            df = self._df_entrada
+        else:
+            # Lê o Excel só na primeira vez; depois usa a cópia colunar em .cache/
+            df = carregar_base(self.file_path)
+
+        ### Normalização do esquema: dimensões categóricas, chaves inteiras de mês/dia e contadores compactos
+        return preparar_base(df)
+
+    ### Rollup: base varrida uma vez no grão mais fino; os demais níveis derivam dele
+    @cached_property
+    @instrumentar("rollup", entrada="df")
+    def rollup(self) -> RollupRetencao:
+        if self.processos > 1:
+            from paralelo import rollup_paralelo
+
+            return rollup_paralelo(self.df, self.processos)
+        return RollupRetencao(self.df)
+
+    #%% Visão Geral Mensal de Retenção vs Pedido de Atendimento por Chatbot para entender perfil histórico
+    @cached_property
+    @instrumentar("df_monthly_macro")
+    def df_monthly_macro(self) -> pd.DataFrame:
+        df_monthly_macro = self.rollup.agregar(['session_month', 'chatbot'])
+        df_monthly_macro['session_month'] = df_monthly_macro['session_month'].astype(str)
+        return df_monthly_macro
+
+    # Garante ordem fixa e paleta
+    @cached_property
+    def bots(self) -> list:
+        return sorted(self.df_monthly_macro['chatbot'].unique())
+
+    @cached_property
+    def palette(self) -> dict:
+        import seaborn as sns
+
+        base_colors = sns.color_palette("tab10", n_colors=len(self.bots))
+        return {bot: base_colors[i] for i, bot in enumerate(self.bots)}
+
+    # %% Análise diária + benchmark histórico para o mês atual
+    @cached_property
+    @instrumentar("construir_df_diario")
+    def df_daily(self) -> pd.DataFrame:
+        return construir_df_diario(None, self.rollup)
+
+    @cached_property
+    @instrumentar("resumo_mes_atual_vs_historico", entrada="df_daily")
+    def _resumo_mes(self):
+        return resumo_mes_atual_vs_historico(self.df_daily)
+
+    @property
+    def resumo(self) -> pd.DataFrame:
+        return self._resumo_mes[0]
+
+    @property
+    def mes_atual(self):
+        return self._resumo_mes[1]
+
+    @property
+    def mes_anterior(self):
+        return self._resumo_mes[2]
+
+    @property
+    def max_day_atual(self):
+        return self._resumo_mes[3]
+
+    @cached_property
+    def mes_key_atual(self) -> int:
+        return chave_mes(self.mes_atual)
+
+    ### Índice ordenado (mês, bot, valor da dimensão): drill-downs viram fatias, não varreduras da base
+    @cached_property
+    @instrumentar("indice_segmentos", entrada="df")
+    def indice(self) -> IndiceSegmentos:
+        return IndiceSegmentos(self.df)
+
+    ### Cubo agregado (todos os marginais pré-calculados) para os filtros do dashboard
+    @property
+    def df_cubo(self) -> pd.DataFrame:
+        return self.rollup.base[["session_date"] + DIMENSOES_FILTRO + CONTADORES]
+
+    @cached_property
+    @instrumentar("cubo", entrada="rollup")
+    def cubo(self) -> CuboRetencao:
+        return CuboRetencao(self.df_cubo)
+
+    # %% Comparação de mix por canal/tecnologia/tópico/assunto (mês atual vs anterior)
+    @cached_property
+    @instrumentar("comparar_mix")
+    def resultados_por_feature(self) -> dict:
+        # Todas as features e todos os bots de uma vez, a partir do rollup
+        return comparar_mix_lote(
+            self.rollup,
+            mes_atual=self.mes_atual,
+            mes_anterior=self.mes_anterior,
+            features=features,
+            chatbots=self.bots,
+        )
 
-    # Projeção para dias 15–31
-    r_atual_15_31_proj = r_atual_1_14 * fator if pd.notnull(fator) else np.nan
+    @property
+    def df_mix_fonte(self) -> pd.DataFrame:
+        return self.resultados_por_feature[TABELAS_MIX['df_mix_fonte']]
+
+    @property
+    def df_mix_tecnologia(self) -> pd.DataFrame:
+        return self.resultados_por_feature[TABELAS_MIX['df_mix_tecnologia']]
+
+    @property
+    def df_mix_topico(self) -> pd.DataFrame:
+        return self.resultados_por_feature[TABELAS_MIX['df_mix_topico']]
+
+    @property
+    def df_mix_assunto(self) -> pd.DataFrame:
+        return self.resultados_por_feature[TABELAS_MIX['df_mix_assunto']]
+
+    #%% Varredura de anomalias: todas as células segmento x dia, de bot até o grão mais fino
+    @cached_property
+    @instrumentar("varrer_anomalias")
+    def df_anomalias(self) -> pd.DataFrame:
+        return varrer_anomalias(self.rollup, **self.parametros_anomalias)
+
+    ### Episódios (dias sinalizados seguidos do mesmo segmento) ranqueados por sessões retidas perdidas
+    @cached_property
+    @instrumentar("episodios_anomalos", entrada="df_anomalias")
+    def df_episodios_anomalos(self) -> pd.DataFrame:
+        return episodios_anomalos(self.df_anomalias)
+
+    def _maior_episodio(self, dims: list, tipo: str = "retencao_zero"):
+        # Episódio de maior impacto do nível `dims` que chega ao mês atual (None se não houver)
+        ep = self.df_episodios_anomalos
+        ep = ep[
+            (ep["nivel"] == " x ".join(dims))
+            & (ep["tipo"] == tipo)
+            & (ep["fim"].dt.to_period("M") == self.mes_atual)
+        ]
+        return ep.iloc[0] if len(ep) else None
+
+    #%% Deep Dive
+
+    ### DEEP DIVE 1 - Fonte com retenção zerada de maior impacto no mês atual (na base do case: Chat_C BOT A)
+    ###Historico da fonte para o bot para ver se é um comportamento recorrente a oscilação ou se realmente há algo de errado no mês atual
+    @cached_property
+    def segmento_deep_fonte(self):
+        ep = self._maior_episodio(["chatbot", "fonte"])
+        return (ep["chatbot"], ep["fonte"]) if ep is not None else None
+
+    @cached_property
+    @instrumentar("deep_fonte")
+    def deep_fonte(self) -> pd.DataFrame:
+        df = self.rollup.nivel(['session_month', 'chatbot', 'fonte'])
+        bot, fonte = self.segmento_deep_fonte or (None, None)
+        deep_fonte = adicionar_taxas(
+            somar(df[(df.chatbot == bot) & (df.fonte == fonte)], ['session_month', 'fonte'])
+        )
 
-    # Projeção ponderada final (31 dias)
-    r_final = ((14 * r_atual_1_14) + (17 * r_atual_15_31_proj)) / 31
+        total = deep_fonte["sessoes_total"].sum()
+        deep_fonte["share_pct"] = np.where(
+        total > 0,
+        (deep_fonte["sessoes_total"] / total * 100).round(2),
+        np.nan,
+        )
+        return deep_fonte
+
+    ### DEEP DIVE 2 - Tópico da Sessão e Assunto da Sessão com retenção zerada de maior impacto no mês atual
+    # Antes escolhidos à mão (hashes fixos); agora saem da varredura de anomalias
+    @cached_property
+    @instrumentar("deep_dive_2", entrada="df")
+    def deep_dive_2(self) -> dict:
+        resultado = {}
+        for nome, feature in [("topico", "topico_da_sessao"), ("assunto", "assunto_da_sessao")]:
+            ep = self._maior_episodio(["chatbot", feature])
+            if ep is None:
+                resultado[nome] = self.indice.vazio()
+                continue
+            resultado[nome] = self.indice.fatiar(self.mes_key_atual, ep["chatbot"], feature, [ep[feature]])
+        return resultado
+
+    ### Conhecendo a base de mix topico e mix assunto
+    @cached_property
+    @instrumentar("df_q10", entrada="df")
+    def df_q10(self) -> pd.DataFrame:
+        df_mix_assunto = self.df_mix_assunto
+        df_mix_topico = self.df_mix_topico
+        rows = []
+        for chatbot in self.bots:
+            #Salvar quantis
+             # --- Assunto ---
+            q10_assunto = (
+                df_mix_assunto[df_mix_assunto.chatbot == chatbot]['retencao_atual_pct']
+                .quantile(0.10)
+            )
+            rows.append({
+                "chatbot": chatbot,
+                "feature": "assunto_da_sessao",
+                "q10_retencao": q10_assunto
+            })
+
+            # --- Tópico ---
+            q10_topico = (
+                df_mix_topico[df_mix_topico.chatbot == chatbot]['retencao_atual_pct']
+                .quantile(0.10)
+            )
+            rows.append({
+                "chatbot": chatbot,
+                "feature": "topico_da_sessao",
+                "q10_retencao": q10_topico
+            })
+        return pd.DataFrame(rows)
+
+    # Criar dicionários onde cada chatbot terá sua lista própria
+    @cached_property
+    @instrumentar("segmentos_criticos")
+    def _segmentos_criticos(self):
+        df_mix_topico = self.df_mix_topico
+        df_mix_assunto = self.df_mix_assunto
+        topicos_criticos_por_bot = {}
+        assuntos_criticos_por_bot = {}
+
+        for chatbot in self.bots:
+            # Filtrar tópicos críticos do BOT
+            topicos_criticos = df_mix_topico[
+                (df_mix_topico.chatbot == chatbot)
+                & (df_mix_topico['retencao_atual_pct'] < 20)
+                & (df_mix_topico['delta_retencao_pp'] < -10)
+            ]['topico_da_sessao'].unique().tolist()
+
+            # Filtrar assuntos críticos do BOT
+            assuntos_criticos = df_mix_assunto[
+                (df_mix_assunto.chatbot == chatbot)
+                & (df_mix_assunto['retencao_atual_pct'] < 20)
+                & (df_mix_assunto['delta_retencao_pp'] < -10)
+            ]['assunto_da_sessao'].unique().tolist()
+
+            # Salvar no dicionário final
+            topicos_criticos_por_bot[chatbot] = topicos_criticos
+            assuntos_criticos_por_bot[chatbot] = assuntos_criticos
+
+        return topicos_criticos_por_bot, assuntos_criticos_por_bot
+
+    @property
+    def topicos_criticos_por_bot(self) -> dict:
+        return self._segmentos_criticos[0]
+
+    @property
+    def assuntos_criticos_por_bot(self) -> dict:
+        return self._segmentos_criticos[1]
+
+    # Filtrar os dataframes originais para os tópicos e assuntos críticos identificados para cada chatbot
+    @cached_property
+    @instrumentar("dfs_criticos", entrada="df")
+    def _dfs_criticos(self):
+        dfs_topicos_criticos = {}
+        dfs_assuntos_criticos = {}
+
+        # Linhas do mês atual por bot e valor, direto do índice (sem máscaras na base toda)
+        for bot in self.bots:
+            # Tópicos críticos por bot
+            dfs_topicos_criticos[bot] = self.indice.fatiar(
+                self.mes_key_atual, bot, "topico_da_sessao", self.topicos_criticos_por_bot[bot]
+            )
 
-    projecoes.append({
-        "chatbot": bot,
-        "media_dias_1_14": r_atual_1_14,
-        "fator_historico_1_14_para_15_31": fator,
-        "proj_dias_15_31": r_atual_15_31_proj,
-        "retencao_proj_final_agosto": r_final
-    })
+            # Assuntos críticos por bot
+            dfs_assuntos_criticos[bot] = self.indice.fatiar(
+                self.mes_key_atual, bot, "assunto_da_sessao", self.assuntos_criticos_por_bot[bot]
+            )
 
-df_projecoes = pd.DataFrame(projecoes)
+        return dfs_topicos_criticos, dfs_assuntos_criticos
+
+    @property
+    def dfs_topicos_criticos(self) -> dict:
+        return self._dfs_criticos[0]
+
+    @property
+    def dfs_assuntos_criticos(self) -> dict:
+        return self._dfs_criticos[1]
+
+    ### Analise de topicos e assuntos positivos
+    @cached_property
+    @instrumentar("segmentos_positivos")
+    def _segmentos_positivos(self):
+        df_mix_topico = self.df_mix_topico
+        df_mix_assunto = self.df_mix_assunto
+        topicos_positivos_por_bot = {}
+        assuntos_positivos_por_bot = {}
+
+        for chatbot in self.bots:
+            # Filtrar tópicos críticos do BOT
+            topicos_positivos = df_mix_topico[
+                (df_mix_topico.chatbot == chatbot)
+                & (df_mix_topico['retencao_atual_pct'] > 20)
+                & (df_mix_topico['delta_retencao_pp'] > 10)
+            ]['topico_da_sessao'].unique().tolist()
+
+            # Filtrar assuntos críticos do BOT
+            assuntos_positivos = df_mix_assunto[
+                (df_mix_assunto.chatbot == chatbot)
+                & (df_mix_assunto['retencao_atual_pct'] > 20)
+                & (df_mix_assunto['delta_retencao_pp'] > 10)
+            ]['assunto_da_sessao'].unique().tolist()
+
+            # Salvar no dicionário final
+            topicos_positivos_por_bot[chatbot] = topicos_positivos
+            assuntos_positivos_por_bot[chatbot] = assuntos_positivos
+
+        return topicos_positivos_por_bot, assuntos_positivos_por_bot
+
+    @property
+    def topicos_positivos_por_bot(self) -> dict:
+        return self._segmentos_positivos[0]
+
+    @property
+    def assuntos_positivos_por_bot(self) -> dict:
+        return self._segmentos_positivos[1]
+
+    # Filtrar os dataframes originais para os tópicos e assuntos com variancia positiva relevante identificados para cada chatbot
+    @cached_property
+    @instrumentar("dfs_positivos", entrada="df")
+    def _dfs_positivos(self):
+        dfs_topicos_positivos = {}
+        dfs_assuntos_positivos = {}
+
+        # Linhas do mês atual por bot e valor, direto do índice (sem máscaras na base toda)
+        for bot in self.bots:
+            # Tópicos críticos por bot
+            dfs_topicos_positivos[bot] = self.indice.fatiar(
+                self.mes_key_atual, bot, "topico_da_sessao", self.topicos_positivos_por_bot[bot]
+            )
 
-print("\n=========== PROJEÇÃO DE AGOSTO — MÉTODO HISTÓRICO (1-14 → 15-31) ===========\n")
-print(df_projecoes.to_string(index=False))
+            # Assuntos críticos por bot
+            dfs_assuntos_positivos[bot] = self.indice.fatiar(
+                self.mes_key_atual, bot, "assunto_da_sessao", self.assuntos_positivos_por_bot[bot]
+            )
 
-#%% Projeção para os meses de setembro a dezembro de 2025 - pergunta 3 
-# ============================================================================
-# FUNÇÕES DE PROJEÇÃO
+        return dfs_topicos_positivos, dfs_assuntos_positivos
+
+    @property
+    def dfs_topicos_positivos(self) -> dict:
+        return self._dfs_positivos[0]
+
+    @property
+    def dfs_assuntos_positivos(self) -> dict:
+        return self._dfs_positivos[1]
+
+    #%% Projeção para o fechamento de Agosto
+    @cached_property
+    @instrumentar("projecao_agosto", entrada="df_daily")
+    def df_projecoes(self) -> pd.DataFrame:
+        return projetar_fechamento_agosto(self.df_daily)
+
+    def projecao_fechamento(self, chaves: tuple = ("chatbot",), dia_corte: int = None, dias_mes: int = None) -> pd.DataFrame:
+        """
+        Projeção de fechamento do mês atual em qualquer nível (ex.: ["chatbot", "fonte"]),
+        a partir da série diária do rollup; sem dia_corte, usa o último dia observado.
+        """
+        df_diario = self.rollup.agregar(["session_date"] + list(chaves))
+        return projetar_fechamento(df_diario, chaves, dia_corte, dias_mes, mes_inicio)
+
+    @cached_property
+    @instrumentar("projecao_segmentos")
+    def df_projecoes_segmentos(self) -> pd.DataFrame:
+        # Fechamento projetado de cada bot x segmento de cada feature, no formato longo (feature, segmento)
+        partes = []
+        for feature in features:
+            proj = self.projecao_fechamento(["chatbot", feature]).rename(columns={feature: "segmento"})
+            proj["chatbot"] = proj["chatbot"].astype(str)
+            proj["segmento"] = proj["segmento"].astype(str)
+            proj.insert(1, "feature", feature)
+            partes.append(proj)
+        return pd.concat(partes, ignore_index=True)
+
+    #%% Projeção para os meses de setembro a dezembro de 2025 - pergunta 3
+    @cached_property
+    @instrumentar("projecao_metodos_ensemble", entrada="df_monthly_macro")
+    def _projecoes_futuras(self):
+        # Todos os bots e os 3 métodos de uma vez (matriz bots x meses), a partir do mês seguinte ao último observado
+        return projetar_series(
+            self.df_monthly_macro,
+            self.df_projecoes,
+            chaves=["chatbot"],
+            horizonte=self.horizonte_projecao,
+        )
 
-def detectar_mudancas_regime(serie, threshold=2.0):
-    """
-    Detecta mudanças significativas de regime na série temporal
-    """
-    deltas = serie.diff()
-    std_delta = deltas.std()
-    mean_delta = deltas.mean()
-    mudancas = abs(deltas - mean_delta) > (threshold * std_delta)
-    return mudancas
+    @property
+    def horizonte_projecao(self) -> int:
+        # Horizonte pedido, ou os meses que faltam até dezembro (ao menos 1)
+        if self.horizonte is not None:
+            return self.horizonte
+        return max(12 - self.mes_atual.month, 1)
+
+    @property
+    def df_projecoes_metodos(self) -> pd.DataFrame:
+        # Projeção de cada método (regime_adaptativo, media_movel_ponderada, conservador) por bot e mês
+        return self._projecoes_futuras[0]
+
+    @cached_property
+    @instrumentar("df_future_trend")
+    def df_future_trend(self) -> pd.DataFrame:
+        # Ensemble (média dos 3 métodos)
+        df_future_trend = self._projecoes_futuras[1]
+        df_future_trend["chatbot"] = df_future_trend["chatbot"].astype(str)
+        return df_future_trend
+
+    # ============================================================================
+    # MONTAR SÉRIE 2025 COMPLETA (mesmo formato do seu código)
+    # ============================================================================
+    @cached_property
+    @instrumentar("df_2025_full")
+    def df_2025_full(self) -> pd.DataFrame:
+        df_monthly_macro = self.df_monthly_macro
+        # Mês atual (parcial): o último real é o anterior a ele, e ele entra com o fechamento projetado
+        mes_projetado = str(self.mes_atual)
+
+        # Real até o mês anterior ao atual
+        df_2025_real = df_monthly_macro[
+            (df_monthly_macro["session_month"].str.startswith(ANO_INDICADOR)) &
+            (df_monthly_macro["session_month"] < mes_projetado)
+        ][["chatbot", "session_month", "retencao_pct"]].copy()
+
+        # Mês atual projetado
+        df_ago_proj = []
+        for _, row in self.df_projecoes.iterrows():
+            df_ago_proj.append({
+                "chatbot": row["chatbot"],
+                "session_month": mes_projetado,
+                "retencao_pct": row["retencao_proj_final_agosto"],
+            })
+        df_ago_proj = pd.DataFrame(df_ago_proj)
+
+        # Futuro renomeado (set-dez); meses além do ano do indicador (horizonte longo) ficam de fora
+        df_future_trend_ren = self.df_future_trend.rename(
+            columns={"retencao_pct_proj": "retencao_pct"}
+        )
+        df_future_trend_ren = df_future_trend_ren[
+            df_future_trend_ren["session_month"].str.startswith(ANO_INDICADOR)
+        ]
+
+        # SÉRIE COMPLETA 2025 (mesmo nome do seu código)
+        return pd.concat(
+            [df_2025_real, df_ago_proj, df_future_trend_ren],
+            ignore_index=True,
+        )
 
-def projetar_com_regime_adaptativo(df_monthly_macro, df_projecoes, bot):
-    """
-    Projeta considerando mudanças de regime e tendência atual
-    """
-    df_bot = df_monthly_macro[df_monthly_macro['chatbot'] == bot].copy()
-    df_bot['session_month'] = pd.to_datetime(df_bot['session_month'].astype(str))
-    df_bot = df_bot.sort_values('session_month')
-    
-    # Detectar mudanças de regime
-    mudancas = detectar_mudancas_regime(df_bot['retencao_pct'])
-    indices_mudanca = df_bot[mudancas].index.tolist()
-    
-    # Identificar regime atual
-    if len(indices_mudanca) > 0:
-        ultimo_regime_idx = max(indices_mudanca)
-        df_regime_atual = df_bot.loc[ultimo_regime_idx:]
-    else:
-        df_regime_atual = df_bot.tail(3)
-    
-    # Calcular tendência do regime atual
-    if len(df_regime_atual) >= 2:
-        x = np.arange(len(df_regime_atual))
-        y = df_regime_atual['retencao_pct'].values
-        slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-    else:
-        slope = 0
-        intercept = df_regime_atual['retencao_pct'].iloc[-1]
-    
-    # Valor base: projeção de agosto
-    valor_agosto = df_projecoes[df_projecoes['chatbot'] == bot]['retencao_proj_final_agosto'].iloc[0]
-    
-    # Volatilidade do regime atual
-    volatilidade = df_regime_atual['retencao_pct'].std()
-    
-    # Projetar setembro a dezembro
-    meses_futuros = ['2025-09', '2025-10', '2025-11', '2025-12']
-    projecoes = []
-    
-    for i, mes in enumerate(meses_futuros, start=1):
-        # Projeção base com decay
-        decay_factor = 0.8 ** i
-        valor_proj = valor_agosto + (slope * i * decay_factor)
-        
-        # Limitar por histórico
-        min_hist = df_bot['retencao_pct'].min() - volatilidade
-        max_hist = df_bot['retencao_pct'].max() + volatilidade
-        valor_proj = np.clip(valor_proj, max(0, min_hist), min(100, max_hist))
-        
-        projecoes.append({
-            'chatbot': bot,
-            'session_month': mes,
-            'retencao_pct_proj': round(valor_proj, 2),
-            'metodo': 'regime_adaptativo'
-        })
-    
-    return pd.DataFrame(projecoes)
-
-def projetar_com_media_movel_ponderada(df_monthly_macro, df_projecoes, bot, janela=3):
-    """
-    Projeta usando média móvel ponderada
-    """
-    df_bot = df_monthly_macro[df_monthly_macro['chatbot'] == bot].copy()
-    df_bot['session_month'] = pd.to_datetime(df_bot['session_month'].astype(str))
-    df_bot = df_bot.sort_values('session_month')
-    
-    valor_agosto = df_projecoes[df_projecoes['chatbot'] == bot]['retencao_proj_final_agosto'].iloc[0]
-    
-    # Média móvel ponderada
-    ultimos_valores = df_bot.tail(janela)['retencao_pct'].values
-    pesos = np.array([0.2, 0.3, 0.5])[-len(ultimos_valores):]
-    pesos = pesos / pesos.sum()
-    media_ponderada = np.average(ultimos_valores, weights=pesos)
-    
-    # Tendência suave
-    if len(ultimos_valores) >= 2:
-        tendencia = (ultimos_valores[-1] - ultimos_valores[0]) / len(ultimos_valores)
-    else:
-        tendencia = 0
-    
-    meses_futuros = ['2025-09', '2025-10', '2025-11', '2025-12']
-    projecoes = []
-    
-    for i, mes in enumerate(meses_futuros, start=1):
-        peso_agosto = 0.7 * (0.9 ** i)
-        valor_proj = (valor_agosto * peso_agosto + media_ponderada * (1 - peso_agosto)) + (tendencia * i * 0.3)
-        valor_proj = np.clip(valor_proj, 0, 100)
-        
-        projecoes.append({
-            'chatbot': bot,
-            'session_month': mes,
-            'retencao_pct_proj': round(valor_proj, 2),
-            'metodo': 'media_movel_ponderada'
-        })
-    
-    return pd.DataFrame(projecoes)
-
-def projetar_conservador(df_monthly_macro, df_projecoes, bot):
-    """
-    Projeção conservadora com convergência para média histórica
-    """
-    df_bot = df_monthly_macro[df_monthly_macro['chatbot'] == bot].copy()
-    valor_agosto = df_projecoes[df_projecoes['chatbot'] == bot]['retencao_proj_final_agosto'].iloc[0]
-    media_recente = df_bot.tail(6)['retencao_pct'].mean()
-    
-    meses_futuros = ['2025-09', '2025-10', '2025-11', '2025-12']
-    projecoes = []
-    
-    for i, mes in enumerate(meses_futuros, start=1):
-        peso_agosto = 0.9 ** i
-        valor_proj = valor_agosto * peso_agosto + media_recente * (1 - peso_agosto)
-        
-        projecoes.append({
-            'chatbot': bot,
-            'session_month': mes,
-            'retencao_pct_proj': round(valor_proj, 2),
-            'metodo': 'conservador'
-        })
-    
-    return pd.DataFrame(projecoes)
+    # ============================================================================
+    # INDICADOR ANUAL 2025 (mesmo formato do seu código)
+    # ============================================================================
+    @cached_property
+    @instrumentar("df_indicador_anual", entrada="df_2025_full")
+    def df_indicador_anual(self) -> pd.DataFrame:
+        df_indicador_anual = (
+            self.df_2025_full
+            .groupby("chatbot", observed=True)["retencao_pct"]
+            .mean()
+            .reset_index()
+            .rename(columns={"retencao_pct": "retencao_media_2025"})
+        )
+        df_indicador_anual['retencao_media_2025'] = df_indicador_anual['retencao_media_2025'].round(2)
+        return df_indicador_anual
+
+    # ============================================================================
+    # MODO RELATÓRIO (gráficos + prints no console)
+    # ============================================================================
+    @instrumentar("relatorio")
+    def relatorio(self):
+        """
+        Roda a análise completa no modo "relatório": explora a base, plota os
+        gráficos (plt.show) e imprime os resumos no console.
+        """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from matplotlib.lines import Line2D
+
+        pd.set_option('display.max_columns', None)
+
+        df = self.df
+        df_monthly_macro = self.df_monthly_macro
+        bots = self.bots
+        palette = self.palette
+
+        #%% Carregando e explorando dados
+        ### Conhecendo a base
+        print(df.head())
+        df.info()
+        print(df.describe())
+        print(f"Dias: {df.session_date.nunique()} | Tópicos: {df.topico_da_sessao.nunique()} | Assuntos: {df.assunto_da_sessao.nunique()}")
+
+        ### Verificando valores nulos
+        print(df.isnull().sum())
+
+        #%% Visão Geral Mensal de Retenção vs Pedido de Atendimento por Chatbot
+        fig, ax = plt.subplots(figsize=(14, 6))
+
+        # 1) Retenção - linha cheia
+        sns.lineplot(
+            data=df_monthly_macro,
+            x='session_month',
+            y='retencao_pct',
+            hue='chatbot',
+            palette=palette,
+            marker='o',
+            linewidth=2,
+            legend=False,
+            ax=ax
+        )
 
-# ============================================================================
-# EXECUTAR PROJEÇÕES
-
-print("\n" + "="*70)
-print("PROJEÇÕES SET-DEZ/2025 - MÉTODO ENSEMBLE")
-print("="*70 + "\n")
-
-linhas_future = []
-
-for bot in bots:
-    print(f"\n--- Projeções para {bot} ---\n")
-    
-    # Executar os 3 métodos
-    proj_regime = projetar_com_regime_adaptativo(df_monthly_macro, df_projecoes, bot)
-    proj_mm = projetar_com_media_movel_ponderada(df_monthly_macro, df_projecoes, bot)
-    proj_cons = projetar_conservador(df_monthly_macro, df_projecoes, bot)
-    
-    # Ensemble (média dos 3)
-    for mes in ['2025-09', '2025-10', '2025-11', '2025-12']:
-        v1 = proj_regime[proj_regime['session_month'] == mes]['retencao_pct_proj'].iloc[0]
-        v2 = proj_mm[proj_mm['session_month'] == mes]['retencao_pct_proj'].iloc[0]
-        v3 = proj_cons[proj_cons['session_month'] == mes]['retencao_pct_proj'].iloc[0]
-        
-        valor_final = round((v1 + v2 + v3) / 3, 2)
-        
-        linhas_future.append({
-            "chatbot": bot,
-            "session_month": mes,
-            "retencao_pct_proj": valor_final,
-        })
-        
-        print(f"{mes}: {valor_final}%")
-
-# DATAFRAME FINAL DAS PROJEÇÕES FUTURAS (mesmo formato do seu código)
-df_future_trend = pd.DataFrame(linhas_future)
-
-print("\n" + "="*70)
-print("TABELA CONSOLIDADA - PROJEÇÕES SET-DEZ")
-print("="*70 + "\n")
-print(df_future_trend.to_string(index=False))
+        # 2) Pedido de atendimento - linha tracejada
+        sns.lineplot(
+            data=df_monthly_macro,
+            x='session_month',
+            y='pct_pedido_atendimento',
+            hue='chatbot',
+            palette=palette,
+            marker='o',
+            linewidth=2,
+            linestyle='--', # Define o estilo tracejado no plot
+            legend=False,
+            ax=ax
+        )
 
-# ============================================================================
-# MONTAR SÉRIE 2025 COMPLETA (mesmo formato do seu código)
-# ============================================================================
+        ax.set_title('Histórico Mensal: Retenção vs Pedido de Atendimento por Chatbot')
+        ax.set_xlabel('Mês')
+        ax.set_ylabel('Percentual (%)')
+        plt.xticks(rotation=45)
+        ax.grid(True)
+
+        custom_lines = [
+            # BOT A (Cor A, Sólido)
+            Line2D([0], [0], color=palette[bots[0]], lw=2, marker='o', linestyle='-', label=f'{bots[0]} - Retenção'),
+            # BOT A (Cor A, Tracejado)
+            Line2D([0], [0], color=palette[bots[0]], lw=2, marker='', linestyle='--', label=f'{bots[0]} - Pedido de atendimento'),
+
+            # BOT B (Cor B, Sólido)
+            Line2D([0], [0], color=palette[bots[1]], lw=2, marker='o', linestyle='-', label=f'{bots[1]} - Retenção'),
+            # BOT B (Cor B, Tracejado)
+            Line2D([0], [0], color=palette[bots[1]], lw=2, marker='', linestyle='--', label=f'{bots[1]} - Pedido de atendimento')
+        ]
+
+        ax.legend(handles=custom_lines, title='Métrica', loc='best')
+
+        fig.tight_layout()
+        plt.show()
+
+        ### Correlação de pearson entre retenção e pedido de atendimento para cada chatbot
+        for bot in bots:
+            print(f"\n===============================")
+            print(f"Analisando correlação para o chatbot: {bot}")
+            print(f"===============================\n")
+
+            # Filtra o dataframe para o bot atual
+            df_bot = df_monthly_macro[df_monthly_macro['chatbot'] == bot]
+
+            # 1) Matriz de Correlação
+            corr_matrix = df_bot[['retencao_pct', 'pct_pedido_atendimento']].corr(method='pearson')
+            print("Matriz de correlação:")
+            print(corr_matrix, "\n")
+
+            # 2) Scatterplot individual
+            plt.figure(figsize=(7,5))
+            sns.scatterplot(
+                data=df_bot,
+                x='pct_pedido_atendimento',
+                y='retencao_pct',
+                s=120,
+                color='blue'
+            )
+            plt.title(f"Scatterplot — {bot}\nRetenção vs Pedido de Atendimento")
+            plt.xlabel("Pct Pedido de Atendimento (%)")
+            plt.ylabel("Retenção (%)")
+            plt.grid(True, linestyle='--', alpha=0.3)
+            plt.show()
+
+            # 3) Regressão linear individual
+            g = sns.lmplot(
+                data=df_bot,
+                x='pct_pedido_atendimento',
+                y='retencao_pct',
+                height=5,
+                aspect=1.2,
+                line_kws={'color': 'red'}
+            )
+            g.fig.suptitle(f"Regressão Linear — {bot}\nRelação entre Retenção e Pedido de Atendimento", y=1.03)
+            plt.show()
+
+            # 4) Heatmap da correlação
+            plt.figure(figsize=(5,4))
+            sns.heatmap(corr_matrix, annot=True, cmap="Blues", fmt=".2f", vmin=-1, vmax=1)
+            plt.title(f"Matriz de Correlação — {bot}")
+            plt.show()
+
+        # %% Análise diária + benchmark histórico para o mês atual
+        resumo_mes_atual_vs_historico(self.df_daily, verbose=True)
+
+        # %% Comparação de mix por canal/tecnologia/tópico/assunto (mês atual vs anterior)
+        for feature in features:
+            df_mix = self.resultados_por_feature[feature]
+            for bot in bots:
+                print("\n===============================")
+                print(f"Comparação de mix - Chatbot: {bot} | Feature: {feature}")
+                print(f"Mês atual: {self.mes_atual} x Mês anterior: {self.mes_anterior}")
+                print("===============================\n")
+                print(df_mix[df_mix["chatbot"] == bot].drop(columns="chatbot").to_string(index=False))
+
+        #%% Deep Dive
+        print("\n=========== ANOMALIAS - EPISÓDIOS DE MAIOR IMPACTO ===========\n")
+        print(self.df_episodios_anomalos.head(20).to_string(index=False))
+        bot_fonte = " / ".join(self.segmento_deep_fonte) if self.segmento_deep_fonte else "sem fonte zerada"
+        print(f"\n=========== DEEP DIVE 1 - {bot_fonte} ===========\n")
+        print(self.deep_fonte.to_string(index=False))
+        print("\n=========== DEEP DIVE 2 - Tópico / Assunto ===========\n")
+        for nome, df_deep in self.deep_dive_2.items():
+            print(f"{nome}:")
+            print(df_deep.to_string(index=False))
+
+        ### Conhecendo a base de mix topico e mix assunto
+        for chatbot in bots:
+            print(self.df_mix_assunto[self.df_mix_assunto.chatbot == chatbot]['retencao_atual_pct'].describe())
+            print(self.df_mix_topico[self.df_mix_topico.chatbot == chatbot]['retencao_atual_pct'].describe())
+        print(self.df_q10.to_string(index=False))
+
+        #%% Projeção para o fechamento de Agosto
+        print("\n=========== PROJEÇÃO DE AGOSTO — MÉTODO HISTÓRICO (1-14 → 15-31) ===========\n")
+        print(self.df_projecoes.to_string(index=False))
+
+        #%% Projeção para os meses de setembro a dezembro de 2025 - pergunta 3
+        print("\n" + "="*70)
+        print("PROJEÇÕES SET-DEZ/2025 - MÉTODO ENSEMBLE")
+        print("="*70 + "\n")
+
+        df_future_trend = self.df_future_trend
+        for bot in bots:
+            print(f"\n--- Projeções para {bot} ---\n")
+            for _, row in df_future_trend[df_future_trend["chatbot"] == bot].iterrows():
+                print(f"{row['session_month']}: {row['retencao_pct_proj']}%")
+
+        print("\n" + "="*70)
+        print("TABELA CONSOLIDADA - PROJEÇÕES SET-DEZ")
+        print("="*70 + "\n")
+        print(df_future_trend.to_string(index=False))
+
+        df_indicador_anual = self.df_indicador_anual
+        df_2025_full = self.df_2025_full
+
+        print("\n" + "="*70)
+        print("INDICADOR DE RETENÇÃO PROJETADO — ANO 2025")
+        print("="*70 + "\n")
+        print(df_indicador_anual.to_string(index=False))
+
+        # SUMÁRIO FINAL
+        # ============================================================================
+
+        print("\n" + "="*70)
+        print("RESUMO - DATAFRAMES GERADOS")
+        print("="*70 + "\n")
+
+        print("1. df_future_trend - Projeções mensais Set-Dez:")
+        print(f"   Shape: {df_future_trend.shape}")
+        print(f"   Colunas: {df_future_trend.columns.tolist()}\n")
+
+        print("2. df_2025_full - Série completa 2025 (Real + Projeções):")
+        print(f"   Shape: {df_2025_full.shape}")
+        print(f"   Meses: {sorted(df_2025_full['session_month'].unique())}\n")
+
+        print("3. df_indicador_anual - Indicador consolidado 2025:")
+        print(df_indicador_anual.to_string(index=False))
+        print("\n" + "="*70 + "\n")
 
-# Real até julho
-df_2025_real = df_monthly_macro[
-    (df_monthly_macro["session_month"].str.startswith("2025")) &
-    (df_monthly_macro["session_month"] < "2025-08")
-][["chatbot", "session_month", "retencao_pct"]].copy()
-
-# Agosto projetado
-df_ago_proj = []
-for _, row in df_projecoes.iterrows():
-    df_ago_proj.append({
-        "chatbot": row["chatbot"],
-        "session_month": "2025-08",
-        "retencao_pct": row["retencao_proj_final_agosto"],
-    })
-df_ago_proj = pd.DataFrame(df_ago_proj)
-
-# Futuro renomeado (set-dez)
-df_future_trend_ren = df_future_trend.rename(
-    columns={"retencao_pct_proj": "retencao_pct"}
-)
-
-# SÉRIE COMPLETA 2025 (mesmo nome do seu código)
-df_2025_full = pd.concat(
-    [df_2025_real, df_ago_proj, df_future_trend_ren],
-    ignore_index=True,
-)
 
 # ============================================================================
-# INDICADOR ANUAL 2025 (mesmo formato do seu código)
-# ============================================================================
-
-df_indicador_anual = (
-    df_2025_full
-    .groupby("chatbot")["retencao_pct"]
-    .mean()
-    .reset_index()
-    .rename(columns={"retencao_pct": "retencao_media_2025"})
-)
-df_indicador_anual['retencao_media_2025'] = df_indicador_anual['retencao_media_2025'].round(2)
-
-print("\n" + "="*70)
-print("INDICADOR DE RETENÇÃO PROJETADO — ANO 2025")
-print("="*70 + "\n")
-print(df_indicador_anual.to_string(index=False))
-
-# SUMÁRIO FINAL
+# ACESSO COMPATÍVEL: script.df_monthly_macro, script.df_mix_assunto, ...
 # ============================================================================
 
-print("\n" + "="*70)
-print("RESUMO - DATAFRAMES GERADOS")
-print("="*70 + "\n")
-
-print("1. df_future_trend - Projeções mensais Set-Dez:")
-print(f"   Shape: {df_future_trend.shape}")
-print(f"   Colunas: {df_future_trend.columns.tolist()}\n")
-
-print("2. df_2025_full - Série completa 2025 (Real + Projeções):")
-print(f"   Shape: {df_2025_full.shape}")
-print(f"   Meses: {sorted(df_2025_full['session_month'].unique())}\n")
-
-print("3. df_indicador_anual - Indicador consolidado 2025:")
-print(df_indicador_anual.to_string(index=False))
-print("\n" + "="*70 + "\n")
+_pipeline = None
 
 
+def obter_pipeline() -> PipelineRetencao:
+    """
+    Pipeline padrão (base Excel ao lado do script), criado no primeiro uso.
+    """
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = PipelineRetencao()
+    return _pipeline
 
 
+def __getattr__(name):
+    # Mantém `script.<resultado>` funcionando: delega ao pipeline padrão,
+    # que calcula o resultado só quando ele é acessado
+    if not name.startswith("_") and hasattr(PipelineRetencao, name):
+        return getattr(obter_pipeline(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+if __name__ == "__main__":
+    obter_pipeline().relatorio()
 
+    # Com CASE_STONE_INSTRUMENTACAO ligado, mostra o tempo de cada etapa ao final
+    if registro.modo:
+        print(registro.tabela().to_string(index=False))
+        for etapa, perfil in registro.perfis().items():
+            print(f"\n===== Perfil: {etapa} =====\n{perfil}")
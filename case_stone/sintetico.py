@@ -0,0 +1,328 @@
+import os
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from carga import DIMENSOES, CONTADORES
+
+
+# Anomalias padrão, no espírito dos achados do case:
+# Chat_C do BOT_A com retenção zerada em agosto e um tópico/assunto zerado num único dia
+ANOMALIAS_PADRAO = [
+    {"chatbot": "BOT_A", "fonte": "Chat_C", "inicio": "2025-08-01", "fim": None, "retencao": 0.0},
+    {"chatbot": "BOT_A", "fonte": "Chat_B", "tecnologia_do_chatbot": "TECH_A",
+     "topico_da_sessao": 0, "inicio": "2025-08-05", "fim": "2025-08-05", "retencao": 0.0},
+]
+
+# Volume relativo por dia da semana (segunda a domingo)
+SAZONALIDADE_SEMANAL = np.array([1.10, 1.05, 1.05, 1.00, 0.95, 0.80, 0.75])
+
+TAMANHO_CHUNK = 1_000_000
+
+
+def _rotulo(prefixo: str, i: int) -> str:
+    # BOT_A, BOT_B, ..., BOT_Z, BOT_AA, ...
+    letras = ""
+    i += 1
+    while i > 0:
+        i, resto = divmod(i - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return f"{prefixo}_{letras}"
+
+
+def _hash(texto: str) -> str:
+    # Tópicos e assuntos aparecem anonimizados como SHA-256 na base real
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+class GeradorSintetico:
+    """
+    Gerador determinístico (por seed) de dados no esquema de tabelas_fonte.sql.
+
+    - Um mesmo catálogo de células (bot x fonte x tecnologia x assunto, com o
+      tópico definido pelo assunto) alimenta os dois formatos de saída:
+      silver_sessions (uma linha por sessão) e a tabela agregada diária
+    - Cada dia usa um gerador aleatório próprio, derivado de (seed, dia): o
+      resultado não depende do tamanho dos chunks, e agregar as sessões geradas
+      reproduz exatamente a tabela agregada da mesma seed
+    - A geração é feita dia a dia e em chunks, com memória limitada pelo
+      tamanho do chunk, não pelo total de sessões
+    """
+
+    def __init__(
+        self,
+        inicio: str = "2024-08-01",
+        fim: str = "2025-08-14",
+        sessoes_por_dia: int = 20_000,
+        n_bots: int = 2,
+        n_fontes: int = 3,
+        n_tecnologias: int = 2,
+        n_topicos: int = 60,
+        n_assuntos: int = 700,
+        data_regime: str = "2025-05-01",
+        efeito_regime: float = 0.05,
+        anomalias: list = ANOMALIAS_PADRAO,
+        seed: int = 42,
+    ):
+        self.datas = pd.date_range(inicio, fim, freq="D")
+        self.sessoes_por_dia = sessoes_por_dia
+        self.data_regime = pd.Timestamp(data_regime) if data_regime else None
+        self.efeito_regime = efeito_regime
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+
+        # Catálogos das dimensões
+        self.categorias = {
+            "chatbot": [_rotulo("BOT", i) for i in range(n_bots)],
+            "fonte": [_rotulo("Chat", i) for i in range(n_fontes)],
+            "tecnologia_do_chatbot": [_rotulo("TECH", i) for i in range(n_tecnologias)],
+            "topico_da_sessao": [_hash(f"topico-{seed}-{i}") for i in range(n_topicos)],
+            "assunto_da_sessao": [_hash(f"assunto-{seed}-{i}") for i in range(n_assuntos)],
+        }
+        topico_do_assunto = rng.integers(0, n_topicos, n_assuntos)
+
+        # Distribuições de volume: bot, fonte e tecnologia por bot, assunto com cauda longa (Zipf)
+        p_bot = rng.dirichlet(np.full(n_bots, 5.0))
+        p_fonte = rng.dirichlet(np.full(n_fontes, 2.0), size=n_bots)
+        p_tech = rng.dirichlet(np.full(n_tecnologias, 1.0), size=n_bots)
+        p_assunto = 1 / np.arange(1, n_assuntos + 1) ** 1.1
+        p_assunto = rng.permutation(p_assunto / p_assunto.sum())
+
+        # Células: produto cartesiano bot x fonte x tecnologia x assunto
+        b, f, t, a = np.meshgrid(
+            np.arange(n_bots), np.arange(n_fontes), np.arange(n_tecnologias), np.arange(n_assuntos),
+            indexing="ij",
+        )
+        self.celulas = {
+            "chatbot": b.ravel(),
+            "fonte": f.ravel(),
+            "tecnologia_do_chatbot": t.ravel(),
+            "topico_da_sessao": topico_do_assunto[a.ravel()],
+            "assunto_da_sessao": a.ravel(),
+        }
+        self.p_celula = (p_bot[b] * p_fonte[b, f] * p_tech[b, t] * p_assunto[a]).ravel()
+        self.p_celula /= self.p_celula.sum()
+
+        # Probabilidades de retenção e de pedido de atendimento por célula
+        base_bot = rng.uniform(0.45, 0.75, n_bots)
+        efeito_fonte = rng.normal(0, 0.04, n_fontes)
+        efeito_topico = rng.normal(0, 0.08, n_topicos)
+        self.p_retencao = (
+            base_bot[self.celulas["chatbot"]]
+            + efeito_fonte[self.celulas["fonte"]]
+            + efeito_topico[self.celulas["topico_da_sessao"]]
+        )
+        self.p_pedido = rng.uniform(0.4, 0.8, n_bots)[self.celulas["chatbot"]]
+
+        self.anomalias = self._preparar_anomalias(anomalias or [])
+
+    def _preparar_anomalias(self, anomalias: list) -> list:
+        """
+        Converte cada anomalia (filtros por dimensão + período + retenção
+        forçada) numa máscara de células. Filtros com valores fora do catálogo
+        são ignorados; inteiros indexam o catálogo (ex.: topico_da_sessao=0).
+        """
+        preparadas = []
+        for anomalia in anomalias:
+            mascara = np.ones(len(self.p_celula), dtype=bool)
+            valida = True
+            for dim in DIMENSOES:
+                if dim not in anomalia:
+                    continue
+                valor = anomalia[dim]
+                catalogo = self.categorias[dim]
+                if isinstance(valor, (int, np.integer)):
+                    codigo = int(valor) if 0 <= valor < len(catalogo) else None
+                else:
+                    codigo = catalogo.index(valor) if valor in catalogo else None
+                if codigo is None:
+                    valida = False
+                    break
+                mascara &= self.celulas[dim] == codigo
+            if not valida:
+                continue
+            inicio = pd.Timestamp(anomalia.get("inicio") or self.datas[0])
+            fim = pd.Timestamp(anomalia.get("fim") or self.datas[-1])
+            preparadas.append((mascara, inicio, fim, float(anomalia.get("retencao", 0.0))))
+        return preparadas
+
+    def _gerador_dia(self, i: int, fluxo: int = 0) -> np.random.Generator:
+        return np.random.default_rng([self.seed, i, fluxo])
+
+    def contagens_dia(self, i: int) -> dict:
+        """
+        Contagens do dia i (índice em self.datas) nas células com sessões:
+        {"celula": índices, "total", "retidas", "pedido"}.
+        """
+        data = self.datas[i]
+        rng = self._gerador_dia(i)
+
+        volume = self.sessoes_por_dia * SAZONALIDADE_SEMANAL[data.dayofweek]
+        n = rng.poisson(volume)
+        contagens = rng.multinomial(n, self.p_celula)
+        celula = np.flatnonzero(contagens)
+        total = contagens[celula]
+
+        p = self.p_retencao[celula].copy()
+        if self.data_regime is not None and data >= self.data_regime:
+            p += self.efeito_regime
+        for mascara, inicio, fim, retencao in self.anomalias:
+            if inicio <= data <= fim:
+                p[mascara[celula]] = retencao
+        p = np.clip(p, 0, 1)
+
+        retidas = rng.binomial(total, p)
+        pedido = rng.binomial(total - retidas, self.p_pedido[celula])
+        return {"celula": celula, "total": total, "retidas": retidas, "pedido": pedido}
+
+    def _dimensoes(self, celula: np.ndarray) -> dict:
+        colunas = {}
+        for dim in DIMENSOES:
+            codigos = self.celulas[dim][celula]
+            colunas[dim] = pd.Categorical.from_codes(codigos, categories=self.categorias[dim])
+        return colunas
+
+    def agregado_em_chunks(self, tamanho_chunk: int = TAMANHO_CHUNK):
+        """
+        Tabela agregada diária (colunas do SELECT), em blocos de ~tamanho_chunk linhas.
+        """
+        partes, linhas = [], 0
+        for i, data in enumerate(self.datas):
+            c = self.contagens_dia(i)
+            parte = pd.DataFrame({"session_date": data, **self._dimensoes(c["celula"])})
+            parte["sessoes_total"] = c["total"]
+            parte["sessoes_retidas"] = c["retidas"]
+            parte["sessoes_com_pedido_de_atendimento"] = c["pedido"]
+            partes.append(parte[["session_date"] + DIMENSOES + CONTADORES])
+            linhas += len(parte)
+            if linhas >= tamanho_chunk:
+                yield pd.concat(partes, ignore_index=True)
+                partes, linhas = [], 0
+        if partes:
+            yield pd.concat(partes, ignore_index=True)
+
+    def sessoes_em_chunks(self, tamanho_chunk: int = TAMANHO_CHUNK):
+        """
+        silver_sessions (uma linha por sessão), em blocos de no máximo tamanho_chunk linhas.
+
+        Em cada célula, as primeiras `retidas` sessões são retidas e as
+        `pedido` seguintes pediram atendimento; a ordem das linhas é
+        embaralhada dentro de cada bloco.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        proximo_id = 0
+        for i, data in enumerate(self.datas):
+            c = self.contagens_dia(i)
+            rng = self._gerador_dia(i, fluxo=1)
+            inicio_celula = np.cumsum(c["total"]) - c["total"]
+            n_dia = int(c["total"].sum())
+
+            for ini in range(0, n_dia, tamanho_chunk):
+                fim = min(ini + tamanho_chunk, n_dia)
+                pos = np.arange(ini, fim)
+                k = np.searchsorted(inicio_celula, pos, side="right") - 1
+                pos_celula = pos - inicio_celula[k]
+                retida = pos_celula < c["retidas"][k]
+                pedido = ~retida & (pos_celula < c["retidas"][k] + c["pedido"][k])
+
+                ordem = rng.permutation(fim - ini)
+                k, retida, pedido = k[ordem], retida[ordem], pedido[ordem]
+
+                # session_id "S000000000123", formatado em lote pelo Arrow
+                ids = pa.array(np.arange(proximo_id, proximo_id + (fim - ini)))
+                proximo_id += fim - ini
+                session_id = pc.binary_join_element_wise(
+                    "S", pc.utf8_lpad(pc.cast(ids, pa.string()), 12, padding="0"), ""
+                ).to_pandas()
+
+                chunk = pd.DataFrame({
+                    "session_id": session_id,
+                    "session_date": data,
+                    **self._dimensoes(c["celula"][k]),
+                    "flag_sessao_retida": retida,
+                    "flag_pedido_atendimento": pedido,
+                    "dt_ingest": data + pd.Timedelta(days=1) + pd.to_timedelta(rng.integers(0, 6 * 3600, fim - ini), unit="s"),
+                })
+                yield chunk
+
+    def gravar(self, destino: str, nivel: str = "agregado", tamanho_chunk: int = TAMANHO_CHUNK) -> int:
+        """
+        Grava em Parquet (row groups por chunk) ou CSV (append por chunk).
+        `nivel` é "agregado" ou "sessoes". Retorna o número de linhas gravadas.
+        """
+        if nivel == "sessoes":
+            chunks = self.sessoes_em_chunks(tamanho_chunk)
+        elif nivel == "agregado":
+            chunks = self.agregado_em_chunks(tamanho_chunk)
+        else:
+            raise ValueError(f"nivel deve ser 'agregado' ou 'sessoes', não {nivel!r}")
+
+        ext = os.path.splitext(destino)[1].lower()
+        os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+        linhas = 0
+
+        if ext == ".csv":
+            for j, chunk in enumerate(chunks):
+                chunk.to_csv(destino, mode="w" if j == 0 else "a", header=(j == 0), index=False)
+                linhas += len(chunk)
+            return linhas
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        escritor = None
+        try:
+            for chunk in chunks:
+                tabela = pa.Table.from_pandas(chunk, preserve_index=False)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(destino, tabela.schema)
+                escritor.write_table(tabela)
+                linhas += len(chunk)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        return linhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gera dados sintéticos de silver_sessions ou da tabela agregada diária."
+    )
+    parser.add_argument("saida", help="Arquivo de saída (.parquet ou .csv)")
+    parser.add_argument("--nivel", choices=["agregado", "sessoes"], default="agregado")
+    parser.add_argument("--inicio", default="2024-08-01")
+    parser.add_argument("--fim", default="2025-08-14")
+    parser.add_argument("--sessoes-por-dia", type=int, default=20_000)
+    parser.add_argument("--bots", type=int, default=2)
+    parser.add_argument("--fontes", type=int, default=3)
+    parser.add_argument("--tecnologias", type=int, default=2)
+    parser.add_argument("--topicos", type=int, default=60)
+    parser.add_argument("--assuntos", type=int, default=700)
+    parser.add_argument("--data-regime", default="2025-05-01", help="Início da mudança de regime ('' para nenhuma)")
+    parser.add_argument("--efeito-regime", type=float, default=0.05)
+    parser.add_argument("--sem-anomalias", action="store_true")
+    parser.add_argument("--chunk", type=int, default=TAMANHO_CHUNK)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    gerador = GeradorSintetico(
+        inicio=args.inicio,
+        fim=args.fim,
+        sessoes_por_dia=args.sessoes_por_dia,
+        n_bots=args.bots,
+        n_fontes=args.fontes,
+        n_tecnologias=args.tecnologias,
+        n_topicos=args.topicos,
+        n_assuntos=args.assuntos,
+        data_regime=args.data_regime or None,
+        efeito_regime=args.efeito_regime,
+        anomalias=[] if args.sem_anomalias else ANOMALIAS_PADRAO,
+        seed=args.seed,
+    )
+    n = gerador.gravar(args.saida, nivel=args.nivel, tamanho_chunk=args.chunk)
+    print(f"{n} linhas ({args.nivel}) gravadas em {args.saida}")
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# Tabelas grandes do dashboard ordenadas e fatiadas no servidor: o navegador
+# recebe só a página visível, e o formato dos percentuais vai como metadado de
+# coluna (column_config do st.dataframe), sem copiar nem renomear o frame.
+
+# Critério de coluna percentual (nome contém algum destes trechos)
+PALAVRAS_PERCENTUAL = ["pct", "percent", "percentual", "taxa", "%"]
+
+# Opções de linhas por página; tabelas até o menor tamanho vão inteiras, sem paginação
+TAMANHOS_PAGINA = [25, 50, 100, 250]
+
+# Nome da ordenação pelo impacto (não é coluna do frame)
+ORDEM_IMPACTO = "impacto"
+
+
+def colunas_percentuais(colunas, extra_pct_cols=None) -> list:
+    """
+    Colunas exibidas como percentual: nome com 'pct', 'percent',
+    'percentual', 'taxa' ou '%' + as extras pedidas que existirem.
+    """
+    colunas = [str(c) for c in colunas]
+    pct_cols = [c for c in colunas if any(k in c.lower() for k in PALAVRAS_PERCENTUAL)]
+    for c in extra_pct_cols or []:
+        if c in colunas and c not in pct_cols:
+            pct_cols.append(c)
+    return pct_cols
+
+
+def impacto(df: pd.DataFrame):
+    """
+    Peso de cada linha no ranking padrão (maior primeiro), ou None se a
+    tabela não tiver uma medida de impacto:
+
+    - Tabelas de mix: sessões retidas ganhas/perdidas no mês atual em relação
+      à taxa do mês anterior (|delta_retencao_pp| x sessoes_total_atual);
+      segmentos sem mês anterior ficam com 0
+    - Episódios de anomalia: impacto_sessoes
+    - Detalhes por dia: volume (sessoes_total)
+    """
+    if {"delta_retencao_pp", "sessoes_total_atual"} <= set(df.columns):
+        delta = df["delta_retencao_pp"].to_numpy(dtype="float64", na_value=np.nan)
+        total = df["sessoes_total_atual"].to_numpy(dtype="float64", na_value=np.nan)
+        return np.nan_to_num(np.abs(delta) * total / 100)
+    for coluna in ["impacto_sessoes", "sessoes_total"]:
+        if coluna in df.columns:
+            return df[coluna].to_numpy(dtype="float64", na_value=np.nan)
+    return None
+
+
+def ordem_linhas(df: pd.DataFrame, coluna: str = ORDEM_IMPACTO, crescente: bool = False) -> np.ndarray:
+    """
+    Posições das linhas de `df` ordenadas por `coluna` (ou pelo impacto),
+    estável e com nulos no fim. Sem medida de impacto, mantém a ordem original.
+    """
+    if coluna == ORDEM_IMPACTO:
+        pesos = impacto(df)
+        if pesos is None:
+            return np.arange(len(df))
+        valores = pd.Series(pesos)
+    else:
+        valores = df[coluna].reset_index(drop=True)
+    return valores.sort_values(ascending=crescente, kind="stable", na_position="last").index.to_numpy()
+
+
+def fatiar(df: pd.DataFrame, ordem: np.ndarray, pagina: int, tamanho: int) -> pd.DataFrame:
+    """
+    Página `pagina` (a partir de 1) com `tamanho` linhas, na ordem `ordem`;
+    só as linhas da página são copiadas.
+    """
+    inicio = (pagina - 1) * tamanho
+    return df.take(ordem[inicio:inicio + tamanho])
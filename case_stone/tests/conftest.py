@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Módulos do projeto são importados direto da pasta case_stone (como em __main__.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def df_base() -> pd.DataFrame:
+    """
+    Base agregada sintética pequena (mar/2025 a 14/ago/2025, 2 bots), já
+    preparada como no pipeline (ver script.preparar_base).
+    """
+    from sintetico import GeradorSintetico
+    from script import preparar_base
+
+    gerador = GeradorSintetico(
+        inicio="2025-03-01", fim="2025-08-14", sessoes_por_dia=600, n_topicos=6, n_assuntos=25, seed=7,
+    )
+    df = pd.concat(gerador.agregado_em_chunks(), ignore_index=True)
+    return preparar_base(df)
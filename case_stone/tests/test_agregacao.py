@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from agregacao import RollupRetencao
+from carga import CONTADORES
+
+
+NIVEIS = [
+    ["session_date", "chatbot"],
+    ["session_month", "chatbot"],
+    ["session_month", "chatbot", "fonte"],
+    ["mes_key", "chatbot", "topico_da_sessao"],
+    ["session_date", "chatbot", "assunto_da_sessao"],
+    ["chatbot", "tecnologia_do_chatbot"],
+]
+
+
+def _groupby(df: pd.DataFrame, chaves: list) -> pd.DataFrame:
+    # Soma direta na base, sem passar pelo rollup
+    return (
+        df.groupby(chaves, observed=True, sort=True)[CONTADORES].sum()
+        .reset_index()
+        .astype({c: "int64" for c in CONTADORES})
+    )
+
+
+def _normalizar(g: pd.DataFrame, chaves: list) -> pd.DataFrame:
+    g = g[chaves + CONTADORES].astype({c: "int64" for c in CONTADORES})
+    return g.sort_values(chaves).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("chaves", NIVEIS, ids=lambda c: "x".join(c))
+def test_nivel_igual_groupby(df_base, chaves):
+    rollup = RollupRetencao(df_base)
+    esperado = _groupby(df_base, chaves)
+    pd.testing.assert_frame_equal(_normalizar(rollup.nivel(chaves), chaves), esperado, check_categorical=False)
+
+
+def test_niveis_derivados_entre_si(df_base):
+    # A ordem em que os níveis são pedidos (e de qual nível memorizado saem) não muda as somas
+    rollup = RollupRetencao(df_base)
+    for chaves in NIVEIS:
+        rollup.nivel(chaves)
+    for chaves in reversed(NIVEIS):
+        pd.testing.assert_frame_equal(
+            _normalizar(RollupRetencao(df_base).nivel(chaves), chaves),
+            _normalizar(rollup.nivel(chaves), chaves),
+        )
+
+
+def test_taxas(df_base):
+    g = RollupRetencao(df_base).agregar(["session_month", "chatbot"])
+    esperado = (g["sessoes_retidas"] / g["sessoes_total"] * 100).round(2)
+    pd.testing.assert_series_equal(g["retencao_pct"], esperado, check_names=False)
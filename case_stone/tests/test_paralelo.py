@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from agregacao import RollupRetencao
+from paralelo import NIVEIS_PARALELOS, PARTICOES, rollup_paralelo
+
+
+@pytest.fixture(scope="module")
+def sequencial(df_base) -> RollupRetencao:
+    rollup = RollupRetencao(df_base)
+    for chaves in NIVEIS_PARALELOS:
+        rollup.nivel(chaves)
+    return rollup
+
+
+@pytest.mark.parametrize("particao", PARTICOES)
+def test_rollup_paralelo_igual_sequencial(df_base, sequencial, particao):
+    paralelo = rollup_paralelo(df_base, processos=2, particao=particao)
+
+    pd.testing.assert_frame_equal(paralelo.base, sequencial.base, check_dtype=False)
+    for chaves in NIVEIS_PARALELOS:
+        pd.testing.assert_frame_equal(
+            paralelo.nivel(chaves), sequencial.nivel(chaves), check_dtype=False, obj=" x ".join(chaves),
+        )
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from projecao import projetar_fechamento
+
+
+MES_INICIO = "2025-05"
+
+
+def _fechamento_baseline(df_daily: pd.DataFrame) -> pd.DataFrame:
+    # Regra original da análise: média dos dias 1-14 do mês atual, fator médio
+    # (dias 15-31 / dias 1-14) nos meses desde maio e fechamento 14/17 dias
+    df_recent = df_daily[df_daily["session_month"] >= MES_INICIO]
+    meses = sorted(df_recent["session_month"].unique())
+    mes_atual = meses[-1]
+
+    linhas = []
+    for bot in sorted(df_recent["chatbot"].astype(str).unique()):
+        df_bot = df_recent[df_recent["chatbot"].astype(str) == bot]
+        fatores = []
+        for mes in meses[:-1]:
+            df_mes = df_bot[df_bot["session_month"] == mes]
+            r_1_14 = df_mes[df_mes["day"] <= 14]["retencao_pct"].mean()
+            r_15_31 = df_mes[df_mes["day"] > 14]["retencao_pct"].mean()
+            if pd.notnull(r_1_14) and pd.notnull(r_15_31) and r_1_14 > 0:
+                fatores.append(r_15_31 / r_1_14)
+        fator = np.mean(fatores) if fatores else np.nan
+
+        df_atual = df_bot[df_bot["session_month"] == mes_atual]
+        r_atual_1_14 = df_atual[df_atual["day"] <= 14]["retencao_pct"].mean()
+        proj_15_31 = r_atual_1_14 * fator
+        linhas.append({
+            "chatbot": bot,
+            "media_ate_corte": r_atual_1_14,
+            "fator_historico": fator,
+            "proj_apos_corte": proj_15_31,
+            "retencao_proj_fechamento": (14 * r_atual_1_14 + 17 * proj_15_31) / 31,
+            "meses_fator": len(fatores),
+        })
+    return pd.DataFrame(linhas)
+
+
+@pytest.fixture(scope="module")
+def df_daily(df_base) -> pd.DataFrame:
+    from agregacao import RollupRetencao
+    from script import construir_df_diario
+
+    return construir_df_diario(None, RollupRetencao(df_base))
+
+
+def test_fechamento_igual_baseline(df_daily):
+    esperado = _fechamento_baseline(df_daily)
+
+    proj = projetar_fechamento(df_daily, mes_inicio=MES_INICIO)
+    proj["chatbot"] = proj["chatbot"].astype(str)
+
+    # A base termina em 14/08: corte no dia 14 e agosto com 31 dias, como na regra original
+    pd.testing.assert_frame_equal(proj[esperado.columns], esperado, check_dtype=False)
+
+
+def test_fechamento_com_corte_explicito(df_daily):
+    # Corte e tamanho do mês explícitos iguais aos do calendário não mudam o resultado
+    padrao = projetar_fechamento(df_daily, mes_inicio=MES_INICIO)
+    explicito = projetar_fechamento(df_daily, dia_corte=14, dias_mes=31, mes_inicio=MES_INICIO)
+    pd.testing.assert_frame_equal(padrao, explicito)